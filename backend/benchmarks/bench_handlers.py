@@ -0,0 +1,176 @@
+"""
+Micro-benchmarks for the QueryProcessor handlers on synthetic datasets.
+
+Generates crop and rainfall CSVs with the real column layout, scaled to the
+requested number of district rows (plus two extra years as partitions so
+trend and correlation queries have work to do), then times each handler.
+
+Usage (from backend/):
+    python benchmarks/bench_handlers.py
+    python benchmarks/bench_handlers.py --rows 10000,100000,1000000 --repeat 20 --json current.json
+    python benchmarks/bench_handlers.py --baseline previous.json      # flag regressions
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+sys.path.insert(0, SRC_DIR)
+
+from data_loader import DataLoader, CROP_FILE, RAINFALL_FILE  # noqa: E402
+from query_processor import QueryProcessor  # noqa: E402
+from schema import canonical_columns  # noqa: E402
+
+SOURCE_DATA_DIR = os.path.join(SRC_DIR, "..", "data")
+EXTRA_YEARS = (2015, 2016)
+
+QUERIES = {
+    "comparison": {"query_type": "comparison", "data_sources": ["crop", "rainfall"],
+                   "entities": {"districts": ["District 000001", "District 000002", "District 000003"]},
+                   "metrics": ["production", "rainfall"]},
+    "ranking": {"query_type": "ranking", "data_sources": ["crop", "rainfall"], "entities": {},
+                "metrics": ["production"], "order": "desc", "limit": 10},
+    "ranking_season": {"query_type": "ranking", "data_sources": ["crop"], "entities": {"seasons": ["Kharif"]},
+                       "metrics": ["yield"], "order": "asc", "limit": 50},
+    "trend": {"query_type": "trend", "data_sources": ["crop", "rainfall"], "entities": {},
+              "metrics": ["production"], "time_period": "2015-2017"},
+    "correlation": {"query_type": "correlation", "data_sources": ["crop", "rainfall"], "entities": {},
+                    "metrics": ["yield", "rainfall"], "time_period": "all available"},
+    "general": {"query_type": "general", "data_sources": ["crop", "rainfall"], "entities": {}, "metrics": []},
+}
+
+
+def synthesize(template: pd.DataFrame, dataset: str, rows: int, rng: np.random.Generator) -> pd.DataFrame:
+    """Frame with the template's columns and `rows` districts, numbers drawn around the template's ranges"""
+    mapping = canonical_columns(dataset, list(template.columns))
+    district_column = next(column for column, name in mapping.items() if name == "district")
+    frame = pd.DataFrame({district_column: [f"District {i:06d}" for i in range(rows)]})
+    for column in template.columns:
+        if column == district_column:
+            continue
+        values = pd.to_numeric(template[column], errors="coerce")
+        if column in ("SlNo", "S.No"):
+            frame[column] = np.arange(1, rows + 1)
+        elif values.notna().any():
+            low, high = float(values.min()), float(values.max())
+            frame[column] = np.round(rng.uniform(low, max(high, low + 1), rows), 2)
+    return frame[[c for c in template.columns if c in frame.columns]]
+
+
+def build_dataset(rows: int, data_dir: str, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    crop_template = pd.read_csv(os.path.join(SOURCE_DATA_DIR, CROP_FILE))
+    rainfall_template = pd.read_csv(os.path.join(SOURCE_DATA_DIR, RAINFALL_FILE))
+
+    crop = synthesize(crop_template, "crop", rows, rng)
+    rainfall = synthesize(rainfall_template, "rainfall", rows, rng)
+    crop.to_csv(os.path.join(data_dir, CROP_FILE), index=False)
+    rainfall.to_csv(os.path.join(data_dir, RAINFALL_FILE), index=False)
+
+    # Earlier years for trends, and rainfall for the crop state so correlations join
+    for year in EXTRA_YEARS:
+        for dataset, frame, state in (("crop", crop, "karnataka"), ("rainfall", rainfall, "tamil_nadu"),
+                                      ("rainfall", rainfall, "karnataka")):
+            path = os.path.join(data_dir, "partitions", dataset, state)
+            os.makedirs(path, exist_ok=True)
+            scaled = frame.copy()
+            numeric = [c for c in scaled.select_dtypes(include="number").columns if c not in ("SlNo", "S.No")]
+            scaled[numeric] = scaled[numeric] * rng.uniform(0.8, 1.2)
+            scaled.to_csv(os.path.join(path, f"{year}.csv"), index=False)
+    # Make the 2017 rainfall available for Karnataka as well
+    rainfall.to_csv(os.path.join(data_dir, "partitions", "rainfall", "karnataka", "2017.csv"), index=False)
+
+
+def time_call(fn, repeat: int) -> Dict[str, float]:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return {"min_ms": round(min(samples), 3), "median_ms": round(statistics.median(samples), 3)}
+
+
+def bench_size(rows: int, repeat: int) -> Dict[str, Dict[str, float]]:
+    data_dir = tempfile.mkdtemp(prefix=f"samarth-bench-{rows}-")
+    try:
+        started = time.perf_counter()
+        build_dataset(rows, data_dir)
+        print(f"\n{rows:,} rows (generated in {time.perf_counter() - started:.1f} s)")
+
+        results: Dict[str, Dict[str, float]] = {}
+        started = time.perf_counter()
+        loader = DataLoader(data_dir, cache_dir=os.path.join(data_dir, ".cache"))
+        results["load_csv"] = {"min_ms": round((time.perf_counter() - started) * 1000, 3)}
+        started = time.perf_counter()
+        DataLoader(data_dir, cache_dir=os.path.join(data_dir, ".cache"))
+        results["load_cached"] = {"min_ms": round((time.perf_counter() - started) * 1000, 3)}
+
+        processor = QueryProcessor(loader)
+        snapshot = loader.snapshot()
+        for name, analysis in QUERIES.items():
+            result = processor.process_query(analysis, snapshot)
+            if "error" in result:
+                raise RuntimeError(f"{name} failed: {result['error']}")
+            # The first call includes lazy partition loads and cache fills
+            first = time_call(lambda: processor.process_query(analysis, snapshot), 1)
+            results[name] = dict(time_call(lambda: processor.process_query(analysis, snapshot), repeat),
+                                 first_ms=first["min_ms"])
+
+        for name, timing in results.items():
+            print(f"    {name:<16} " + "  ".join(f"{k} {v:>10}" for k, v in timing.items()))
+        return results
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+
+def compare(current: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """Handlers whose median got slower than the baseline by more than `tolerance`"""
+    regressions = []
+    for rows, handlers in current.items():
+        for name, timing in handlers.items():
+            before = baseline.get(rows, {}).get(name, {})
+            key = "median_ms" if "median_ms" in timing else "min_ms"
+            if key in before and before[key] > 0 and timing[key] > before[key] * (1 + tolerance):
+                regressions.append(f"{rows} rows / {name}: {before[key]} ms -> {timing[key]} ms")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", default="10000,100000", help="Comma-separated dataset sizes (up to 1000000)")
+    parser.add_argument("--repeat", type=int, default=10, help="Timed runs per handler")
+    parser.add_argument("--json", help="Write results to this file")
+    parser.add_argument("--baseline", help="Compare against a previous --json file")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown vs baseline (0.25 = 25%%)")
+    args = parser.parse_args()
+
+    results = {}
+    for rows in [int(r) for r in args.rows.split(",") if r.strip()]:
+        results[str(rows)] = bench_size(rows, args.repeat)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print("\nRegressions:")
+            for line in regressions:
+                print(f"    {line}")
+            sys.exit(1)
+        print("\nNo regressions against baseline")
+
+
+if __name__ == "__main__":
+    main()
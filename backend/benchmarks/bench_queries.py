@@ -0,0 +1,214 @@
+"""
+Replay a query corpus against the Flask app with a stub LLM and report
+per-stage latency percentiles, throughput per concurrency level and memory.
+
+Usage (from backend/):
+    python benchmarks/bench_queries.py
+    python benchmarks/bench_queries.py --corpus queries.txt --concurrency 1,4,16 \
+        --requests 200 --llm-latency 0.3 --no-fast-path --json results.json
+    python benchmarks/bench_queries.py --asgi --concurrency 16,256 --requests 1000 \
+        --llm-latency 0.3 --no-fast-path --answer-mode llm
+
+--asgi sends the requests to the ASGI app (asgi_app.py) from one event loop
+instead of to the Flask app from a thread per in-flight request.
+
+The corpus is a text file with one query per line, or JSON lines with a
+"query" field; by default the /example-queries set is used.
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import resource
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from stub_llm import load_app
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[rank]
+
+
+def parse_server_timing(header: str) -> Dict[str, float]:
+    """'analyze;dur=1.2, process;dur=0.4' -> {"analyze": 1.2, "process": 0.4} (ms)"""
+    timings: Dict[str, float] = {}
+    for part in (header or "").split(","):
+        name, _, params = part.strip().partition(";")
+        if params.startswith("dur="):
+            timings[name] = timings.get(name, 0.0) + float(params[4:])
+    return timings
+
+
+def load_corpus(path: str, client) -> List[str]:
+    if not path:
+        categories = client.get("/example-queries").get_json()["examples"]
+        return [query for category in categories for query in category["queries"]]
+
+    queries = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith("{"):
+                record = json.loads(line)
+                line = record.get("query") or record.get("title") or ""
+            if line:
+                queries.append(line)
+    return queries
+
+
+def run_level(app, queries: List[str], concurrency: int, total: int, endpoint: str) -> Dict:
+    def one(i: int):
+        client = app.test_client()
+        query = queries[i % len(queries)]
+        started = time.perf_counter()
+        response = client.post(endpoint, json={"query": query})
+        response.get_data()
+        return time.perf_counter() - started, response
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        samples = list(executor.map(one, range(total)))
+    return summarize(samples, concurrency, total, time.perf_counter() - started)
+
+
+def run_level_asgi(asgi_app, queries: List[str], concurrency: int, total: int, endpoint: str) -> Dict:
+    """run_level() against the ASGI app, with `concurrency` requests in flight on one event loop"""
+    import httpx
+
+    async def run():
+        semaphore = asyncio.Semaphore(concurrency)
+        transport = httpx.ASGITransport(app=asgi_app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            async def one(i: int):
+                async with semaphore:
+                    started = time.perf_counter()
+                    response = await client.post(endpoint, json={"query": queries[i % len(queries)]})
+                    return time.perf_counter() - started, response
+
+            return await asyncio.gather(*(one(i) for i in range(total)))
+
+    started = time.perf_counter()
+    samples = asyncio.run(run())
+    return summarize(samples, concurrency, total, time.perf_counter() - started)
+
+
+def summarize(samples, concurrency: int, total: int, wall: float) -> Dict:
+    stages: Dict[str, List[float]] = {}
+    latencies: List[float] = []
+    errors = shed = 0
+    for elapsed, response in samples:
+        latencies.append(elapsed * 1000)
+        if response.status_code in (429, 503):
+            shed += 1
+        elif response.status_code != 200:
+            errors += 1
+        for stage, ms in parse_server_timing(response.headers.get("Server-Timing")).items():
+            stages.setdefault(stage, []).append(ms)
+
+    return {
+        "concurrency": concurrency,
+        "requests": total,
+        "errors": errors,
+        "shed": shed,
+        "throughput_rps": round(total / wall, 2),
+        "latency_ms": {p: round(percentile(latencies, p), 2) for p in (50, 95, 99)},
+        "stages_ms": {stage: {p: round(percentile(values, p), 2) for p in (50, 95, 99)}
+                      for stage, values in stages.items()}
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", help="Query corpus (text lines or JSON lines)")
+    parser.add_argument("--concurrency", default="1,4,16", help="Comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=100, help="Requests per concurrency level")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="Stub LLM latency per call (s)")
+    parser.add_argument("--token-delay", type=float, default=0.0, help="Stub delay between streamed chunks (s)")
+    parser.add_argument("--no-fast-path", action="store_true", help="Send every analysis to the stub LLM")
+    parser.add_argument("--no-analysis-cache", action="store_true", help="Disable the analysis cache")
+    parser.add_argument("--answer-mode", choices=("auto", "fast", "llm"),
+                        help="Answer renderer mode (default: ANSWER_MODE or auto)")
+    parser.add_argument("--endpoint", default="/query", help="/query or /query/stream")
+    parser.add_argument("--asgi", action="store_true", help="Benchmark the ASGI app (asgi_app.py) instead")
+    parser.add_argument("--admission", action="store_true",
+                        help="Keep admission control on (ADMISSION_* and LLM_RPM/LLM_TPM apply)")
+    parser.add_argument("--response-store", action="store_true",
+                        help="Use the response store (a fresh temporary database)")
+    parser.add_argument("--json", help="Also write the results to this file")
+    parser.add_argument("--verbose", action="store_true", help="Show the app's own request logging")
+    args = parser.parse_args()
+
+    # The app logs every pipeline step; keep the report readable
+    quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(open(os.devnull, "w"))
+
+    tracemalloc.start()
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    with quiet:
+        app_module, stub = load_app(latency=args.llm_latency, token_delay=args.token_delay,
+                                    fast_path=not args.no_fast_path, analysis_cache=not args.no_analysis_cache,
+                                    answer_mode=args.answer_mode, admission=args.admission,
+                                    response_store=args.response_store)
+    app = app_module.app
+    if args.asgi:
+        with quiet:
+            import asgi_app
+    startup_peak = tracemalloc.get_traced_memory()[1]
+
+    queries = load_corpus(args.corpus, app.test_client())
+    print(f"\nReplaying {len(queries)} distinct queries against {args.endpoint}{' (ASGI)' if args.asgi else ''} "
+          f"(stub LLM latency {args.llm_latency * 1000:.0f} ms)\n")
+
+    # Warm-up: lazy partition loads, first-time caches
+    with quiet:
+        for query in queries:
+            app.test_client().post(args.endpoint, json={"query": query}).get_data()
+    tracemalloc.reset_peak()
+
+    results = []
+    for level in [int(c) for c in args.concurrency.split(",") if c.strip()]:
+        with quiet:
+            if args.asgi:
+                result = run_level_asgi(asgi_app.app, queries, level, args.requests, args.endpoint)
+            else:
+                result = run_level(app, queries, level, args.requests, args.endpoint)
+        results.append(result)
+        lat = result["latency_ms"]
+        print(f"concurrency {level:>3}: {result['throughput_rps']:>8} req/s  "
+              f"p50 {lat[50]:>8} ms  p95 {lat[95]:>8} ms  p99 {lat[99]:>8} ms  errors {result['errors']}  "
+              f"shed {result['shed']}")
+        for stage, pcts in sorted(result["stages_ms"].items()):
+            print(f"    {stage:<12} p50 {pcts[50]:>8} ms  p95 {pcts[95]:>8} ms  p99 {pcts[99]:>8} ms")
+
+    memory = {
+        # ru_maxrss is KiB on Linux (bytes on macOS)
+        "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "rss_before_app_mb": round(rss_before / 1024, 1),
+        "startup_python_peak_mb": round(startup_peak / 1024 / 1024, 1),
+        "request_python_peak_mb": round(tracemalloc.get_traced_memory()[1] / 1024 / 1024, 1)
+    }
+    tracemalloc.stop()
+    print(f"\nmemory: {memory}")
+    print(f"stub LLM calls: {stub.chat.completions.calls}")
+    print(f"analysis paths: {app_module.query_analyzer.get_stats()['paths']}")
+    print(f"answer renderers: {app_module.answer_generator.get_stats()['renderers']}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"endpoint": args.endpoint, "asgi": args.asgi, "llm_latency": args.llm_latency,
+                       "levels": results, "memory": memory}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
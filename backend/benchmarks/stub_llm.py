@@ -0,0 +1,181 @@
+"""
+Local stand-in for the Groq client, so the service can be benchmarked offline.
+
+It mimics the parts of the chat completions API the app uses:
+create(messages=..., response_format=..., stream=...), with choices[].message,
+choices[].delta, usage and, for streams, x_groq.usage on the last chunk.
+"""
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from types import SimpleNamespace
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+
+DEFAULT_ANSWER = (
+    "Based on the retrieved data, the districts listed above lead on the requested metric. "
+    "Figures come from the crop production and rainfall datasets for 2017-18."
+)
+
+FALLBACK_ANALYSIS = {
+    "query_type": "general",
+    "data_sources": ["crop", "rainfall"],
+    "entities": {"districts": [], "states": [], "crops": [], "seasons": []},
+    "metrics": [],
+    "time_period": "all available",
+    "order": "desc",
+    "limit": 10,
+    "analysis_type": "Summary statistics"
+}
+
+
+def _usage(prompt_tokens: int, completion_tokens: int) -> SimpleNamespace:
+    return SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens,
+                           total_tokens=prompt_tokens + completion_tokens)
+
+
+def _estimate_tokens(messages: List[Dict[str, str]]) -> int:
+    return sum(len(m.get("content", "")) for m in messages) // 4
+
+
+class StubCompletions:
+    def __init__(self, latency: float = 0.0, token_delay: float = 0.0, answer: str = DEFAULT_ANSWER,
+                 analyze: Optional[Callable[[str], Dict[str, Any]]] = None):
+        """
+        latency: seconds before a response (or the first stream chunk)
+        token_delay: seconds between streamed chunks
+        analyze: maps the user question to the analysis JSON to return;
+                 defaults to a generic summary analysis
+        """
+        self.latency = latency
+        self.token_delay = token_delay
+        self.answer = answer
+        self.analyze = analyze
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def create(self, messages: List[Dict[str, str]] = None, stream: bool = False,
+               response_format: Dict[str, Any] = None, **kwargs) -> Any:
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.latency)
+        if stream:
+            return self._stream(_estimate_tokens(messages or []))
+        return self._response(messages or [], response_format)
+
+    def _response(self, messages: List[Dict[str, str]], response_format: Optional[Dict[str, Any]]) -> Any:
+        prompt_tokens = _estimate_tokens(messages)
+        if response_format:
+            question = messages[-1]["content"] if messages else ""
+            if question.startswith("Query: "):
+                question = question[len("Query: "):].split("\n")[0]
+            analysis = self.analyze(question) if self.analyze else dict(FALLBACK_ANALYSIS)
+            content = json.dumps(analysis)
+            return SimpleNamespace(
+                choices=[SimpleNamespace(message=SimpleNamespace(content=content))],
+                usage=_usage(prompt_tokens, len(content) // 4)
+            )
+
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=self.answer))],
+            usage=_usage(prompt_tokens, len(self.answer) // 4)
+        )
+
+    def _chunks(self, prompt_tokens: int) -> Iterator[Any]:
+        words = self.answer.split(" ")
+        for i, word in enumerate(words):
+            text = word if i == len(words) - 1 else word + " "
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text))],
+                                  usage=None, x_groq=None)
+        yield SimpleNamespace(choices=[], usage=None,
+                              x_groq=SimpleNamespace(usage=_usage(prompt_tokens, len(self.answer) // 4)))
+
+    def _stream(self, prompt_tokens: int) -> Iterator[Any]:
+        for i, chunk in enumerate(self._chunks(prompt_tokens)):
+            if i and chunk.choices and self.token_delay:
+                time.sleep(self.token_delay)
+            yield chunk
+
+
+class StubAsyncCompletions:
+    def __init__(self, completions: StubCompletions):
+        """The same stub for groq.AsyncGroq: create() is a coroutine and waits without blocking the loop"""
+        self.completions = completions
+
+    async def create(self, messages: List[Dict[str, str]] = None, stream: bool = False,
+                     response_format: Dict[str, Any] = None, **kwargs) -> Any:
+        stub = self.completions
+        with stub._lock:
+            stub.calls += 1
+        await asyncio.sleep(stub.latency)
+        if stream:
+            return self._stream(_estimate_tokens(messages or []))
+        return stub._response(messages or [], response_format)
+
+    async def _stream(self, prompt_tokens: int) -> AsyncIterator[Any]:
+        for i, chunk in enumerate(self.completions._chunks(prompt_tokens)):
+            if i and chunk.choices and self.completions.token_delay:
+                await asyncio.sleep(self.completions.token_delay)
+            yield chunk
+
+
+class StubLLMClient:
+    def __init__(self, **options):
+        """Drop-in replacement for groq.Groq(...) objects: client.chat.completions.create(...)"""
+        self.chat = SimpleNamespace(completions=StubCompletions(**options))
+
+    def async_client(self) -> Any:
+        """The matching groq.AsyncGroq stand-in, sharing options and call count"""
+        return SimpleNamespace(chat=SimpleNamespace(completions=StubAsyncCompletions(self.chat.completions)))
+
+
+def load_app(latency: float = 0.0, token_delay: float = 0.0, fast_path: bool = True,
+             analysis_cache: bool = True, answer_mode: str = None, admission: bool = False,
+             response_store: bool = False):
+    """
+    Import the Flask app with every LLM client replaced by the stub.
+
+    The stub's analyses come from the app's own rule-based analyzer, so LLM
+    fallbacks still produce realistic analyses. fast_path=False makes every
+    query go through the (stubbed) LLM; analysis_cache=False keeps the
+    analysis cache from hiding that cost on repeated queries. answer_mode
+    overrides ANSWER_MODE (auto, fast or llm). Admission control is off
+    unless admission=True, as every benchmark request comes from one client.
+    The response store is off unless response_store=True; it then starts
+    empty in a temporary file, so stub answers never reach the real store.
+    """
+    os.environ.setdefault("GROQ_API_KEY", "stub")
+    os.environ["FAST_ANALYZER_ENABLED"] = "true" if fast_path else "false"
+    if not analysis_cache:
+        os.environ["ANALYSIS_CACHE_SIZE"] = "0"
+    if answer_mode:
+        os.environ["ANSWER_MODE"] = answer_mode
+    os.environ["ADMISSION_ENABLED"] = "true" if admission else "false"
+    os.environ["RESPONSE_STORE_ENABLED"] = "true" if response_store else "false"
+    if response_store:
+        os.environ["RESPONSE_STORE_PATH"] = os.path.join(tempfile.mkdtemp(prefix="samarth-bench-"),
+                                                         "responses.sqlite3")
+    # The app resolves ../data relative to the working directory
+    os.chdir(SRC_DIR)
+    if SRC_DIR not in sys.path:
+        sys.path.insert(0, SRC_DIR)
+
+    import app as app_module
+    from rule_analyzer import RuleBasedAnalyzer
+
+    rules = RuleBasedAnalyzer(app_module.data_loader)
+
+    def analyze(question: str) -> Dict[str, Any]:
+        analysis = rules.analyze(question)
+        analysis.pop("confidence", None)
+        return analysis
+
+    client = StubLLMClient(latency=latency, token_delay=token_delay, analyze=analyze)
+    app_module.llm_client.backend = client
+    app_module.llm_client.async_backend = client.async_client()
+    return app_module, client
@@ -0,0 +1,93 @@
+"""
+Gunicorn settings, picked up automatically by `gunicorn --chdir src app:app`
+when started from this directory.
+
+With SHARED_DATA_ENABLED=true the master process loads the datasets once
+and exports them (frames and sort orders) into a shared memory block before
+forking. Workers attach to it read-only instead of parsing their own copy,
+so each extra worker only adds its private memory (logged when it starts
+and reported on /stats). `kill -HUP <master>` exports the current files
+again and replaces the workers; a reload inside a worker (watcher or
+/admin/reload) loads that worker's data privately.
+
+Flask workers serve GUNICORN_THREADS requests at once (gunicorn's gthread
+worker). Unless ADMISSION_MAX_IN_FLIGHT is set, half of them may run
+queries, so the other threads can hold requests in the admission queue,
+where clients are served in turn and waiting is bounded; with one thread
+per worker only the LLM quota pacing would apply. Workers given with -k
+(e.g. uvicorn_worker.UvicornWorker) ignore the threads and keep the
+admission defaults.
+"""
+import os
+
+from dotenv import load_dotenv
+
+# The app loads .env too, but only once a worker imports it
+load_dotenv(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".env"))
+
+SHARED_DATA_ENABLED = os.getenv("SHARED_DATA_ENABLED", "false").lower() == "true"
+# Hooks run after gunicorn has changed into src/ (and put it on sys.path),
+# so the app's modules are imported inside them
+DATA_DIR = "../data"
+
+threads = max(1, int(os.getenv("GUNICORN_THREADS", "16")))
+
+
+def _publish(server):
+    from data_loader import DataLoader
+    from shared_data import SHARED_DATA_ENV, SharedDataExport
+
+    # Kept on the arbiter: this module is executed again on every reload
+    previous = getattr(server, "shared_data", None)
+    manifest = os.environ.pop(SHARED_DATA_ENV, None)
+    try:
+        snapshot = DataLoader(data_dir=DATA_DIR).snapshot()
+        if previous is not None and previous.version == snapshot.version:
+            os.environ[SHARED_DATA_ENV] = manifest
+            return
+        export = SharedDataExport(snapshot)
+    except Exception as e:
+        if manifest:
+            os.environ[SHARED_DATA_ENV] = manifest
+        server.log.warning("Shared data export failed, workers load data privately: %s", e)
+        return
+
+    os.environ[SHARED_DATA_ENV] = export.manifest_json()
+    server.shared_data = export
+    server.log.info("Shared data exported: version %s, %d bytes in %s",
+                    export.version, export.manifest["size"], export.manifest["name"])
+    if previous is not None:
+        # Workers still attached keep their mapping until they exit
+        previous.unlink()
+
+
+def on_starting(server):
+    if SHARED_DATA_ENABLED:
+        _publish(server)
+
+
+def on_reload(server):
+    if SHARED_DATA_ENABLED:
+        _publish(server)
+
+
+def post_fork(server, worker):
+    if worker.cfg.worker_class_str in ("sync", "gthread") and "ADMISSION_MAX_IN_FLIGHT" not in os.environ:
+        # Runs in the worker before the app is imported
+        os.environ["ADMISSION_MAX_IN_FLIGHT"] = str(max(1, worker.cfg.threads // 2))
+
+
+def post_worker_init(worker):
+    from shared_data import process_memory
+
+    memory = process_memory()
+    if "rss_bytes" in memory:
+        worker.log.info("Worker %s ready: rss %.1f MB, private %.1f MB, shared %.1f MB",
+                        worker.pid, memory["rss_bytes"] / 2 ** 20, (memory["private_bytes"] or 0) / 2 ** 20,
+                        memory["shared_bytes"] / 2 ** 20)
+
+
+def on_exit(server):
+    export = getattr(server, "shared_data", None)
+    if export is not None:
+        export.unlink()
@@ -0,0 +1,342 @@
+import asyncio
+import math
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Dict, Any, Deque, Mapping, Optional, Tuple
+
+from metrics import registry, record_error
+from structured_log import logger
+
+registry.counter("admission_rejected_total", "Query requests shed before the pipeline, by reason")
+registry.histogram("admission_wait_seconds", "Time admitted query requests waited in the queue")
+registry.counter("llm_quota_wait_seconds_total", "Seconds LLM calls were held back to stay within the quota")
+
+
+class TokenBucket:
+    def __init__(self, per_minute: float, burst: float = None):
+        """
+        `per_minute` units refilled continuously, holding at most `burst`
+        (default: one minute's worth). take() may run the level below zero:
+        the caller waits until its share has been refilled, so callers are
+        paced in the order they reserved.
+        """
+        self.rate = per_minute / 60.0
+        self.capacity = burst if burst is not None else per_minute
+        self.level = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def take(self, amount: float) -> float:
+        """Reserve `amount`; returns the seconds to wait before using it"""
+        with self._lock:
+            self._refill()
+            self.level -= amount
+            return max(0.0, -self.level / self.rate)
+
+    def give(self, amount: float):
+        """Hand back `amount` (charge it if negative), e.g. to settle an estimate"""
+        with self._lock:
+            self._refill()
+            self.level = min(self.capacity, self.level + amount)
+
+    def wait_time(self, amount: float = 0.0) -> float:
+        """Seconds until `amount` could be taken without waiting"""
+        with self._lock:
+            self._refill()
+            return max(0.0, (amount - self.level) / self.rate)
+
+
+class LLMQuota:
+    def __init__(self, requests_per_minute: float = 0, tokens_per_minute: float = 0):
+        """
+        The LLM provider's rate limits as two token buckets (0: no limit).
+        Calls reserve one request and their estimated tokens (prompt plus
+        max_tokens) before they are sent, and settle the estimate with the
+        usage the API reports, so bursts are paced here instead of being
+        answered with upstream 429s.
+        """
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute > 0 else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute > 0 else None
+        self._lock = threading.Lock()
+        self.stats = {"reserved": 0, "delayed": 0, "rejected": 0, "wait_seconds": 0.0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.requests is not None or self.tokens is not None
+
+    def reserve(self, tokens: int, max_wait: float = None) -> Optional[float]:
+        """
+        Take one request and `tokens` tokens; returns the seconds to wait
+        before sending, or None (and takes nothing) if that is over max_wait
+        """
+        wait = max(self.requests.take(1) if self.requests else 0.0,
+                   self.tokens.take(tokens) if self.tokens else 0.0)
+        if max_wait is not None and wait > max_wait:
+            self._give_back(1, tokens)
+            with self._lock:
+                self.stats["rejected"] += 1
+            return None
+        with self._lock:
+            self.stats["reserved"] += 1
+            if wait > 0:
+                self.stats["delayed"] += 1
+                self.stats["wait_seconds"] += wait
+        if wait > 0:
+            registry.inc("llm_quota_wait_seconds_total", value=wait)
+        return wait
+
+    def settle(self, estimated: int, actual: int):
+        """Correct a reservation of `estimated` tokens once the call's actual usage is known"""
+        if self.tokens is not None:
+            self.tokens.give(estimated - actual)
+
+    def _give_back(self, requests: int, tokens: int):
+        if self.requests is not None:
+            self.requests.give(requests)
+        if self.tokens is not None:
+            self.tokens.give(tokens)
+
+    def backlog(self) -> float:
+        """Seconds before a new call could be sent without waiting"""
+        return max(self.requests.wait_time(1) if self.requests else 0.0,
+                   self.tokens.wait_time() if self.tokens else 0.0)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self.stats, wait_seconds=round(self.stats["wait_seconds"], 3))
+        stats["backlog_seconds"] = round(self.backlog(), 3)
+        return stats
+
+
+class AdmissionError(Exception):
+    def __init__(self, message: str, reason: str, status: int = 503, retry_after: float = 1.0):
+        """A query request shed before the pipeline; maps onto the API error response"""
+        super().__init__(message)
+        self.message = message
+        self.reason = reason
+        self.status = status
+        self.retry_after = max(1, math.ceil(retry_after))
+
+    def headers(self) -> Dict[str, str]:
+        return {"Retry-After": str(self.retry_after)}
+
+    def to_response(self) -> Dict[str, Any]:
+        return {
+            "success": False,
+            "error": self.message,
+            "stage": "admission",
+            "reason": self.reason,
+            "retry_after": self.retry_after
+        }
+
+
+def client_id(headers: Mapping[str, str], remote_addr: Optional[str]) -> str:
+    """X-Client-ID if sent, else the first X-Forwarded-For address, else the peer address"""
+    client = (headers.get("X-Client-ID") or "").strip()
+    if not client:
+        client = (headers.get("X-Forwarded-For") or "").split(",")[0].strip()
+    return (client or remote_addr or "unknown")[:64]
+
+
+class _Waiter:
+    def __init__(self, client: str, loop: asyncio.AbstractEventLoop = None):
+        """A queued request: woken with an event (thread) or a future (event loop)"""
+        self.client = client
+        self.granted = False
+        self.enqueued = time.monotonic()
+        self.loop = loop
+        self.event = threading.Event() if loop is None else None
+        self.future = loop.create_future() if loop is not None else None
+
+    def wake(self):
+        if self.loop is None:
+            self.event.set()
+        else:
+            self.loop.call_soon_threadsafe(self._resolve)
+
+    def _resolve(self):
+        if not self.future.done():
+            self.future.set_result(None)
+
+
+class Ticket:
+    def __init__(self, controller: "AdmissionController", client: str):
+        """A slot in the pipeline, held until release() (or the end of a with block)"""
+        self.controller = controller
+        self.client = client
+        self.started = time.monotonic()
+        self._released = False
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self.controller._leave(self.client, time.monotonic() - self.started)
+
+    def __enter__(self) -> "Ticket":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+
+class AdmissionController:
+    def __init__(self, max_in_flight: int = 64, max_queue: int = 256, queue_timeout: float = 10.0,
+                 max_per_client: int = 32, quota: LLMQuota = None):
+        """
+        Admission in front of the query pipeline.
+
+        At most max_in_flight requests run at once. Others wait in a queue of
+        at most max_queue, for at most queue_timeout seconds, and are served
+        round-robin across clients so one busy client cannot starve the rest.
+        A client holds at most max_per_client running or queued requests.
+
+        Requests that cannot be served are shed at once with an AdmissionError
+        (503, or 429 over the client limit) carrying a Retry-After estimate:
+        when the queue is full, when the LLM quota is already booked further
+        ahead than queue_timeout, or when the wait in the queue runs out.
+        """
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.max_per_client = max_per_client
+        self.quota = quota
+
+        self._in_flight = 0
+        self._queued = 0
+        self._clients: Dict[str, int] = {}
+        # Waiters per client, in round-robin order
+        self._queues: "OrderedDict[str, Deque[_Waiter]]" = OrderedDict()
+        # Running average of how long a request holds its slot
+        self._service_time = 1.0
+        self._lock = threading.Lock()
+        self.stats = {"admitted": 0, "queued": 0, "rejected": {}}
+
+    def acquire(self, client: str) -> Ticket:
+        """A slot for `client`, waiting in the queue if needed; raises AdmissionError if shed"""
+        waiter = self._enter(client)
+        if waiter is None:
+            return self._admitted(client)
+        waiter.event.wait(self.queue_timeout)
+        if self._abandon(waiter):
+            raise self._reject(client, "queue_timeout", "Timed out waiting for capacity", 503, self._drain_time())
+        return self._admitted(client, waiter)
+
+    async def acquire_async(self, client: str) -> Ticket:
+        """acquire() for the event loop"""
+        waiter = self._enter(client, asyncio.get_running_loop())
+        if waiter is None:
+            return self._admitted(client)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), self.queue_timeout)
+        except asyncio.TimeoutError:
+            pass
+        except asyncio.CancelledError:
+            # The client went away; a slot granted meanwhile is handed on
+            if not self._abandon(waiter):
+                self._leave(client)
+            raise
+        if self._abandon(waiter):
+            raise self._reject(client, "queue_timeout", "Timed out waiting for capacity", 503, self._drain_time())
+        return self._admitted(client, waiter)
+
+    def _enter(self, client: str, loop: asyncio.AbstractEventLoop = None) -> Optional[_Waiter]:
+        """Admit at once (None), queue (the waiter) or raise AdmissionError"""
+        with self._lock:
+            rejection = self._rejection(client)
+            if rejection is None:
+                self._clients[client] = self._clients.get(client, 0) + 1
+                if self._in_flight < self.max_in_flight and not self._queued:
+                    self._in_flight += 1
+                    return None
+                waiter = _Waiter(client, loop)
+                self._queues.setdefault(client, deque()).append(waiter)
+                self._queued += 1
+                self.stats["queued"] += 1
+                return waiter
+        raise self._reject(client, *rejection)
+
+    def _rejection(self, client: str) -> Optional[Tuple[str, str, int, float]]:
+        """(reason, message, status, retry_after) if `client` must be shed now (under the lock)"""
+        if self._clients.get(client, 0) >= self.max_per_client:
+            return "client_limit", "Too many concurrent requests from this client", 429, self._service_time
+        backlog = self.quota.backlog() if self.quota is not None else 0.0
+        if backlog > self.queue_timeout:
+            return "llm_quota", "LLM quota exhausted, try again later", 503, backlog
+        if (self._queued or self._in_flight >= self.max_in_flight) and self._queued >= self.max_queue:
+            return "queue_full", "Server is busy, try again later", 503, self._drain_time()
+        return None
+
+    def _abandon(self, waiter: _Waiter) -> bool:
+        """After a wait: True if the waiter was not granted a slot (and has left the queue)"""
+        with self._lock:
+            if waiter.granted:
+                return False
+            queue = self._queues.get(waiter.client)
+            if queue is not None and waiter in queue:
+                queue.remove(waiter)
+                if not queue:
+                    del self._queues[waiter.client]
+                self._queued -= 1
+            self._forget_client(waiter.client)
+            return True
+
+    def _admitted(self, client: str, waiter: _Waiter = None) -> Ticket:
+        with self._lock:
+            self.stats["admitted"] += 1
+        if waiter is not None:
+            registry.observe("admission_wait_seconds", time.monotonic() - waiter.enqueued)
+        return Ticket(self, client)
+
+    def _leave(self, client: str, held: float = None):
+        with self._lock:
+            self._in_flight -= 1
+            self._forget_client(client)
+            if held is not None:
+                self._service_time = 0.9 * self._service_time + 0.1 * held
+            self._dispatch()
+
+    def _dispatch(self):
+        """Hand free slots to queued requests, one client at a time (under the lock)"""
+        while self._in_flight < self.max_in_flight and self._queues:
+            client, queue = next(iter(self._queues.items()))
+            waiter = queue.popleft()
+            if queue:
+                self._queues.move_to_end(client)
+            else:
+                del self._queues[client]
+            self._queued -= 1
+            self._in_flight += 1
+            waiter.granted = True
+            waiter.wake()
+
+    def _forget_client(self, client: str):
+        count = self._clients.get(client, 0) - 1
+        if count > 0:
+            self._clients[client] = count
+        else:
+            self._clients.pop(client, None)
+
+    def _drain_time(self) -> float:
+        """Rough seconds until the queue has room again"""
+        return (self._queued + 1) * self._service_time / max(1, self.max_in_flight)
+
+    def _reject(self, client: str, reason: str, message: str, status: int, retry_after: float) -> AdmissionError:
+        error = AdmissionError(message, reason, status, retry_after)
+        with self._lock:
+            self.stats["rejected"][reason] = self.stats["rejected"].get(reason, 0) + 1
+        registry.inc("admission_rejected_total", {"reason": reason})
+        record_error("admission")
+        logger.warning("query_rejected", reason=reason, client=client, retry_after=error.retry_after)
+        return error
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self.stats, rejected=dict(self.stats["rejected"]), in_flight=self._in_flight,
+                        max_in_flight=self.max_in_flight, queue_depth=self._queued, clients=len(self._clients),
+                        service_time_s=round(self._service_time, 3))
@@ -0,0 +1,193 @@
+import copy
+import math
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import Dict, Any, Optional, Tuple
+from data_loader import DataLoader
+from rule_analyzer import normalize_text, METRIC_PATTERNS, SEASON_PATTERNS, STATE_PATTERNS
+
+STOPWORDS = {
+    "a", "an", "the", "is", "are", "was", "were", "be", "of", "in", "on", "at", "to", "for", "by", "with",
+    "which", "what", "who", "whose", "show", "me", "tell", "give", "list", "please", "can", "you", "i",
+    "has", "have", "had", "do", "does", "did", "and", "across", "among", "from", "data", "about", "there",
+    "get", "find", "all", "any", "this", "that", "these", "those", "it", "its", "how", "vs", "versus",
+    "between"
+}
+
+# Words that flip the meaning of otherwise similar questions. They become part
+# of the entry signature so the approximate tier never mixes them up.
+DIRECTION_WORDS = {
+    "highest": "max", "top": "max", "most": "max", "maximum": "max", "max": "max", "largest": "max",
+    "best": "max", "wettest": "max", "more": "max",
+    "lowest": "min", "least": "min", "minimum": "min", "min": "min", "smallest": "min", "bottom": "min",
+    "worst": "min", "driest": "min", "less": "min", "fewer": "min",
+}
+
+
+class AnalysisCache:
+    def __init__(self, data_loader: DataLoader, max_size: int = 512, ttl_seconds: float = 3600,
+                 similarity_threshold: float = 0.9):
+        """
+        In-process cache of query analyses with LRU + TTL eviction.
+
+        Lookups go through two tiers:
+        1. Exact match on the normalized query (case, punctuation, stopwords
+           and district names canonicalized)
+        2. Approximate match: cosine similarity of character trigram vectors
+           among entries that share the same entity signature (data version,
+           districts, numbers, metrics, seasons, states and ranking direction)
+        """
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self.data_loader = data_loader
+
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._by_signature: Dict[tuple, set] = {}
+        self._lock = threading.Lock()
+        self.stats = {
+            "hits": 0,
+            "similar_hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "expirations": 0
+        }
+
+    def normalize(self, query: str) -> Tuple[str, tuple]:
+        """Return (normalized key, entity signature) for a query"""
+        text = normalize_text(query)
+        tokens = text.split()
+        districts, consumed = [], set()
+        for index in (self.data_loader.get_crop_index(), self.data_loader.get_rainfall_index()):
+            found, positions = index.find_in_text(tokens)
+            districts += [d for d in found if d not in districts]
+            consumed |= positions
+
+        words = []
+        for i, token in enumerate(tokens):
+            if i in consumed or token in STOPWORDS:
+                continue
+            if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+                token = token[:-1]
+            words.append(token)
+
+        # The data version is part of the signature so a reload never serves
+        # analyses made against the previous district list
+        signature = (
+            self.data_loader.data_version,
+            tuple(sorted(normalize_text(d) for d in districts)),
+            tuple(sorted(t for t in tokens if t.isdigit())),
+            tuple(name for name, pattern in METRIC_PATTERNS.items() if pattern.search(text)),
+            tuple(name for name, pattern in SEASON_PATTERNS.items() if pattern.search(text)),
+            tuple(name for name, pattern in STATE_PATTERNS.items() if pattern.search(text)),
+            tuple(sorted({DIRECTION_WORDS[t] for t in tokens if t in DIRECTION_WORDS}))
+        )
+        district_tokens = [f"d:{d}" for d in signature[1]]
+        return " ".join(words + district_tokens + [f"v:{signature[0]}"]), signature
+
+    @staticmethod
+    def _vectorize(key: str) -> Tuple[Counter, float]:
+        """Order-insensitive character trigram vector of the key's words"""
+        grams = Counter()
+        for word in key.split():
+            padded = f" {word} "
+            for i in range(len(padded) - 2):
+                grams[padded[i:i + 3]] += 1
+        norm = math.sqrt(sum(v * v for v in grams.values()))
+        return grams, norm
+
+    @staticmethod
+    def _cosine(a: Tuple[Counter, float], b: Tuple[Counter, float]) -> float:
+        (va, na), (vb, nb) = a, b
+        if not na or not nb:
+            return 0.0
+        if len(va) > len(vb):
+            va, vb = vb, va
+        return sum(count * vb.get(gram, 0) for gram, count in va.items()) / (na * nb)
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            bucket = self._by_signature.get(entry["signature"])
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self._by_signature[entry["signature"]]
+
+    def _is_expired(self, entry: Dict[str, Any], now: float) -> bool:
+        return self.ttl_seconds > 0 and now - entry["created"] > self.ttl_seconds
+
+    def get(self, query: str) -> Optional[Dict[str, Any]]:
+        """Return a cached analysis for the query (or a near-duplicate of it), or None"""
+        key, signature = self.normalize(query)
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._is_expired(entry, now):
+                self._remove(key)
+                self.stats["expirations"] += 1
+                entry = None
+
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.stats["hits"] += 1
+                return copy.deepcopy(entry["analysis"])
+
+            if self.similarity_threshold < 1.0:
+                vector = self._vectorize(key)
+                best_key, best_score = None, 0.0
+                for candidate in list(self._by_signature.get(signature, ())):
+                    candidate_entry = self._entries[candidate]
+                    if self._is_expired(candidate_entry, now):
+                        self._remove(candidate)
+                        self.stats["expirations"] += 1
+                        continue
+                    score = self._cosine(vector, candidate_entry["vector"])
+                    if score > best_score:
+                        best_key, best_score = candidate, score
+
+                if best_key is not None and best_score >= self.similarity_threshold:
+                    self._entries.move_to_end(best_key)
+                    self.stats["similar_hits"] += 1
+                    return copy.deepcopy(self._entries[best_key]["analysis"])
+
+            self.stats["misses"] += 1
+            return None
+
+    def put(self, query: str, analysis: Dict[str, Any]):
+        """Store an analysis, evicting the least recently used entry when full"""
+        if self.max_size <= 0:
+            return
+        key, signature = self.normalize(query)
+
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = {
+                "analysis": copy.deepcopy(analysis),
+                "signature": signature,
+                "vector": self._vectorize(key),
+                "created": time.monotonic()
+            }
+            self._by_signature.setdefault(signature, set()).add(key)
+
+            while len(self._entries) > self.max_size:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.stats["evictions"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_signature.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Return hit/miss/eviction counters and current size"""
+        with self._lock:
+            stats = dict(self.stats)
+            stats["size"] = len(self._entries)
+        lookups = stats["hits"] + stats["similar_hits"] + stats["misses"]
+        stats["max_size"] = self.max_size
+        stats["hit_rate"] = round((stats["hits"] + stats["similar_hits"]) / lookups, 4) if lookups else 0.0
+        return stats
@@ -1,27 +1,18 @@
+import asyncio
+import hashlib
 import os
-import json
-from typing import Dict, Any
-from groq import Groq
+import threading
+from typing import Dict, Any, AsyncIterator, Iterator, List, Optional
+from llm_client import LLMClient
+from prompt_builder import PromptBuilder, TokenUsageTracker
+from response_store import ResponseStore, prompt_version
+from rule_analyzer import normalize_text
+from template_renderer import TemplateRenderer, ANSWER_MODES, TEMPLATE_QUERY_TYPES
+from metrics import span, registry
 
-class AnswerGenerator:
-    def __init__(self, api_key: str = None):
-        """
-        Initialize AnswerGenerator with Groq API
-        Get your free API key from: https://console.groq.com
-        """
-        self.api_key = api_key or os.getenv("GROQ_API_KEY")
-        if not self.api_key:
-            raise ValueError("GROQ_API_KEY not found in environment variables. Get one free at https://console.groq.com")
+registry.counter("answers_total", "Answers generated, by renderer (template, llm or stored)")
 
-        self.client = Groq(api_key=self.api_key)
-        self.model = "llama-3.3-70b-versatile"  # Free Llama 3.3 70B model
-
-    def generate_answer(self, query: str, query_results: Dict[str, Any]) -> Dict[str, Any]:
-        """
-        Generate a natural language answer from query results with citations
-        """
-
-        system_prompt = """You are an agricultural and climate data analyst. Your job is to:
+ANSWER_SYSTEM_PROMPT = """You are an agricultural and climate data analyst. Your job is to:
 1. Analyze the data provided
 2. Generate a clear, accurate answer to the user's question
 3. Include specific numbers and statistics
@@ -36,10 +27,10 @@ Format your response as:
 
 Be precise, professional, and data-driven."""
 
-        user_prompt = f"""User Question: {query}
+ANSWER_USER_PROMPT = """User Question: {query}
 
-Data Retrieved:
-{json.dumps(query_results, indent=2)}
+Data Retrieved (tables are header + "|"-separated rows):
+{data}
 
 Please provide a comprehensive answer to the user's question based on this data. Include:
 1. Direct answer with specific numbers
@@ -49,33 +40,124 @@ Please provide a comprehensive answer to the user's question based on this data.
 
 Keep the answer concise but informative."""
 
+ANSWER_PROMPT_VERSION = prompt_version(ANSWER_SYSTEM_PROMPT, ANSWER_USER_PROMPT)
+
+class AnswerGenerator:
+    def __init__(self, api_key: str = None, prompt_builder: PromptBuilder = None,
+                 usage_tracker: TokenUsageTracker = None, llm_client: LLMClient = None,
+                 template_renderer: TemplateRenderer = None, default_mode: str = "auto",
+                 store: ResponseStore = None):
+        """
+        Initialize AnswerGenerator with Groq API
+        Get your free API key from: https://console.groq.com
+
+        Query results are serialized by prompt_builder (compact, token
+        budgeted); token usage of every completion is recorded in usage_tracker.
+        Calls go through llm_client, which can be shared with other components.
+
+        Answers are rendered from a template instead of the LLM in mode
+        "fast", and in mode "auto" (the default) for ranking, comparison and
+        summary results, whose numbers need no interpretation. Mode "llm"
+        always calls the model.
+
+        If a store is given, LLM answers are persisted in it, keyed on the
+        normalized query, the data version, the model, the prompt version and
+        a digest of the serialized results. A stored answer is returned (or
+        streamed as a single chunk) without calling the model, with
+        "cached": True and no token usage.
+        """
+        if default_mode not in ANSWER_MODES:
+            raise ValueError(f"Unknown answer mode {default_mode!r}; expected one of {', '.join(ANSWER_MODES)}")
+        self.llm = llm_client or LLMClient(api_key=api_key or os.getenv("GROQ_API_KEY"))
+        self.model = "llama-3.3-70b-versatile"  # Free Llama 3.3 70B model
+        self.prompt_builder = prompt_builder or PromptBuilder()
+        self.usage_tracker = usage_tracker or TokenUsageTracker()
+        self.template_renderer = template_renderer or TemplateRenderer()
+        self.default_mode = default_mode
+        self.store = store
+        self._lock = threading.Lock()
+        self.stats = {"template": 0, "llm": 0, "stored": 0}
+
+    def renderer_for(self, query_results: Dict[str, Any], mode: str = None) -> str:
+        """"template" or "llm": who answers these results in the given mode"""
+        mode = mode or self.default_mode
+        if mode == "llm" or not self.template_renderer.supports(query_results):
+            return "llm"
+        if mode == "fast" or query_results.get("query_type", "general") in TEMPLATE_QUERY_TYPES:
+            return "template"
+        return "llm"
+
+    def _count(self, renderer: str):
+        with self._lock:
+            self.stats[renderer] += 1
+        registry.inc("answers_total", {"renderer": renderer})
+
+    def _build_messages(self, query: str, query_results: Dict[str, Any],
+                        serialized: str = None) -> List[Dict[str, str]]:
+        """Build the chat messages for answering a query from its (serialized) results"""
+        if serialized is None:
+            serialized = self.prompt_builder.serialize(query_results)
+        return [
+            {
+                "role": "system",
+                "content": ANSWER_SYSTEM_PROMPT
+            },
+            {
+                "role": "user",
+                "content": ANSWER_USER_PROMPT.format(query=query, data=serialized)
+            }
+        ]
+
+    def generate_answer(self, query: str, query_results: Dict[str, Any], mode: str = None,
+                        data_version: str = None) -> Dict[str, Any]:
+        """
+        Generate a natural language answer from query results with citations
+        """
         try:
-            chat_completion = self.client.chat.completions.create(
-                messages=[
-                    {
-                        "role": "system",
-                        "content": system_prompt
-                    },
-                    {
-                        "role": "user",
-                        "content": user_prompt
-                    }
-                ],
-                model=self.model,
-                temperature=0.3,
-                max_tokens=2048
-            )
-
-            answer = chat_completion.choices[0].message.content.strip()
+            if self.renderer_for(query_results, mode) == "template":
+                return self._template_answer(query, query_results)
 
+            serialized = self.prompt_builder.serialize(query_results)
+            key = self._store_key(query, serialized, data_version)
+            stored = self._stored_text(key)
+            if stored is not None:
+                return self._stored_answer(query, query_results, stored)
+
+            with span("llm_answer", metric="llm_request_duration_seconds", labels={"component": "answer"}):
+                chat_completion = self.llm.complete("answer", **self._llm_request(query, query_results, serialized))
+            return self._llm_answer(query, query_results, chat_completion, key)
+
+        except Exception as e:
             return {
-                "success": True,
-                "query": query,
-                "answer": answer,
-                "raw_data": query_results,
-                "sources": self._extract_sources(query_results)
+                "success": False,
+                "error": f"Answer generation failed: {str(e)}",
+                "query": query
             }
 
+    async def generate_answer_async(self, query: str, query_results: Dict[str, Any],
+                                    mode: str = None, data_version: str = None) -> Dict[str, Any]:
+        """
+        generate_answer() for the event loop: the LLM call is awaited, and the
+        store (SQLite, which may wait on other workers' writes) is read and
+        written in a thread
+        """
+        try:
+            if self.renderer_for(query_results, mode) == "template":
+                return self._template_answer(query, query_results)
+
+            serialized = self.prompt_builder.serialize(query_results)
+            key = self._store_key(query, serialized, data_version)
+            stored = await self._astored_text(key)
+            if stored is not None:
+                return self._stored_answer(query, query_results, stored)
+
+            with span("llm_answer", metric="llm_request_duration_seconds", labels={"component": "answer"}):
+                chat_completion = await self.llm.acomplete("answer",
+                                                           **self._llm_request(query, query_results, serialized))
+            answer = self._llm_answer(query, query_results, chat_completion)
+            await self._astore_text(key, answer["answer"])
+            return answer
+
         except Exception as e:
             return {
                 "success": False,
@@ -83,13 +165,168 @@ Keep the answer concise but informative."""
                 "query": query
             }
 
+    def _template_answer(self, query: str, query_results: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "success": True,
+            "query": query,
+            "answer": self._template_text(query, query_results),
+            "raw_data": query_results,
+            "sources": self._extract_sources(query_results),
+            "answer_renderer": "template",
+            "token_usage": None
+        }
+
+    def _llm_request(self, query: str, query_results: Dict[str, Any], serialized: str = None) -> Dict[str, Any]:
+        """Chat completion arguments for answering the query"""
+        return {
+            "messages": self._build_messages(query, query_results, serialized),
+            "model": self.model,
+            "temperature": 0.3,
+            "max_tokens": 2048
+        }
+
+    def _llm_answer(self, query: str, query_results: Dict[str, Any], chat_completion: Any,
+                    key: str = None) -> Dict[str, Any]:
+        answer = chat_completion.choices[0].message.content.strip()
+        usage = self.usage_tracker.usage_of(chat_completion)
+        self.usage_tracker.record("answer", usage)
+        self._count("llm")
+        self._store_text(key, answer)
+
+        return {
+            "success": True,
+            "query": query,
+            "answer": answer,
+            "raw_data": query_results,
+            "sources": self._extract_sources(query_results),
+            "answer_renderer": "llm",
+            "token_usage": usage
+        }
+
+    def stream_answer(self, query: str, query_results: Dict[str, Any], mode: str = None,
+                      data_version: str = None) -> Iterator[str]:
+        """
+        Stream the answer text chunk by chunk as the model produces it.
+        Exceptions from the API are propagated to the caller.
+        A template or stored answer is sent as a single chunk.
+        """
+        if self.renderer_for(query_results, mode) == "template":
+            yield self._template_text(query, query_results)
+            return
+
+        serialized = self.prompt_builder.serialize(query_results)
+        key = self._store_key(query, serialized, data_version)
+        stored = self._stored_text(key)
+        if stored is not None:
+            yield stored
+            return
+
+        self._count("llm")
+        # Time to the start of the stream; the stream itself is timed by the caller
+        with span("llm_answer", metric="llm_request_duration_seconds", labels={"component": "answer_stream"}):
+            stream = self.llm.stream("answer", **self._llm_request(query, query_results, serialized))
+
+        chunks = []
+        for chunk in stream:
+            content = self._chunk_text(chunk)
+            if content:
+                chunks.append(content)
+                yield content
+        # Only a stream read to the end is stored
+        self._store_text(key, "".join(chunks).strip())
+
+    async def stream_answer_async(self, query: str, query_results: Dict[str, Any],
+                                  mode: str = None, data_version: str = None) -> AsyncIterator[str]:
+        """stream_answer() for the event loop, with the store used from a thread"""
+        if self.renderer_for(query_results, mode) == "template":
+            yield self._template_text(query, query_results)
+            return
+
+        serialized = self.prompt_builder.serialize(query_results)
+        key = self._store_key(query, serialized, data_version)
+        stored = await self._astored_text(key)
+        if stored is not None:
+            yield stored
+            return
+
+        self._count("llm")
+        with span("llm_answer", metric="llm_request_duration_seconds", labels={"component": "answer_stream"}):
+            stream = await self.llm.astream("answer", **self._llm_request(query, query_results, serialized))
+
+        chunks = []
+        async for chunk in stream:
+            content = self._chunk_text(chunk)
+            if content:
+                chunks.append(content)
+                yield content
+        await self._astore_text(key, "".join(chunks).strip())
+
+    def _store_key(self, query: str, serialized: str, data_version: str = None) -> Optional[str]:
+        """The answer's key in the store, or None without a store"""
+        if self.store is None:
+            return None
+        results_digest = hashlib.sha256(serialized.encode()).hexdigest()
+        return ResponseStore.key("answer", normalize_text(query), data_version, self.model,
+                                 ANSWER_PROMPT_VERSION, results_digest)
+
+    def _stored_text(self, key: Optional[str]) -> Optional[str]:
+        if key is None:
+            return None
+        text = self.store.get("answer", key)
+        if text is not None:
+            self._count("stored")
+        return text
+
+    def _store_text(self, key: Optional[str], text: str):
+        if key is not None and text:
+            self.store.put("answer", key, text)
+
+    async def _astored_text(self, key: Optional[str]) -> Optional[str]:
+        if key is None:
+            return None
+        return await asyncio.to_thread(self._stored_text, key)
+
+    async def _astore_text(self, key: Optional[str], text: str):
+        if key is not None and text:
+            await asyncio.to_thread(self.store.put, "answer", key, text)
+
+    def _stored_answer(self, query: str, query_results: Dict[str, Any], text: str) -> Dict[str, Any]:
+        return {
+            "success": True,
+            "query": query,
+            "answer": text,
+            "raw_data": query_results,
+            "sources": self._extract_sources(query_results),
+            "answer_renderer": "llm",
+            "cached": True,
+            "token_usage": None
+        }
+
+    def _template_text(self, query: str, query_results: Dict[str, Any]) -> str:
+        with span("template_answer"):
+            answer = self.template_renderer.render(query, query_results)
+        self._count("template")
+        return answer
+
+    def _chunk_text(self, chunk: Any) -> Optional[str]:
+        """The text of one stream chunk (recording usage when the chunk carries it)"""
+        usage = self.usage_tracker.usage_of(chunk)
+        if usage:
+            self.usage_tracker.record("answer", usage)
+        if not chunk.choices:
+            return None
+        return chunk.choices[0].delta.content
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"default_mode": self.default_mode, "renderers": dict(self.stats)}
+
     def _extract_sources(self, query_results: Dict[str, Any]) -> list:
-        """Extract data sources from query results"""
+        """The data sources behind query results: the datasets their query read"""
         sources = []
+        data_sources = query_results.get("data_sources") or []
 
-        query_type = query_results.get("query_type", "")
-
-        if "crop" in str(query_results):
+        if "crop" in data_sources:
             sources.append({
                 "dataset": "Crop Production Data",
                 "region": "Karnataka",
@@ -97,7 +334,7 @@ Keep the answer concise but informative."""
                 "description": "District-level crop production data for Kharif, Rabi, and Summer seasons"
             })
 
-        if "rainfall" in str(query_results):
+        if "rainfall" in data_sources:
             sources.append({
                 "dataset": "Rainfall Data",
                 "region": "Tamil Nadu",
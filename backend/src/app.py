@@ -1,12 +1,31 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context, g
 from flask_cors import CORS
 from dotenv import load_dotenv
+import contextlib
+import json
 import os
+import time
 
 from data_loader import DataLoader
 from query_analyzer import QueryAnalyzer
+from rule_analyzer import RuleBasedAnalyzer
+from analysis_cache import AnalysisCache
+from response_store import ResponseStore
 from query_processor import QueryProcessor
+from correlation_engine import CorrelationEngine
 from answer_generator import AnswerGenerator
+from prompt_builder import PromptBuilder, TokenUsageTracker
+from llm_client import LLMClient, RetryBudget
+from admission import AdmissionController, AdmissionError, LLMQuota, client_id
+from query_pipeline import QueryPipeline, PipelineError
+from single_flight import SingleFlight
+from data_api import DataAPI, DataAPIError
+from request_options import (RequestError, query_text, answer_mode, raw_data_option, batch_queries,
+                             shape_raw_data, with_raw_data, sse)
+from http_cache import HttpCache, weak_etag
+from shared_data import process_memory
+from structured_log import logger, start_request
+import metrics
 
 # Load environment variables
 load_dotenv()
@@ -15,14 +34,198 @@ load_dotenv()
 app = Flask(__name__)
 CORS(app)
 
+# JSON log records are written by a background thread; large payloads are sampled and capped
+logger.configure(
+    level=os.getenv('LOG_LEVEL', 'info'),
+    payload_sample_rate=float(os.getenv('LOG_PAYLOAD_SAMPLE_RATE', '0.1')),
+    max_field_chars=int(os.getenv('LOG_MAX_FIELD_CHARS', '2000'))
+)
+
 # Initialize components
 print("Initializing Samarth Q&A System...")
 data_loader = DataLoader(data_dir="../data")
-query_analyzer = QueryAnalyzer()
-query_processor = QueryProcessor(data_loader)
-answer_generator = AnswerGenerator()
+data_loader.start_watcher(float(os.getenv('DATA_WATCH_INTERVAL', '0')))
+rule_analyzer = None
+if os.getenv('FAST_ANALYZER_ENABLED', 'true').lower() == 'true':
+    rule_analyzer = RuleBasedAnalyzer(
+        data_loader,
+        min_confidence=float(os.getenv('FAST_ANALYZER_MIN_CONFIDENCE', '0.75'))
+    )
+analysis_cache = AnalysisCache(
+    data_loader,
+    max_size=int(os.getenv('ANALYSIS_CACHE_SIZE', '512')),
+    ttl_seconds=float(os.getenv('ANALYSIS_CACHE_TTL', '3600')),
+    similarity_threshold=float(os.getenv('ANALYSIS_CACHE_SIMILARITY', '0.9'))
+)
+# LLM analyses and answers persisted on disk, shared by the workers and kept across restarts
+response_store = None
+if os.getenv('RESPONSE_STORE_ENABLED', 'true').lower() == 'true':
+    response_store = ResponseStore(
+        os.getenv('RESPONSE_STORE_PATH') or os.path.join(os.getenv('DATA_CACHE_DIR') or '../data/.cache',
+                                                         'responses.sqlite3'),
+        max_bytes=int(float(os.getenv('RESPONSE_STORE_MAX_MB', '64')) * 1024 * 1024),
+        ttl_seconds=float(os.getenv('RESPONSE_STORE_TTL', '604800'))
+    )
+usage_tracker = TokenUsageTracker()
+# Our Groq rate limits (0 = unlimited): LLM calls are paced to stay within them
+llm_quota = LLMQuota(
+    requests_per_minute=float(os.getenv('LLM_RPM', '0')),
+    tokens_per_minute=float(os.getenv('LLM_TPM', '0'))
+)
+# One LLM client (and connection pool) shared by the analyzer and the answer generator
+llm_client = LLMClient(
+    timeout=float(os.getenv('LLM_TIMEOUT', '30')),
+    max_retries=int(os.getenv('LLM_MAX_RETRIES', '2')),
+    retry_budget=RetryBudget(ratio=float(os.getenv('LLM_RETRY_BUDGET', '0.2'))),
+    hedge_delay=float(os.getenv('LLM_HEDGE_DELAY')) if os.getenv('LLM_HEDGE_DELAY') else None,
+    max_connections=int(os.getenv('LLM_MAX_CONNECTIONS', '20')),
+    quota=llm_quota if llm_quota.enabled else None
+)
+query_analyzer = QueryAnalyzer(
+    rule_analyzer=rule_analyzer,
+    cache=analysis_cache,
+    usage_tracker=usage_tracker,
+    llm_client=llm_client,
+    hedge=os.getenv('LLM_HEDGE_ANALYSIS', 'false').lower() == 'true',
+    store=response_store
+)
+correlation_engine = CorrelationEngine(
+    data_loader.get_partition_store(),
+    crosswalk_path=os.getenv('DISTRICT_CROSSWALK', '../data/district_crosswalk.csv')
+)
+query_processor = QueryProcessor(data_loader, correlation_engine=correlation_engine)
+answer_generator = AnswerGenerator(
+    prompt_builder=PromptBuilder(token_budget=int(os.getenv('PROMPT_TOKEN_BUDGET', '1500'))),
+    usage_tracker=usage_tracker,
+    llm_client=llm_client,
+    default_mode=os.getenv('ANSWER_MODE', 'auto').lower(),
+    store=response_store
+)
+# Identical queries arriving together share one pipeline run
+single_flight = SingleFlight() if os.getenv('COALESCE_QUERIES', 'true').lower() == 'true' else None
+pipeline = QueryPipeline(data_loader, query_analyzer, query_processor, answer_generator,
+                         request_timeout=float(os.getenv('REQUEST_TIMEOUT', '60')),
+                         single_flight=single_flight,
+                         process_threads=int(os.getenv('PROCESS_THREADS', '4')))
+
+# Rankings and comparisons for dashboards, served from the loaded data without the LLM
+data_api = DataAPI(data_loader, max_k=int(os.getenv('DATA_API_MAX_K', '1000')))
+
+# Bounded, fair admission to the query endpoints; requests beyond it are shed with 503/429
+admission = None
+if os.getenv('ADMISSION_ENABLED', 'true').lower() == 'true':
+    admission = AdmissionController(
+        max_in_flight=int(os.getenv('ADMISSION_MAX_IN_FLIGHT', '64')),
+        max_queue=int(os.getenv('ADMISSION_QUEUE_SIZE', '256')),
+        queue_timeout=float(os.getenv('ADMISSION_QUEUE_TIMEOUT', '10')),
+        max_per_client=int(os.getenv('ADMISSION_CLIENT_LIMIT', '32')),
+        quota=llm_quota if llm_quota.enabled else None
+    )
+
+BATCH_MAX_QUERIES = int(os.getenv('BATCH_MAX_QUERIES', '500'))
+BATCH_CONCURRENCY = int(os.getenv('BATCH_CONCURRENCY', '4'))
+BATCH_MAX_CONCURRENCY = int(os.getenv('BATCH_MAX_CONCURRENCY', '16'))
+TIMING_HEADER_ENABLED = os.getenv('TIMING_HEADER_ENABLED', 'true').lower() == 'true'
+
+# Serialized bodies of data-version-dependent GETs, conditional requests and compression
+http_cache = HttpCache(
+    min_compress_bytes=int(os.getenv('HTTP_COMPRESS_MIN_BYTES', '1024')),
+    max_entries=int(os.getenv('HTTP_CACHE_ENTRIES', '256'))
+)
+HTTP_CACHE_MAX_AGE = int(os.getenv('HTTP_CACHE_MAX_AGE', '60'))
+# Cache-Control per endpoint; data endpoints are revalidated with their ETag after max-age
+CACHE_POLICIES = {
+    '/example-queries': 'public, max-age=86400',
+    '/data-summary': f'public, max-age={HTTP_CACHE_MAX_AGE}',
+    '/api/rank': f'public, max-age={HTTP_CACHE_MAX_AGE}',
+    '/api/compare': f'public, max-age={HTTP_CACHE_MAX_AGE}',
+}
+
+# Counters other components already keep, exported on /metrics at scrape time
+metrics.registry.add_collector(
+    "analysis_path_total", "counter", "Query analyses by path (rules, cache, store, llm)",
+    lambda: [({"path": path}, count) for path, count in query_analyzer.get_stats()["paths"].items()]
+)
+metrics.registry.add_collector(
+    "analysis_cache_events_total", "counter", "Analysis cache hits, misses, evictions and expirations",
+    lambda: [({"event": event}, count) for event, count in analysis_cache.get_stats().items()
+             if event in ("hits", "similar_hits", "misses", "evictions", "expirations")]
+)
+metrics.registry.add_collector(
+    "correlation_cache_events_total", "counter", "Correlation result cache hits and misses",
+    lambda: [({"event": event}, correlation_engine.get_stats()[event]) for event in ("hits", "misses")]
+)
+metrics.registry.add_collector(
+    "partitions_resident_bytes", "gauge", "Memory used by loaded data partitions",
+    lambda: [({}, data_loader.get_partition_store().get_stats()["resident_bytes"])]
+)
+metrics.registry.add_collector(
+    "process_resident_bytes", "gauge", "Resident memory of this worker (private: not shared with other workers)",
+    lambda: [({"kind": kind.replace("_bytes", "")}, value) for kind, value in process_memory().items()
+             if kind.endswith("_bytes") and value is not None]
+)
+metrics.registry.add_collector(
+    "llm_tokens_total", "counter", "LLM tokens used by stage and kind",
+    lambda: [({"component": component, "kind": kind.replace("_tokens", "")}, totals[kind])
+             for component, totals in usage_tracker.get_stats().items()
+             for kind in ("prompt_tokens", "completion_tokens")]
+)
+if response_store is not None:
+    metrics.registry.add_collector(
+        "response_store_events_total", "counter", "Response store lookups and writes by kind; evictions and errors",
+        lambda: [({"kind": kind, "event": event}, count)
+                 for kind, counts in response_store.get_stats()["kinds"].items() for event, count in counts.items()]
+                + [({"kind": "all", "event": event}, response_store.stats[event])
+                   for event in ("expired", "evictions", "errors")]
+    )
+    metrics.registry.add_collector(
+        "response_store_bytes", "gauge", "Size of the responses held in the response store",
+        lambda: [({}, response_store.get_stats().get("bytes", 0))]
+    )
+if admission is not None:
+    metrics.registry.add_collector(
+        "admission_requests", "gauge", "Query requests running and waiting for admission",
+        lambda: [({"state": "in_flight"}, admission.get_stats()["in_flight"]),
+                 ({"state": "queued"}, admission.get_stats()["queue_depth"])]
+    )
+if single_flight is not None:
+    metrics.registry.add_collector(
+        "coalesced_queries_total", "counter", "Queries that ran (leader) or shared an in-flight run (follower)",
+        lambda: [({"role": role[:-1]}, single_flight.get_stats()[role]) for role in ("leaders", "followers")]
+    )
 print("System initialized successfully!")
 
+@app.before_request
+def start_request_trace():
+    g.request_started = time.perf_counter()
+    g.trace = metrics.start_trace()
+    g.request_id = start_request(request.headers.get('X-Request-ID'))
+
+@app.after_request
+def record_request_metrics(response):
+    """Request latency/count metrics and a Server-Timing breakdown of the pipeline stages"""
+    started = getattr(g, "request_started", None)
+    if started is None:
+        return response
+    elapsed = time.perf_counter() - started
+    endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+    metrics.registry.observe("http_request_duration_seconds", elapsed, {"endpoint": endpoint})
+    metrics.registry.inc("http_requests_total", {"endpoint": endpoint, "method": request.method,
+                                                 "status": response.status_code})
+    # Streamed bodies are produced after this hook runs, so their stages are not included
+    if TIMING_HEADER_ENABLED:
+        response.headers["Server-Timing"] = metrics.server_timing(g.trace, total=elapsed)
+    response.headers["X-Request-ID"] = g.request_id
+    if 200 <= response.status_code < 300 or response.status_code == 304:
+        response.headers.setdefault("Cache-Control", CACHE_POLICIES.get(endpoint, "no-store"))
+    else:
+        # Errors (e.g. a 400 for an unknown metric) must not be served from shared caches
+        response.headers["Cache-Control"] = "no-store"
+    http_cache.compress_response(request, response)
+    logger.info("request", method=request.method, endpoint=endpoint, status=response.status_code,
+                duration_ms=round(elapsed * 1000, 2))
+    return response
+
 @app.route('/')
 def home():
     return jsonify({
@@ -30,30 +233,143 @@ def home():
         "version": "1.0.0",
         "endpoints": {
             "/query": "POST - Submit a natural language query",
+            "/query/stream": "POST/GET - Submit a query and stream the answer (Server-Sent Events)",
+            "/query/batch": "POST - Submit a list of queries",
             "/data-summary": "GET - Get summary of available data",
+            "/api/rank": "GET - Districts ranked by a metric (no LLM)",
+            "/api/compare": "GET - Data for the named districts (no LLM)",
+            "/stats": "GET - Query pipeline statistics",
+            "/metrics": "GET - Prometheus metrics",
+            "/admin/reload": "POST - Reload datasets (requires X-Admin-Token)",
             "/health": "GET - Health check"
         }
     })
 
 @app.route('/health')
 def health():
-    return jsonify({"status": "healthy", "message": "Samarth API is running"})
+    return jsonify({
+        "status": "healthy",
+        "message": "Samarth API is running",
+        "data_version": data_loader.data_version
+    })
 
 @app.route('/data-summary')
 def data_summary():
     """Get summary of available datasets"""
     try:
-        summary = data_loader.get_data_summary()
-        return jsonify({
-            "success": True,
-            "data": summary
-        })
+        snapshot = data_loader.snapshot()
+        return http_cache.respond(
+            request, ("/data-summary", snapshot.version),
+            lambda: {
+                "success": True,
+                "data": snapshot.view.summary,
+                "memory": data_loader.get_memory_report(snapshot),
+                "data_version": snapshot.version
+            },
+            etag=weak_etag("/data-summary", snapshot.version),
+            cache_control=CACHE_POLICIES['/data-summary']
+        )
     except Exception as e:
         return jsonify({
             "success": False,
             "error": str(e)
         }), 500
 
+@app.route('/stats')
+def stats():
+    """Get query pipeline statistics (fast-path and cache hit rates)"""
+    return jsonify({
+        "success": True,
+        "analysis": query_analyzer.get_stats(),
+        "partitions": data_loader.get_partition_store().get_stats(),
+        "correlation": correlation_engine.get_stats(),
+        "tokens": usage_tracker.get_stats(),
+        "llm": llm_client.get_stats(),
+        "answers": answer_generator.get_stats(),
+        "coalescing": single_flight.get_stats() if single_flight is not None else None,
+        "admission": admission.get_stats() if admission is not None else None,
+        "llm_quota": llm_quota.get_stats() if llm_quota.enabled else None,
+        "response_store": response_store.get_stats() if response_store is not None else None,
+        "logging": logger.get_stats(),
+        "http_cache": http_cache.get_stats(),
+        "memory": _memory_stats()
+    })
+
+def _memory_stats():
+    """This worker's resident memory and the shared-memory datasets it is attached to"""
+    shared = data_loader.get_shared_data()
+    return dict(process_memory(), shared_data=shared.get_stats() if shared is not None else None)
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Latency histograms, error and cache counters in Prometheus text format"""
+    return Response(metrics.registry.render(), mimetype="text/plain; version=0.0.4")
+
+@app.route('/admin/reload', methods=['GET', 'POST'])
+def admin_reload():
+    """
+    Reload the datasets in the background (POST) or check reload status (GET).
+    Requires the X-Admin-Token header to match ADMIN_TOKEN; disabled if unset.
+    """
+    admin_token = os.getenv('ADMIN_TOKEN')
+    if not admin_token or request.headers.get('X-Admin-Token') != admin_token:
+        return jsonify({
+            "success": False,
+            "error": "Forbidden"
+        }), 403
+
+    if request.method == 'GET':
+        return jsonify({"success": True, "reload": data_loader.get_reload_status()})
+
+    status = data_loader.reload(background=True)
+    return jsonify({"success": True, "reload": status}), 202
+
+def _admit():
+    """A pipeline slot (Ticket) for the calling client, or None without admission control"""
+    if admission is None:
+        return None
+    return admission.acquire(client_id(request.headers, request.remote_addr))
+
+def _data_api_response(handler):
+    """
+    Serve a /api/* GET from the HTTP cache: the ETag depends only on the
+    data version and the query string, so a revalidation is answered
+    without running the handler
+    """
+    snapshot = data_loader.snapshot()
+    args = sorted(request.args.items(multi=True))
+    try:
+        return http_cache.respond(
+            request, (request.path, snapshot.version, tuple(args)),
+            lambda: handler(request.args, snapshot),
+            etag=weak_etag(request.path, snapshot.version, args),
+            cache_control=CACHE_POLICIES[request.path]
+        )
+    except DataAPIError as e:
+        return jsonify(e.to_response()), e.status
+
+@app.route('/api/rank')
+def api_rank():
+    """
+    Districts ranked by one column, without any LLM call
+
+    Query parameters: dataset (crop | rainfall), metric and season (or
+    column), order (asc | desc), k, offset, fields, districts
+    e.g. /api/rank?dataset=crop&metric=production&season=kharif&order=asc&k=20
+    """
+    return _data_api_response(data_api.rank)
+
+@app.route('/api/compare')
+def api_compare():
+    """
+    Data for the named districts side by side, without any LLM call
+
+    Query parameters: districts (comma-separated), dataset (optional,
+    default both), fields
+    e.g. /api/compare?dataset=rainfall&districts=Chennai,Salem
+    """
+    return _data_api_response(data_api.compare)
+
 @app.route('/query', methods=['POST'])
 def query():
     """
@@ -61,114 +377,186 @@ def query():
 
     Expected JSON body:
     {
-        "query": "Your natural language question here"
+        "query": "Your natural language question here",
+        "mode": "auto" | "fast" | "llm",   (optional, default ANSWER_MODE)
+        "raw_data": "full" | "omit",       (optional, default "full")
+        "raw_data_offset": 0,              (optional, page raw_data rows)
+        "raw_data_limit": 50               (optional)
     }
     """
     try:
         data = request.get_json()
+        user_query = query_text(data)
+        mode = answer_mode(data)
+        raw_data = raw_data_option(data)
 
-        if not data or 'query' not in data:
-            return jsonify({
-                "success": False,
-                "error": "Missing 'query' field in request body"
-            }), 400
+        with _admit() or contextlib.nullcontext():
+            answer = with_raw_data(pipeline.run(user_query, mode=mode), raw_data)
+        with metrics.span("encode"):
+            return jsonify(answer)
 
-        user_query = data['query']
+    except RequestError as e:
+        return jsonify(e.to_response()), e.status
 
-        if not user_query or len(user_query.strip()) == 0:
-            return jsonify({
-                "success": False,
-                "error": "Query cannot be empty"
-            }), 400
+    except AdmissionError as e:
+        return jsonify(e.to_response()), e.status, e.headers()
 
-        print(f"\n=== Processing Query ===")
-        print(f"Query: {user_query}")
+    except PipelineError as e:
+        return jsonify(e.to_response()), e.status
 
-        # Step 1: Analyze the query
-        print("Step 1: Analyzing query...")
-        available_data = data_loader.get_data_summary()
-        query_analysis = query_analyzer.analyze_query(user_query, available_data)
-
-        if "error" in query_analysis:
-            return jsonify({
-                "success": False,
-                "error": query_analysis["error"],
-                "stage": "query_analysis"
-            }), 500
-
-        print(f"Query Analysis: {query_analysis}")
-
-        # Step 2: Process the query and retrieve data
-        print("Step 2: Processing query and retrieving data...")
-        query_results = query_processor.process_query(query_analysis)
+    except Exception as e:
+        logger.error("request_failed", endpoint="/query", error=str(e))
+        metrics.record_error("internal")
+        return jsonify({
+            "success": False,
+            "error": f"Internal server error: {str(e)}"
+        }), 500
 
-        if "error" in query_results:
-            return jsonify({
-                "success": False,
-                "error": query_results["error"],
-                "stage": "query_processing"
-            }), 500
+@app.route('/query/batch', methods=['POST'])
+def query_batch():
+    """
+    Process a list of natural language queries concurrently
 
-        print(f"Query Results: {query_results}")
+    Expected JSON body:
+    {
+        "queries": ["question 1", "question 2", ...],
+        "concurrency": 4,   (optional, capped by BATCH_MAX_CONCURRENCY)
+        "mode": "auto",     (optional, applies to every query)
+        "raw_data": "omit"  (optional, as for /query, with raw_data_offset/limit)
+    }
+    """
+    try:
+        data = request.get_json(silent=True)
+        queries, concurrency = batch_queries(data, BATCH_MAX_QUERIES, BATCH_CONCURRENCY, BATCH_MAX_CONCURRENCY)
+        mode = answer_mode(data)
+        raw_data = raw_data_option(data)
 
-        # Step 3: Generate natural language answer
-        print("Step 3: Generating answer...")
-        answer = answer_generator.generate_answer(user_query, query_results)
+        with _admit() or contextlib.nullcontext():
+            logger.info("batch_received", queries=len(queries), concurrency=concurrency)
+            results = pipeline.run_batch(queries, concurrency=concurrency, mode=mode)
+        if raw_data is not None:
+            results = dict(results, results=[with_raw_data(item, raw_data) for item in results["results"]])
+        with metrics.span("encode"):
+            return jsonify(results)
 
-        print(f"Answer generated successfully!")
-        print("=" * 50)
+    except RequestError as e:
+        return jsonify(e.to_response()), e.status
 
-        return jsonify(answer)
+    except AdmissionError as e:
+        return jsonify(e.to_response()), e.status, e.headers()
 
     except Exception as e:
-        print(f"Error processing query: {str(e)}")
+        logger.error("request_failed", endpoint="/query/batch", error=str(e))
+        metrics.record_error("internal")
         return jsonify({
             "success": False,
             "error": f"Internal server error: {str(e)}"
         }), 500
 
+@app.route('/query/stream', methods=['GET', 'POST'])
+def query_stream():
+    """
+    Streaming variant of /query using Server-Sent Events
+
+    Accepts the same JSON body as /query (POST) or ?query=...&mode=... (GET, for
+    EventSource). Emits events in order:
+    - start:    sent immediately so the client sees the first byte at once
+    - analysis: the query analysis
+    - data:     the retrieved data (same as raw_data in /query, null if omitted)
+    - token:    {"text": ...} for each chunk of the answer
+    - done:     {"sources": [...], ...}
+    - error:    {"error": ..., "stage": ...} if a stage fails
+    """
+    if request.method == 'GET':
+        data = dict(request.args) if 'query' in request.args else None
+    else:
+        data = request.get_json(silent=True)
+
+    try:
+        user_query = query_text(data)
+        mode = answer_mode(data)
+        raw_data = raw_data_option(data)
+        # Held until the stream is closed
+        ticket = _admit()
+    except RequestError as e:
+        return jsonify(e.to_response()), e.status
+    except AdmissionError as e:
+        return jsonify(e.to_response()), e.status, e.headers()
+
+    def events():
+        yield sse("start", {"query": user_query})
+        try:
+            for event, payload in pipeline.stream(user_query, mode=mode):
+                if event == "data":
+                    payload = shape_raw_data(payload, raw_data)
+                yield sse(event, payload)
+        except Exception as e:
+            logger.error("request_failed", endpoint="/query/stream", error=str(e))
+            metrics.record_error("internal")
+            yield sse("error", {
+                "success": False,
+                "error": f"Internal server error: {str(e)}"
+            })
+
+    response = Response(
+        stream_with_context(events()),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        }
+    )
+    if ticket is not None:
+        response.call_on_close(ticket.release)
+    return response
+
+# Static, so its body is serialized (and compressed) once
+EXAMPLE_QUERIES = {
+    "examples": [
+        {
+            "category": "Comparison",
+            "queries": [
+                "Compare rainfall in Chennai vs Coimbatore",
+                "Compare crop production between Raichur and Belagavi districts",
+                "Which district has more rainfall: Nagapattinam or Kanniyakumari?"
+            ]
+        },
+        {
+            "category": "Ranking",
+            "queries": [
+                "Which district has the highest crop production in Karnataka?",
+                "Top 5 districts by rainfall in Tamil Nadu",
+                "Districts with lowest crop yield",
+                "Rank districts by total crop area"
+            ]
+        },
+        {
+            "category": "Analysis",
+            "queries": [
+                "What is the average rainfall across Tamil Nadu?",
+                "Total crop production in Karnataka",
+                "Which season contributes most to crop production?",
+                "Seasonal rainfall patterns in Tamil Nadu"
+            ]
+        },
+        {
+            "category": "Specific Data",
+            "queries": [
+                "Crop production data for Mysuru district",
+                "Rainfall data for Salem district",
+                "How much area is under cultivation in Ballari?",
+                "What is the yield in Hassan district?"
+            ]
+        }
+    ]
+}
+EXAMPLE_QUERIES_ETAG = weak_etag(json.dumps(EXAMPLE_QUERIES, sort_keys=True))
+
 @app.route('/example-queries')
 def example_queries():
     """Get example queries users can try"""
-    return jsonify({
-        "examples": [
-            {
-                "category": "Comparison",
-                "queries": [
-                    "Compare rainfall in Chennai vs Coimbatore",
-                    "Compare crop production between Raichur and Belagavi districts",
-                    "Which district has more rainfall: Nagapattinam or Kanniyakumari?"
-                ]
-            },
-            {
-                "category": "Ranking",
-                "queries": [
-                    "Which district has the highest crop production in Karnataka?",
-                    "Top 5 districts by rainfall in Tamil Nadu",
-                    "Districts with lowest crop yield",
-                    "Rank districts by total crop area"
-                ]
-            },
-            {
-                "category": "Analysis",
-                "queries": [
-                    "What is the average rainfall across Tamil Nadu?",
-                    "Total crop production in Karnataka",
-                    "Which season contributes most to crop production?",
-                    "Seasonal rainfall patterns in Tamil Nadu"
-                ]
-            },
-            {
-                "category": "Specific Data",
-                "queries": [
-                    "Crop production data for Mysuru district",
-                    "Rainfall data for Salem district",
-                    "How much area is under cultivation in Ballari?",
-                    "What is the yield in Hassan district?"
-                ]
-            }
-        ]
-    })
+    return http_cache.respond(request, '/example-queries', lambda: EXAMPLE_QUERIES, etag=EXAMPLE_QUERIES_ETAG,
+                              cache_control=CACHE_POLICIES['/example-queries'])
 
 if __name__ == '__main__':
     port = int(os.getenv('PORT', 5000))
@@ -0,0 +1,222 @@
+import contextlib
+import functools
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional
+
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.background import BackgroundTask
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.requests import Request
+from starlette.responses import Response, StreamingResponse
+from starlette.routing import Mount, Route
+
+# The Flask app module: same components, configuration and singletons
+import app as flask_app
+from admission import AdmissionError, Ticket, client_id
+from query_pipeline import PipelineError
+from request_options import (RequestError, query_text, answer_mode, raw_data_option, batch_queries,
+                             shape_raw_data, with_raw_data, sse)
+from structured_log import logger, start_request
+import metrics
+
+# Asynchronous serving mode: the LLM-bound endpoints (/query, /query/batch,
+# /query/stream) run on the event loop, so one process holds hundreds of
+# queries in flight while they wait on the LLM. Only the CPU-bound process
+# stage is handed to a thread pool (PROCESS_THREADS). Every other endpoint
+# is the Flask app, run on WSGI_THREADS threads.
+#
+# Run from backend/src:
+#     uvicorn asgi_app:app --host 0.0.0.0 --port 5000
+pipeline = flask_app.pipeline
+admission = flask_app.admission
+http_cache = flask_app.http_cache
+TIMING_HEADER_ENABLED = flask_app.TIMING_HEADER_ENABLED
+
+
+def instrumented(endpoint: str):
+    """The Flask app's before/after request hooks, for a native route"""
+    def decorate(handler: Callable[[Request], Awaitable[Response]]) -> Callable[[Request], Awaitable[Response]]:
+        @functools.wraps(handler)
+        async def wrapper(request: Request) -> Response:
+            started = time.perf_counter()
+            trace = metrics.start_trace()
+            request_id = start_request(request.headers.get("X-Request-ID"))
+
+            response = await handler(request)
+
+            elapsed = time.perf_counter() - started
+            metrics.registry.observe("http_request_duration_seconds", elapsed, {"endpoint": endpoint})
+            metrics.registry.inc("http_requests_total", {"endpoint": endpoint, "method": request.method,
+                                                         "status": response.status_code})
+            # Streamed bodies are produced after this point, so their stages are not included
+            if TIMING_HEADER_ENABLED:
+                response.headers["Server-Timing"] = metrics.server_timing(trace, total=elapsed)
+            response.headers["X-Request-ID"] = request_id
+            response.headers.setdefault("Cache-Control", "no-store")
+            logger.info("request", method=request.method, endpoint=endpoint, status=response.status_code,
+                        duration_ms=round(elapsed * 1000, 2))
+            return response
+        return wrapper
+    return decorate
+
+
+def json_response(request: Request, payload: Dict[str, Any], status: int = 200) -> Response:
+    """The body jsonify() would send, compressed like the Flask app's responses"""
+    with metrics.span("encode"):
+        body = (flask_app.app.json.dumps(payload, separators=(",", ":")) + "\n").encode()
+        data, encoding = http_cache.compress_body(request, body)
+    response = Response(data, status_code=status, media_type="application/json")
+    if encoding:
+        response.headers["Content-Encoding"] = encoding
+    if len(body) >= http_cache.min_compress_bytes:
+        response.headers["Vary"] = "Accept-Encoding"
+    return response
+
+
+async def admit(request: Request) -> Optional[Ticket]:
+    """A pipeline slot for the calling client, or None without admission control"""
+    if admission is None:
+        return None
+    return await admission.acquire_async(client_id(request.headers, request.client.host if request.client else None))
+
+
+def rejected(request: Request, error: AdmissionError) -> Response:
+    response = json_response(request, error.to_response(), error.status)
+    response.headers.update(error.headers())
+    return response
+
+
+async def json_body(request: Request) -> Optional[Any]:
+    """The JSON request body, or None if it is missing or invalid"""
+    try:
+        return await request.json()
+    except ValueError:
+        return None
+
+
+@instrumented("/query")
+async def query(request: Request) -> Response:
+    """/query (see app.py) on the event loop"""
+    try:
+        data = await json_body(request)
+        user_query = query_text(data)
+        mode = answer_mode(data)
+        raw_data = raw_data_option(data)
+
+        with await admit(request) or contextlib.nullcontext():
+            answer = with_raw_data(await pipeline.run_async(user_query, mode=mode), raw_data)
+        return json_response(request, answer)
+
+    except (RequestError, PipelineError) as e:
+        return json_response(request, e.to_response(), e.status)
+
+    except AdmissionError as e:
+        return rejected(request, e)
+
+    except Exception as e:
+        logger.error("request_failed", endpoint="/query", error=str(e))
+        metrics.record_error("internal")
+        return json_response(request, {
+            "success": False,
+            "error": f"Internal server error: {str(e)}"
+        }, 500)
+
+
+@instrumented("/query/batch")
+async def query_batch(request: Request) -> Response:
+    """/query/batch (see app.py): the queries run as tasks, not threads"""
+    try:
+        data = await json_body(request)
+        queries, concurrency = batch_queries(data, flask_app.BATCH_MAX_QUERIES, flask_app.BATCH_CONCURRENCY,
+                                             flask_app.BATCH_MAX_CONCURRENCY)
+        mode = answer_mode(data)
+        raw_data = raw_data_option(data)
+
+        with await admit(request) or contextlib.nullcontext():
+            logger.info("batch_received", queries=len(queries), concurrency=concurrency)
+            results = await pipeline.run_batch_async(queries, concurrency=concurrency, mode=mode)
+        if raw_data is not None:
+            results = dict(results, results=[with_raw_data(item, raw_data) for item in results["results"]])
+        return json_response(request, results)
+
+    except RequestError as e:
+        return json_response(request, e.to_response(), e.status)
+
+    except AdmissionError as e:
+        return rejected(request, e)
+
+    except Exception as e:
+        logger.error("request_failed", endpoint="/query/batch", error=str(e))
+        metrics.record_error("internal")
+        return json_response(request, {
+            "success": False,
+            "error": f"Internal server error: {str(e)}"
+        }, 500)
+
+
+@instrumented("/query/stream")
+async def query_stream(request: Request) -> Response:
+    """/query/stream (see app.py): the same Server-Sent Events"""
+    if request.method == "GET":
+        data = dict(request.query_params) if "query" in request.query_params else None
+    else:
+        data = await json_body(request)
+
+    try:
+        user_query = query_text(data)
+        mode = answer_mode(data)
+        raw_data = raw_data_option(data)
+        # Held until the stream has ended
+        ticket = await admit(request)
+    except RequestError as e:
+        return json_response(request, e.to_response(), e.status)
+    except AdmissionError as e:
+        return rejected(request, e)
+
+    async def events() -> AsyncIterator[str]:
+        yield sse("start", {"query": user_query})
+        try:
+            async for event, payload in pipeline.stream_async(user_query, mode=mode):
+                if event == "data":
+                    payload = shape_raw_data(payload, raw_data)
+                yield sse(event, payload)
+        except Exception as e:
+            logger.error("request_failed", endpoint="/query/stream", error=str(e))
+            metrics.record_error("internal")
+            yield sse("error", {
+                "success": False,
+                "error": f"Internal server error: {str(e)}"
+            })
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"
+        },
+        background=BackgroundTask(ticket.release) if ticket is not None else None
+    )
+
+
+@asynccontextmanager
+async def lifespan(_: Starlette) -> AsyncIterator[None]:
+    yield
+    pipeline.shutdown()
+
+
+app = Starlette(
+    routes=[
+        Route("/query", query, methods=["POST"]),
+        Route("/query/batch", query_batch, methods=["POST"]),
+        Route("/query/stream", query_stream, methods=["GET", "POST"]),
+        Mount("/", app=WSGIMiddleware(flask_app.app, workers=int(os.getenv("WSGI_THREADS", "10"))))
+    ],
+    # As CORS(app) does for Flask; on Flask's own responses it replaces the same headers
+    middleware=[Middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])],
+    lifespan=lifespan
+)
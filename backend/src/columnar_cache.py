@@ -0,0 +1,157 @@
+import hashlib
+import json
+import os
+import numpy as np
+import pandas as pd
+from typing import Dict, Any, Optional
+
+CACHE_FORMAT_VERSION = 1
+
+
+def file_sha256(path: str, chunk_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ColumnarCache:
+    def __init__(self, cache_dir: str):
+        """
+        Binary columnar cache of parsed CSV files.
+
+        Each source file gets a JSON manifest plus one NumPy .npy file per
+        column, loaded with mmap so later starts skip CSV parsing entirely.
+        Entries are named after the file and a digest of its full path, so
+        files with the same name in different directories (partitions
+        <state>/<year>.csv) never share one.
+        A cache entry is valid while the source's size and mtime match; if
+        only the mtime changed, the content hash decides. Any failure falls
+        back to the CSV, and write errors (e.g. read-only disk) are ignored.
+        """
+        self.cache_dir = cache_dir
+
+    @staticmethod
+    def _entry_name(source_path: str) -> str:
+        """'<file name>.<digest of its absolute path>': the prefix of the entry's files"""
+        path_digest = hashlib.sha1(os.path.abspath(source_path).encode()).hexdigest()[:12]
+        return f"{os.path.basename(source_path)}.{path_digest}"
+
+    def _manifest_path(self, source_path: str) -> str:
+        return os.path.join(self.cache_dir, f"{self._entry_name(source_path)}.manifest.json")
+
+    def _read_manifest(self, source_path: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._manifest_path(source_path)) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if manifest.get("format") != CACHE_FORMAT_VERSION:
+            return None
+        return manifest
+
+    def _is_fresh(self, source_path: str, manifest: Dict[str, Any]) -> bool:
+        stat = os.stat(source_path)
+        source = manifest["source"]
+        if stat.st_size != source["size"]:
+            return False
+        if stat.st_mtime_ns == source["mtime_ns"]:
+            return True
+
+        # Touched but possibly unchanged (e.g. a fresh git checkout)
+        if file_sha256(source_path) != source["sha256"]:
+            return False
+        source["mtime_ns"] = stat.st_mtime_ns
+        self._write_manifest(source_path, manifest)
+        return True
+
+    def load(self, source_path: str) -> Optional[pd.DataFrame]:
+        """Return the cached DataFrame for source_path, or None if missing/stale"""
+        manifest = self._read_manifest(source_path)
+        if manifest is None:
+            return None
+
+        try:
+            if not self._is_fresh(source_path, manifest):
+                return None
+
+            data = {}
+            for column in manifest["columns"]:
+                values = np.load(os.path.join(self.cache_dir, column["file"]), mmap_mode="r")
+                if column["kind"] == "string":
+                    values = values.astype(object)
+                    if column.get("null_file"):
+                        nulls = np.load(os.path.join(self.cache_dir, column["null_file"]))
+                        values[nulls] = np.nan
+                data[column["name"]] = values
+            return pd.DataFrame(data, columns=[column["name"] for column in manifest["columns"]])
+
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Ignoring unreadable data cache for {os.path.basename(source_path)}: {e}")
+            return None
+
+    def store(self, source_path: str, df: pd.DataFrame):
+        """Write df as the cache entry for source_path (best effort)"""
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            stat = os.stat(source_path)
+            sha256 = file_sha256(source_path)
+            entry_name = self._entry_name(source_path)
+            prefix = f"{entry_name}.{sha256[:12]}"
+
+            columns = []
+            for i, name in enumerate(df.columns):
+                series = df[name]
+                column = {"name": name, "file": f"{prefix}.col{i}.npy"}
+
+                if pd.api.types.is_numeric_dtype(series.dtype) and not pd.api.types.is_bool_dtype(series.dtype):
+                    column["kind"] = "numeric"
+                    values = series.to_numpy()
+                else:
+                    # Stored as fixed-width unicode so it can be mmap'd without pickle
+                    column["kind"] = "string"
+                    nulls = series.isna().to_numpy()
+                    values = series.astype(str).to_numpy().astype(str)
+                    if nulls.any():
+                        column["null_file"] = f"{prefix}.col{i}.null.npy"
+                        self._save_array(column["null_file"], nulls)
+
+                self._save_array(column["file"], values)
+                columns.append(column)
+
+            self._write_manifest(source_path, {
+                "format": CACHE_FORMAT_VERSION,
+                "source": {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": sha256},
+                "rows": len(df),
+                "columns": columns
+            })
+            self._remove_stale_files(entry_name, prefix)
+
+        except (OSError, ValueError, TypeError) as e:
+            print(f"Could not write data cache for {os.path.basename(source_path)}: {e}")
+
+    def _save_array(self, file_name: str, values: np.ndarray):
+        # Write-then-rename so concurrent workers never read a partial file
+        path = os.path.join(self.cache_dir, file_name)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, values, allow_pickle=False)
+        os.replace(tmp_path, path)
+
+    def _write_manifest(self, source_path: str, manifest: Dict[str, Any]):
+        path = self._manifest_path(source_path)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, path)
+
+    def _remove_stale_files(self, entry_name: str, current_prefix: str):
+        """Delete column files written for older versions of the source (this entry's only)"""
+        for file_name in os.listdir(self.cache_dir):
+            if (file_name.startswith(f"{entry_name}.") and file_name.endswith(".npy")
+                    and not file_name.startswith(f"{current_prefix}.")):
+                try:
+                    os.remove(os.path.join(self.cache_dir, file_name))
+                except OSError:
+                    pass
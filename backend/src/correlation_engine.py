@@ -0,0 +1,275 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+from district_index import DistrictIndex, normalize_name
+from partition_store import PartitionStore, state_slug
+
+CROP_SEASON_CODES = ["total", "kharif", "rabi", "summer"]
+RAINFALL_SEASON_CODES = ["total", "sw_monsoon", "ne_monsoon", "winter", "hot_weather"]
+
+# Pairs with fewer joined observations are not reported
+MIN_OBSERVATIONS = 3
+
+
+def pairwise_corr(x: np.ndarray, y: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Pearson correlation of every column of x (n, p) with every column of y
+    (n, q), using the rows where both values are present. Returns (r, n)
+    matrices of shape (p, q), computed with matrix products only.
+    """
+    mx, my = ~np.isnan(x), ~np.isnan(y)
+    x0, y0 = np.where(mx, x, 0.0), np.where(my, y, 0.0)
+    fx, fy = mx.astype(float), my.astype(float)
+
+    n = fx.T @ fy
+    sx, sy = x0.T @ fy, fx.T @ y0
+    sxx, syy = (x0 * x0).T @ fy, fx.T @ (y0 * y0)
+    sxy = x0.T @ y0
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cov = sxy - sx * sy / n
+        var_x = sxx - sx * sx / n
+        var_y = syy - sy * sy / n
+        r = cov / np.sqrt(var_x * var_y)
+    r = np.where((n >= MIN_OBSERVATIONS) & (var_x > 0) & (var_y > 0), np.clip(r, -1.0, 1.0), np.nan)
+    return r, n
+
+
+def pairwise_spearman(x: np.ndarray, y: np.ndarray) -> np.ndarray:
+    """
+    Spearman's rho of every column of x with every column of y: Pearson
+    correlation of ranks (ties averaged) taken over the rows where both
+    values are present, as pairwise_corr counts them.
+    """
+    mx, my = ~np.isnan(x), ~np.isnan(y)
+    if mx.all() and my.all():
+        # Every pair uses every row: rank each column once
+        return pairwise_corr(_ranks(x), _ranks(y))[0]
+
+    r = np.full((x.shape[1], y.shape[1]), np.nan)
+    for i in range(x.shape[1]):
+        for j in range(y.shape[1]):
+            both = mx[:, i] & my[:, j]
+            if both.sum() >= MIN_OBSERVATIONS:
+                r[i, j] = pairwise_corr(_ranks(x[both, i:i + 1]), _ranks(y[both, j:j + 1]))[0][0, 0]
+    return r
+
+
+def _ranks(values: np.ndarray) -> np.ndarray:
+    return pd.DataFrame(values).rank().to_numpy(dtype=float)
+
+
+def _value_columns(frame: pd.DataFrame) -> List[str]:
+    return [c for c in frame.select_dtypes(include="number").columns if c not in ("sl_no", "year")]
+
+
+def strength(r: float) -> str:
+    size = abs(r)
+    if size >= 0.7:
+        return "strong"
+    if size >= 0.4:
+        return "moderate"
+    if size >= 0.2:
+        return "weak"
+    return "negligible"
+
+
+class CorrelationEngine:
+    def __init__(self, partitions: PartitionStore, crosswalk_path: str = None, max_cached: int = 256):
+        """
+        Crop-rainfall correlations over districts present in both datasets.
+
+        Rainfall districts are matched to crop districts of the same state
+        through a crosswalk table (normalized names and known aliases, plus
+        overrides from an optional CSV with state, crop_district and
+        rainfall_district columns). The joined frame is built once per
+        partition fingerprint and lag; results are cached for the same
+        fingerprint, so repeated questions do no work.
+        """
+        self.partitions = partitions
+        self.crosswalk_path = crosswalk_path
+        self.max_cached = max_cached
+
+        self._lock = threading.Lock()
+        self._fingerprint = None
+        self._crosswalk: Optional[pd.DataFrame] = None
+        self._joined: Dict[int, pd.DataFrame] = {}
+        self._results: "OrderedDict[tuple, Dict[str, Any]]" = OrderedDict()
+        self.stats = {"hits": 0, "misses": 0, "builds": 0}
+
+    def _sync(self) -> str:
+        """Drop everything derived from older data"""
+        fingerprint = self.partitions.fingerprint()
+        if self.crosswalk_path and os.path.exists(self.crosswalk_path):
+            stat = os.stat(self.crosswalk_path)
+            fingerprint += f":{stat.st_size}:{stat.st_mtime_ns}"
+        with self._lock:
+            if fingerprint != self._fingerprint:
+                self._fingerprint = fingerprint
+                self._crosswalk = None
+                self._joined = {}
+                self._results.clear()
+        return fingerprint
+
+    def _load_overrides(self) -> pd.DataFrame:
+        if not self.crosswalk_path or not os.path.exists(self.crosswalk_path):
+            return pd.DataFrame(columns=["state", "crop_district", "rainfall_district"])
+        overrides = pd.read_csv(self.crosswalk_path)
+        missing = {"state", "crop_district", "rainfall_district"} - set(overrides.columns)
+        if missing:
+            raise ValueError(f"district crosswalk is missing columns: {sorted(missing)}")
+        return overrides
+
+    def crosswalk(self) -> pd.DataFrame:
+        """
+        One row per matched district: state_key, crop_key, rainfall_key and
+        the rainfall district name. Only states present in both datasets can match.
+        """
+        self._sync()
+        with self._lock:
+            if self._crosswalk is not None:
+                return self._crosswalk
+
+        crop = self.partitions.scan("crop")
+        rainfall = self.partitions.scan("rainfall")
+        overrides = self._load_overrides()
+        override_keys = {
+            (state_slug(row.state), normalize_name(row.rainfall_district)): normalize_name(row.crop_district)
+            for row in overrides.itertuples(index=False)
+        }
+
+        rows = []
+        crop_states = crop.assign(state_key=crop["state"].map(state_slug)).groupby("state_key", observed=True)["district"]
+        rainfall_states = rainfall.assign(state_key=rainfall["state"].map(state_slug)).groupby("state_key", observed=True)["district"]
+        rainfall_names = {key: names for key, names in rainfall_states}
+
+        for state_key, crop_names in crop_states:
+            if state_key not in rainfall_names:
+                continue
+            crop_names = crop_names.drop_duplicates().tolist()
+            index = DistrictIndex(crop_names)
+            for name in rainfall_names[state_key].drop_duplicates():
+                rainfall_key = normalize_name(name)
+                crop_key = override_keys.get((state_key, rainfall_key))
+                if crop_key is None:
+                    lookup = index.lookup(name)
+                    # Only unambiguous exact/alias matches; fuzzy guesses would skew results
+                    if lookup["match"] not in ("exact", "alias") or len(lookup["names"]) != 1:
+                        continue
+                    crop_key = normalize_name(lookup["names"][0])
+                rows.append({"state_key": state_key, "crop_key": crop_key, "rainfall_key": rainfall_key,
+                             "rainfall_district": name})
+
+        crosswalk = pd.DataFrame(rows, columns=["state_key", "crop_key", "rainfall_key", "rainfall_district"])
+        with self._lock:
+            self._crosswalk = crosswalk
+        return crosswalk
+
+    def joined(self, lag: int = 0) -> pd.DataFrame:
+        """
+        Crop rows joined to the rainfall of the same district `lag` years
+        earlier. Columns: state, district, year, crop_<column>, rain_<column>.
+        """
+        self._sync()
+        with self._lock:
+            if lag in self._joined:
+                return self._joined[lag]
+
+        crosswalk = self.crosswalk()
+        crop = self.partitions.scan("crop")
+        rainfall = self.partitions.scan("rainfall")
+
+        crop = crop.assign(state_key=crop["state"].map(state_slug), crop_key=crop["district"].map(normalize_name))
+        rainfall = rainfall.assign(state_key=rainfall["state"].map(state_slug),
+                                   rainfall_key=rainfall["district"].map(normalize_name),
+                                   year=rainfall["year"] + lag)
+        rainfall = rainfall.merge(crosswalk[["state_key", "crop_key", "rainfall_key"]],
+                                  on=["state_key", "rainfall_key"], how="inner")
+
+        crop_part = crop[["state", "district", "year", "state_key", "crop_key"]].join(
+            crop[_value_columns(crop)].add_prefix("crop_"))
+        rain_part = rainfall[["state_key", "crop_key", "year"]].join(
+            rainfall[_value_columns(rainfall)].add_prefix("rain_"))
+        joined = crop_part.merge(rain_part, on=["state_key", "crop_key", "year"], how="inner")
+
+        with self._lock:
+            self._joined[lag] = joined
+            self.stats["builds"] += 1
+        return joined
+
+    def correlate(self, crop_columns: List[str], rainfall_columns: List[str], lags: Tuple[int, ...] = (0,),
+                  states: List[str] = None, year_range: Tuple[Optional[int], Optional[int]] = None) -> Dict[str, Any]:
+        """
+        Pearson and Spearman coefficients for every (crop column, rainfall
+        column, lag) combination, over the district-years matching the filters.
+        """
+        fingerprint = self._sync()
+        key = (fingerprint, tuple(crop_columns), tuple(rainfall_columns), tuple(lags),
+               tuple(sorted(state_slug(s) for s in states or [])), tuple(year_range or ()))
+        with self._lock:
+            cached = self._results.get(key)
+            if cached is not None:
+                self._results.move_to_end(key)
+                self.stats["hits"] += 1
+                return cached
+            self.stats["misses"] += 1
+
+        pairs = []
+        observations = 0
+        for lag in lags:
+            frame = self.joined(lag)
+            mask = np.ones(len(frame), dtype=bool)
+            if states:
+                mask &= frame["state_key"].isin([state_slug(s) for s in states]).to_numpy()
+            start, end = year_range or (None, None)
+            if start is not None:
+                mask &= (frame["year"] >= start).to_numpy()
+            if end is not None:
+                mask &= (frame["year"] <= end).to_numpy()
+            frame = frame[mask]
+            observations = max(observations, len(frame))
+
+            x_cols = [c for c in crop_columns if f"crop_{c}" in frame.columns]
+            y_cols = [c for c in rainfall_columns if f"rain_{c}" in frame.columns]
+            if frame.empty or not x_cols or not y_cols:
+                continue
+
+            x = frame[[f"crop_{c}" for c in x_cols]].to_numpy(dtype=float)
+            y = frame[[f"rain_{c}" for c in y_cols]].to_numpy(dtype=float)
+            pearson, n = pairwise_corr(x, y)
+            spearman = pairwise_spearman(x, y)
+
+            valid = ~np.isnan(pearson)
+            for i, j in zip(*np.nonzero(valid)):
+                pairs.append({
+                    "crop_metric": x_cols[i],
+                    "rainfall_metric": y_cols[j],
+                    "lag_years": lag,
+                    "pearson": round(float(pearson[i, j]), 3),
+                    "spearman": None if np.isnan(spearman[i, j]) else round(float(spearman[i, j]), 3),
+                    "observations": int(n[i, j]),
+                    "strength": strength(float(pearson[i, j]))
+                })
+
+        result = {"pairs": pairs, "observations": observations}
+        with self._lock:
+            self._results[key] = result
+            while len(self._results) > self.max_cached:
+                self._results.popitem(last=False)
+        return result
+
+    def coverage(self) -> Dict[str, List[str]]:
+        """States available in each dataset, for explaining empty results"""
+        coverage: Dict[str, List[str]] = {}
+        for entry in self.partitions.partitions():
+            states = coverage.setdefault(entry["dataset"], [])
+            if entry["state"] not in states:
+                states.append(entry["state"])
+        return coverage
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self.stats, cached_results=len(self._results))
@@ -0,0 +1,206 @@
+import math
+import re
+from typing import Dict, Any, List, Mapping, Optional
+from data_loader import DataLoader, DataSnapshot
+from materialized_view import ID_COLUMNS, RAINFALL_DEPARTURE
+from query_plan import (Branch, Filter, Limit, PlanExecutor, Project, QueryPlan, Scan, Sort, optimize,
+                        CROP_METRICS, CROP_SEASONS, RAINFALL_SEASONS)
+from schema import SEASON_CODES
+
+DATASETS = ("crop", "rainfall")
+RAINFALL_METRICS = ("actual", "normal", "departure")
+DEFAULT_METRICS = {"crop": "production", "rainfall": "actual"}
+
+# Returned with every row unless `fields` says otherwise
+DEFAULT_FIELDS = {
+    "crop": ["total_production", "total_yield", "total_area"],
+    "rainfall": ["total_actual", "total_normal", RAINFALL_DEPARTURE],
+}
+
+
+class DataAPIError(Exception):
+    def __init__(self, message: str, status: int = 400):
+        """Invalid request parameters (or missing data); maps onto the API error response"""
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+    def to_response(self) -> Dict[str, Any]:
+        return {"success": False, "error": self.message}
+
+
+def _number(value: float) -> Optional[float]:
+    return None if math.isnan(value) else value
+
+
+class DataAPI:
+    def __init__(self, data_loader: DataLoader, max_k: int = 1000, max_districts: int = 100):
+        """
+        Rankings and district lookups for dashboards, answered straight from
+        the loaded snapshot without any LLM call.
+
+        Requests are built into the same query plans as /query (scan,
+        filter, sort, limit, project) and run by the plan executor, so a
+        ranking over all districts is a slice of the precomputed orders
+        and a ranking within a district subset uses argpartition.
+        """
+        self.data_loader = data_loader
+        self.max_k = max_k
+        self.max_districts = max_districts
+
+    @staticmethod
+    def _dataset(params: Mapping[str, str]) -> str:
+        dataset = (params.get("dataset") or "").strip().lower()
+        if dataset not in DATASETS:
+            raise DataAPIError(f"'dataset' must be one of: {', '.join(DATASETS)}")
+        return dataset
+
+    @staticmethod
+    def _int(params: Mapping[str, str], name: str, default: int, minimum: int, maximum: int = None) -> int:
+        try:
+            value = int(params.get(name, default))
+        except (TypeError, ValueError):
+            raise DataAPIError(f"'{name}' must be an integer")
+        if value < minimum or (maximum is not None and value > maximum):
+            bounds = f"between {minimum} and {maximum}" if maximum is not None else f"at least {minimum}"
+            raise DataAPIError(f"'{name}' must be {bounds}")
+        return value
+
+    @staticmethod
+    def _list(params: Mapping[str, str], name: str) -> List[str]:
+        return [item.strip() for item in re.split(r"[,;]", params.get(name) or "") if item.strip()]
+
+    @staticmethod
+    def _columns(frame) -> List[str]:
+        return [c for c in frame.select_dtypes(include="number").columns if c not in ID_COLUMNS]
+
+    def _rank_column(self, dataset: str, params: Mapping[str, str], available: List[str]) -> str:
+        """`column`, or `metric` + `season` (canonical code or season name), as a canonical column"""
+        column = (params.get("column") or "").strip().lower()
+        if not column:
+            metric = (params.get("metric") or DEFAULT_METRICS[dataset]).strip().lower()
+            metrics = CROP_METRICS if dataset == "crop" else RAINFALL_METRICS
+            if metric not in metrics:
+                raise DataAPIError(f"'metric' for {dataset} must be one of: {', '.join(metrics)}")
+            season = (params.get("season") or "total").strip()
+            code = SEASON_CODES.get(season.title(), season.lower().replace(" ", "_"))
+            seasons = ("total",) + (CROP_SEASONS if dataset == "crop" else RAINFALL_SEASONS)
+            if code not in seasons:
+                raise DataAPIError(f"'season' for {dataset} must be one of: {', '.join(seasons)}")
+            if metric == "departure":
+                if code != "total":
+                    raise DataAPIError("Rainfall departure is only available for season 'total'")
+                column = RAINFALL_DEPARTURE
+            else:
+                column = f"{code}_{metric}"
+        if column not in available:
+            raise DataAPIError(f"Unknown column '{column}' for {dataset}; available: {', '.join(available)}")
+        return column
+
+    def _fields(self, dataset: str, params: Mapping[str, str], available: List[str], first: str = None) -> List[str]:
+        fields = self._list(params, "fields")
+        unknown = [f for f in fields if f not in available]
+        if unknown:
+            raise DataAPIError(f"Unknown fields for {dataset}: {', '.join(unknown)}; "
+                               f"available: {', '.join(available)}")
+        fields = fields or DEFAULT_FIELDS[dataset]
+        return list(dict.fromkeys(([first] if first else []) + fields))
+
+    @staticmethod
+    def _rows(frame, fields: List[str], offset: int = None) -> List[Dict[str, Any]]:
+        """Row dicts with district, the fields (NaN as null) and the rank when offset is given"""
+        values = {field: frame[field].to_numpy(dtype=float) for field in fields}
+        rows = []
+        for i, district in enumerate(frame["district"].astype(str).tolist()):
+            row = {"rank": offset + i + 1} if offset is not None else {}
+            row["district"] = district
+            for field, column in values.items():
+                row[field] = _number(float(column[i]))
+            rows.append(row)
+        return rows
+
+    def rank(self, params: Mapping[str, str], snapshot: DataSnapshot = None) -> Dict[str, Any]:
+        """
+        Districts of a dataset ranked by one column, a page at a time:
+        dataset, metric/season or column, order, k, offset, fields and an
+        optional districts filter
+        """
+        dataset = self._dataset(params)
+        snapshot = snapshot or self.data_loader.snapshot()
+        frame = snapshot.crop_data if dataset == "crop" else snapshot.rainfall_data
+        available = self._columns(frame)
+        column = self._rank_column(dataset, params, available)
+        fields = self._fields(dataset, params, available, first=column)
+
+        order = (params.get("order") or "desc").strip().lower()
+        if order not in ("asc", "desc"):
+            raise DataAPIError("'order' must be 'asc' or 'desc'")
+        k = self._int(params, "k", 10, 1, self.max_k)
+        offset = self._int(params, "offset", 0, 0)
+        districts = self._list(params, "districts")[:self.max_districts]
+
+        steps = [Filter("district", districts)] if districts else []
+        steps += [Sort(column, ascending=order == "asc"), Limit(k, offset), Project({f: f for f in fields})]
+        plan = optimize(QueryPlan("ranking", [Branch(dataset, Scan(dataset, "snapshot"), steps)]))
+        output = PlanExecutor(snapshot, self.data_loader.get_partition_store()).execute(plan)[dataset]
+
+        scan = output["scan"]
+        total = len(frame) if scan.positions is None else len(set(scan.positions.tolist()))
+        rows = self._rows(output["frame"], fields, offset=offset)
+        response = {
+            "success": True,
+            "dataset": dataset,
+            "ranked_by": column,
+            "order": order,
+            "k": k,
+            "offset": offset,
+            "total": total,
+            "next_offset": offset + k if offset + k < total else None,
+            "data": rows,
+            "data_version": snapshot.version
+        }
+        if scan.lookup is not None and scan.lookup["unmatched"]:
+            response["unmatched_districts"] = scan.lookup["unmatched"]
+        return response
+
+    def compare(self, params: Mapping[str, str], snapshot: DataSnapshot = None) -> Dict[str, Any]:
+        """The named districts side by side: districts, optional dataset (default both) and fields"""
+        districts = self._list(params, "districts")
+        if not districts:
+            raise DataAPIError("'districts' is required, e.g. districts=Chennai,Salem")
+        if len(districts) > self.max_districts:
+            raise DataAPIError(f"Too many districts: {len(districts)} (maximum {self.max_districts})")
+        datasets = [self._dataset(params)] if params.get("dataset") else list(DATASETS)
+
+        snapshot = snapshot or self.data_loader.snapshot()
+        requested = self._list(params, "fields")
+        branches, fields = [], {}
+        for dataset in datasets:
+            available = self._columns(snapshot.crop_data if dataset == "crop" else snapshot.rainfall_data)
+            if len(datasets) > 1 and requested:
+                # Field names are per dataset: each one returns those it has
+                fields[dataset] = [f for f in requested if f in available]
+                if not fields[dataset]:
+                    continue
+            else:
+                fields[dataset] = self._fields(dataset, params, available)
+            branches.append(Branch(dataset, Scan(dataset, "snapshot"),
+                                   [Filter("district", districts), Project({f: f for f in fields[dataset]})]))
+        if not branches:
+            raise DataAPIError(f"Unknown fields: {', '.join(requested)}")
+
+        plan = optimize(QueryPlan("comparison", branches))
+        outputs = PlanExecutor(snapshot, self.data_loader.get_partition_store()).execute(plan)
+
+        response = {"success": True, "data": {}, "data_version": snapshot.version}
+        ambiguous, unmatched = [], []
+        for dataset, output in outputs.items():
+            response["data"][dataset] = self._rows(output["frame"], fields[dataset])
+            ambiguous += output["scan"].lookup["ambiguous"]
+            unmatched.append(set(output["scan"].lookup["unmatched"]))
+        if ambiguous:
+            response["ambiguous_districts"] = ambiguous
+        not_found = set.intersection(*unmatched) if unmatched else set()
+        if not_found:
+            response["unmatched_districts"] = [d for d in districts if d in not_found]
+        return response
@@ -1,35 +1,278 @@
 import pandas as pd
+import hashlib
 import os
-from typing import Dict, Any
+import threading
+import time
+from typing import Dict, Any, Optional
+from columnar_cache import ColumnarCache
+from district_index import DistrictIndex
+from materialized_view import MaterializedView
+from partition_store import PartitionStore
+from schema import compact_frame, canonical_columns, memory_report
+from shared_data import SHARED_DATA_ENV, SharedData
+
+CROP_FILE = "crop_production.csv"
+RAINFALL_FILE = "rainfall_data.csv.csv"
+
+# States covered by the primary CSVs, used to place them in the partitioned
+# multi-year store (their years come from CROP_DATA_YEAR / RAINFALL_DATA_YEAR)
+CROP_STATE = "Karnataka"
+RAINFALL_STATE = "Tamil Nadu"
+
+# In the canonical schema (see schema.py); the district column comes first
+CROP_REQUIRED_COLUMNS = ['district', 'total_production', 'total_yield', 'total_area',
+                         'kharif_production', 'rabi_production', 'summer_production']
+RAINFALL_REQUIRED_COLUMNS = ['district', 'total_actual', 'total_normal']
+
+
+class DataSnapshot:
+    """
+    Immutable, versioned view of the loaded datasets and everything derived
+    from them. Requests grab one snapshot and use it throughout, so a reload
+    never changes data under an in-flight query.
+    """
+    __slots__ = ("version", "loaded_at", "crop_data", "rainfall_data", "crop_index", "rainfall_index", "view",
+                 "memory")
+
+    def __init__(self, version: str, crop_data: pd.DataFrame, rainfall_data: pd.DataFrame,
+                 memory: Dict[str, Any] = None, orders: Dict[str, Any] = None):
+        object.__setattr__(self, "version", version)
+        object.__setattr__(self, "memory", memory or {})
+        object.__setattr__(self, "loaded_at", time.time())
+        object.__setattr__(self, "crop_data", crop_data)
+        object.__setattr__(self, "rainfall_data", rainfall_data)
+        # Build district lookup indexes once, instead of scanning per request
+        object.__setattr__(self, "crop_index", DistrictIndex(crop_data['district'].tolist()))
+        object.__setattr__(self, "rainfall_index", DistrictIndex(rainfall_data['district'].tolist()))
+        # Precompute filtered frames, sort orders and summaries for this data version
+        object.__setattr__(self, "view", MaterializedView(crop_data, rainfall_data, version, orders=orders))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("DataSnapshot is read-only")
+
 
 class DataLoader:
-    def __init__(self, data_dir: str = "../data"):
+    def __init__(self, data_dir: str = "../data", cache_dir: str = None):
         self.data_dir = data_dir
-        self.crop_data = None
-        self.rainfall_data = None
-        self.load_data()
+        # Parsed CSVs are cached in a binary columnar format for fast startup
+        self.cache = None
+        if os.getenv("DATA_CACHE_ENABLED", "true").lower() == "true":
+            self.cache = ColumnarCache(cache_dir or os.getenv("DATA_CACHE_DIR") or os.path.join(data_dir, ".cache"))
 
-    def load_data(self):
-        """Load CSV files into pandas DataFrames"""
-        try:
-            # Load crop production data
-            crop_path = os.path.join(self.data_dir, "crop_production.csv")
-            self.crop_data = pd.read_csv(crop_path)
-            print(f"Loaded crop data: {len(self.crop_data)} rows")
+        self._snapshot: Optional[DataSnapshot] = None
+        self._reload_lock = threading.Lock()
+        self.reload_status = {"state": "idle", "error": None, "started_at": None, "finished_at": None}
+        self._watcher = None
+        # Datasets exported to shared memory by the gunicorn master, if any
+        self._shared: Optional[SharedData] = None
+
+        # Multi-year/multi-state data, loaded lazily per partition
+        self.partitions = PartitionStore(
+            os.path.join(data_dir, "partitions"),
+            max_memory_mb=float(os.getenv("PARTITION_MEMORY_MB", "256")),
+            cache=self.cache
+        )
+        # The primary CSVs are partitions too, served from the current
+        # snapshot's frames rather than parsed and held a second time
+        crop_path, rainfall_path = self.source_paths
+        self.partitions.register("crop", CROP_STATE, int(os.getenv("CROP_DATA_YEAR", "2017")), crop_path,
+                                 source=lambda: self._snapshot_partition("crop"))
+        self.partitions.register("rainfall", RAINFALL_STATE, int(os.getenv("RAINFALL_DATA_YEAR", "2017")),
+                                 rainfall_path, source=lambda: self._snapshot_partition("rainfall"))
 
-            # Load rainfall data
-            rainfall_path = os.path.join(self.data_dir, "rainfall_data.csv.csv")
-            self.rainfall_data = pd.read_csv(rainfall_path)
-            print(f"Loaded rainfall data: {len(self.rainfall_data)} rows")
+        self.load_data()
 
-            # Clean up column names
-            self.crop_data.columns = self.crop_data.columns.str.strip()
-            self.rainfall_data.columns = self.rainfall_data.columns.str.strip()
+    @property
+    def source_paths(self) -> list:
+        return [os.path.join(self.data_dir, CROP_FILE), os.path.join(self.data_dir, RAINFALL_FILE)]
 
+    def load_data(self):
+        """Load CSV files into pandas DataFrames and publish them as the current snapshot"""
+        try:
+            self._snapshot = self._build_snapshot()
         except Exception as e:
             print(f"Error loading data: {e}")
             raise
 
+    def _build_snapshot(self) -> DataSnapshot:
+        """Load, clean and validate the datasets into a new snapshot (does not publish it)"""
+        crop_path, rainfall_path = self.source_paths
+        version = self._compute_version([crop_path, rainfall_path])
+
+        shared = self._attach_shared(version)
+        if shared is not None:
+            return DataSnapshot(version, shared.frames["crop"], shared.frames["rainfall"], shared.memory,
+                                orders=shared.orders)
+
+        # Load crop production data
+        crop_source = self._read_csv(crop_path)
+        print(f"Loaded crop data: {len(crop_source)} rows")
+
+        # Load rainfall data
+        rainfall_source = self._read_csv(rainfall_path)
+        print(f"Loaded rainfall data: {len(rainfall_source)} rows")
+
+        # Canonical short columns, categorical names, downcast numbers; the
+        # source frames are dropped once this returns
+        crop_data = self._compact("crop", crop_source, CROP_STATE, CROP_REQUIRED_COLUMNS, "crop data")
+        rainfall_data = self._compact("rainfall", rainfall_source, RAINFALL_STATE, RAINFALL_REQUIRED_COLUMNS,
+                                      "rainfall data")
+
+        memory = {
+            "crop": self._memory_entry("crop", crop_source, crop_data),
+            "rainfall": self._memory_entry("rainfall", rainfall_source, rainfall_data)
+        }
+        return DataSnapshot(version, crop_data, rainfall_data, memory)
+
+    def _attach_shared(self, version: str) -> Optional[SharedData]:
+        """
+        The master's shared-memory export of this data version, attached
+        read-only; None (load privately) if there is none, it is for other
+        files, or it cannot be attached
+        """
+        manifest = os.getenv(SHARED_DATA_ENV)
+        if SharedData.manifest_version(manifest) != version:
+            return None
+        if self._shared is None or self._shared.version != version:
+            try:
+                self._shared = SharedData.attach(manifest)
+            except (OSError, ValueError, KeyError) as e:
+                print(f"Could not attach shared data, loading it privately: {e}")
+                return None
+            print(f"Attached shared data: version {version}, {self._shared.size} bytes")
+            if self._shared.copied:
+                print(f"Shared columns copied into this worker: {self._shared.get_stats()['copied_columns']}")
+        return self._shared
+
+    @staticmethod
+    def _compact(dataset: str, source: pd.DataFrame, state: str, required_columns: list, name: str) -> pd.DataFrame:
+        """Source frame -> district-level frame in the canonical schema, rejecting data that would break queries"""
+        missing = [column for column in required_columns
+                   if column not in canonical_columns(dataset, list(source.columns)).values()]
+        if missing:
+            raise ValueError(f"{name} is missing columns: {missing}")
+        try:
+            frame = compact_frame(dataset, source, state=state)
+        except ValueError as e:
+            raise ValueError(f"{name}: {e}")
+        if frame.empty:
+            raise ValueError(f"{name} has no rows")
+        if frame[required_columns[0]].isna().any():
+            raise ValueError(f"{name} has rows without a district name")
+        return frame
+
+    @staticmethod
+    def _memory_entry(dataset: str, source: pd.DataFrame, frame: pd.DataFrame) -> Dict[str, Any]:
+        kept = {column for column, name in canonical_columns(dataset, list(source.columns)).items()
+                if name in frame.columns}
+        return {
+            "source_rows": len(source),
+            "source_bytes": int(source.memory_usage(deep=True).sum()),
+            "dropped_columns": [str(column).strip() for column in source.columns if column not in kept]
+        }
+
+    def _read_csv(self, path: str) -> pd.DataFrame:
+        """Read a CSV through the columnar cache, falling back to parsing it"""
+        if self.cache is not None:
+            df = self.cache.load(path)
+            if df is not None:
+                return df
+
+        df = pd.read_csv(path)
+        if self.cache is not None:
+            self.cache.store(path, df)
+        return df
+
+    @staticmethod
+    def _compute_version(paths: list) -> str:
+        """Short fingerprint of the source files (name, size, mtime)"""
+        digest = hashlib.sha1()
+        for path in paths:
+            stat = os.stat(path)
+            digest.update(f"{os.path.basename(path)}:{stat.st_size}:{stat.st_mtime_ns};".encode())
+        return digest.hexdigest()[:12]
+
+    def reload(self, background: bool = True) -> Dict[str, Any]:
+        """
+        Load the datasets again and atomically swap in the new snapshot.
+        The current snapshot stays in service until the new one is fully
+        built and validated; on failure it is kept. Only one reload runs at
+        a time.
+        """
+        if not self._reload_lock.acquire(blocking=False):
+            return self.get_reload_status()
+
+        self.reload_status = {"state": "loading", "error": None, "started_at": time.time(), "finished_at": None}
+
+        def run():
+            try:
+                snapshot = self._build_snapshot()
+                self.partitions.refresh()
+                previous = self._snapshot.version if self._snapshot else None
+                # A single reference assignment is atomic: requests see either snapshot
+                self._snapshot = snapshot
+                self.reload_status = dict(self.reload_status, state="idle", finished_at=time.time())
+                print(f"Reloaded data: version {previous} -> {snapshot.version}")
+            except Exception as e:
+                print(f"Data reload failed, keeping version {self.data_version}: {e}")
+                self.reload_status = dict(self.reload_status, state="failed", error=str(e), finished_at=time.time())
+            finally:
+                self._reload_lock.release()
+
+        if background:
+            threading.Thread(target=run, name="data-reload", daemon=True).start()
+        else:
+            run()
+        return self.get_reload_status()
+
+    def get_reload_status(self) -> Dict[str, Any]:
+        return dict(self.reload_status, data_version=self.data_version)
+
+    def start_watcher(self, interval: float):
+        """Poll the source files and reload when they change"""
+        if self._watcher is not None or interval <= 0:
+            return
+
+        def watch():
+            last_seen = self.data_version
+            while True:
+                time.sleep(interval)
+                try:
+                    current = self._compute_version(self.source_paths)
+                    # Retry a failed version only once the files change again
+                    if current != last_seen:
+                        last_seen = current
+                        self.reload(background=False)
+                except OSError as e:
+                    # Files may be briefly missing while being replaced
+                    print(f"Data watcher could not stat sources: {e}")
+
+        self._watcher = threading.Thread(target=watch, name="data-watcher", daemon=True)
+        self._watcher.start()
+
+    def snapshot(self) -> DataSnapshot:
+        """Return the current data snapshot; hold on to it for the whole request"""
+        return self._snapshot
+
+    def _snapshot_partition(self, dataset: str):
+        """(version, frame, index) of a dataset in the current snapshot, for the partition store"""
+        snapshot = self._snapshot
+        if dataset == "crop":
+            return snapshot.version, snapshot.crop_data, snapshot.crop_index
+        return snapshot.version, snapshot.rainfall_data, snapshot.rainfall_index
+
+    @property
+    def data_version(self) -> Optional[str]:
+        return self._snapshot.version if self._snapshot else None
+
+    @property
+    def crop_data(self) -> pd.DataFrame:
+        return self._snapshot.crop_data if self._snapshot else None
+
+    @property
+    def rainfall_data(self) -> pd.DataFrame:
+        return self._snapshot.rainfall_data if self._snapshot else None
+
     def get_crop_data(self) -> pd.DataFrame:
         """Return crop production data"""
         return self.crop_data
@@ -38,29 +281,56 @@ class DataLoader:
         """Return rainfall data"""
         return self.rainfall_data
 
+    def get_crop_index(self) -> DistrictIndex:
+        """Return the district index over crop data rows"""
+        return self._snapshot.crop_index
+
+    def get_rainfall_index(self) -> DistrictIndex:
+        """Return the district index over rainfall data rows"""
+        return self._snapshot.rainfall_index
+
     def get_districts_from_crop_data(self) -> list:
         """Get list of districts from crop data"""
         if self.crop_data is not None:
-            return self.crop_data['District Name'].unique().tolist()
+            return self.crop_data['district'].unique().tolist()
         return []
 
     def get_districts_from_rainfall_data(self) -> list:
         """Get list of districts from rainfall data"""
         if self.rainfall_data is not None:
-            return self.rainfall_data['District'].unique().tolist()
+            return self.rainfall_data['district'].unique().tolist()
         return []
 
+    def get_partition_store(self) -> PartitionStore:
+        """Return the partitioned multi-year store"""
+        return self.partitions
+
+    def get_view(self) -> MaterializedView:
+        """Return the precomputed view for the loaded data version"""
+        return self._snapshot.view
+
     def get_data_summary(self) -> Dict[str, Any]:
         """Get summary of available data"""
+        return self._snapshot.view.summary
+
+    def get_shared_data(self) -> Optional[SharedData]:
+        """The shared-memory datasets the current snapshot uses, or None if it was loaded privately"""
+        if self._shared is not None and self._shared.version == self.data_version:
+            return self._shared
+        return None
+
+    def get_memory_report(self, snapshot: DataSnapshot = None) -> Dict[str, Any]:
+        """
+        Bytes held per dataset and column (vs. the parsed source). Fixed for
+        a data version; resident partitions are reported by the partition store.
+        """
+        snapshot = snapshot or self._snapshot
+        datasets = {}
+        for dataset, frame in (("crop", snapshot.crop_data), ("rainfall", snapshot.rainfall_data)):
+            datasets[dataset] = dict(snapshot.memory.get(dataset, {}), rows=len(frame),
+                                     bytes=int(frame.memory_usage(deep=True).sum()), columns=memory_report(frame))
         return {
-            "crop_data": {
-                "rows": len(self.crop_data) if self.crop_data is not None else 0,
-                "columns": list(self.crop_data.columns) if self.crop_data is not None else [],
-                "districts": self.get_districts_from_crop_data()
-            },
-            "rainfall_data": {
-                "rows": len(self.rainfall_data) if self.rainfall_data is not None else 0,
-                "columns": list(self.rainfall_data.columns) if self.rainfall_data is not None else [],
-                "districts": self.get_districts_from_rainfall_data()
-            }
+            "datasets": datasets,
+            "total_bytes": sum(entry["bytes"] for entry in datasets.values()),
+            "source_bytes": sum(entry["source_bytes"] for entry in datasets.values())
         }
@@ -0,0 +1,229 @@
+import re
+import unicodedata
+from typing import Dict, Any, List, Iterable, Tuple
+
+# Common alternate spellings (old names, anglicised names) -> current name.
+# Keys and values are in normalized form.
+DISTRICT_ALIASES = {
+    "bangalore": "bengaluru",
+    "bangalore urban": "bengaluru urban",
+    "bangalore rural": "bengaluru rural",
+    "belgaum": "belagavi",
+    "bellary": "ballari",
+    "bijapur": "vijayapura",
+    "gulbarga": "kalburgi",
+    "kalaburagi": "kalburgi",
+    "mysore": "mysuru",
+    "shimoga": "shivamogga",
+    "tumkur": "tumakuru",
+    "chikkamagaluru": "chikmagalur",
+    "chikkaballapur": "chickballapur",
+    "chikkaballapura": "chickballapur",
+    "davangere": "davanagere",
+    "ramanagara": "ramanagaram",
+    "yadagiri": "yadgir",
+    "bagalkot": "bagalkote",
+    "chamarajanagara": "chamarajanagar",
+    "madras": "chennai",
+    "kanchipuram": "kancheepuram",
+    "thiruvallur": "tiruvallur",
+    "trichy": "tiruchirappalli",
+    "tiruchi": "tiruchirappalli",
+    "tuticorin": "thoothukudi",
+    "kanyakumari": "kanniyakumari",
+    "nilgiris": "the nilgiris",
+    "ooty": "the nilgiris",
+    "viluppuram": "villupuram",
+    "thiruvarur": "tiruvarur",
+    "thiruvannamalai": "tiruvannamalai",
+    "thirunelveli": "tirunelveli",
+    "sivagangai": "sivaganga",
+}
+
+# Rows that hold state-level aggregates rather than a district
+AGGREGATE_ROW_NAMES = {"state total", "state average"}
+
+
+def normalize_name(name: str) -> str:
+    """Casefold, strip accents and punctuation, collapse whitespace"""
+    text = unicodedata.normalize("NFKD", str(name)).encode("ascii", "ignore").decode("ascii")
+    return " ".join(re.sub(r"[^a-z0-9]+", " ", text.casefold()).split())
+
+
+def _trigrams(key: str) -> set:
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class DistrictIndex:
+    def __init__(self, names: Iterable[str], min_similarity: float = 0.6):
+        """
+        Normalized lookup index over a district name column.
+
+        Built once per dataset at load time. Resolves user-supplied names to
+        row positions via (in order) an exact normalized match, a known alias,
+        a prefix match ("bengaluru" -> URBAN and RURAL) and finally trigram
+        similarity for misspellings.
+        """
+        self.min_similarity = min_similarity
+        self.names: List[str] = []
+        self._exact: Dict[str, List[int]] = {}
+        self._prefix: Dict[str, List[str]] = {}
+        self._trigram_postings: Dict[str, set] = {}
+        self._key_trigrams: Dict[str, set] = {}
+        self._key_names: Dict[str, str] = {}
+
+        # Normalized once per distinct name: a multi-year dataset repeats each
+        # district on many rows
+        normalized: Dict[str, str] = {}
+        for position, name in enumerate(names):
+            self.names.append(name)
+            if not isinstance(name, str):
+                continue
+            key = normalized.get(name)
+            if key is None:
+                key = normalized[name] = normalize_name(name)
+            if not key or key in AGGREGATE_ROW_NAMES:
+                continue
+            self._exact.setdefault(key, []).append(position)
+            self._key_names.setdefault(key, name)
+
+        for key in self._exact:
+            # Every leading run of words is a prefix key: "bengaluru urban"
+            # is reachable as "bengaluru"
+            words = key.split()
+            for size in range(1, len(words)):
+                prefix = " ".join(words[:size])
+                if prefix != "the":
+                    self._prefix.setdefault(prefix, []).append(key)
+
+            grams = _trigrams(key)
+            self._key_trigrams[key] = grams
+            for gram in grams:
+                self._trigram_postings.setdefault(gram, set()).add(key)
+
+        # Drop "the" so that "nilgiris" finds "the nilgiris" without an alias
+        for key in list(self._key_names):
+            if key.startswith("the ") and key[4:] not in self._exact:
+                self._prefix.setdefault(key[4:], []).append(key)
+
+    def __len__(self) -> int:
+        return len(self._key_names)
+
+    def _fuzzy(self, key: str) -> List[str]:
+        """Keys whose trigram Dice similarity with `key` is above the threshold, best first"""
+        grams = _trigrams(key)
+        overlap: Dict[str, int] = {}
+        for gram in grams:
+            for candidate in self._trigram_postings.get(gram, ()):
+                overlap[candidate] = overlap.get(candidate, 0) + 1
+
+        scored = []
+        for candidate, shared in overlap.items():
+            score = 2 * shared / (len(grams) + len(self._key_trigrams[candidate]))
+            if score >= self.min_similarity:
+                scored.append((score, candidate))
+
+        if not scored:
+            return []
+        scored.sort(reverse=True)
+        best = scored[0][0]
+        # Near-ties are reported together so the caller can flag ambiguity
+        return [candidate for score, candidate in scored if best - score < 0.05]
+
+    def lookup(self, name: str) -> Dict[str, Any]:
+        """
+        Resolve a single name. Returns:
+        {"query", "match": "exact|alias|prefix|fuzzy|none", "names": [...], "positions": [...]}
+        """
+        key = normalize_name(name)
+        match, keys = "none", self._exact_keys(key)
+
+        if key in self._exact:
+            match = "exact"
+        elif key in self._prefix:
+            match = "prefix"
+        elif keys:
+            match = "alias"
+        elif key:
+            keys = self._fuzzy(key)
+            if keys:
+                match = "fuzzy"
+
+        positions = [position for k in keys for position in self._exact[k]]
+        return {
+            "query": name,
+            "match": match,
+            "names": [self._key_names[k] for k in keys],
+            "positions": positions
+        }
+
+    def _exact_keys(self, key: str) -> List[str]:
+        """Keys reachable from `key` without fuzzy matching"""
+        if key in self._exact:
+            return [key]
+        alias = DISTRICT_ALIASES.get(key)
+        if alias in self._exact:
+            return [alias]
+        if key in self._prefix:
+            return self._prefix[key]
+        if alias in self._prefix:
+            return self._prefix[alias]
+        return []
+
+    def find_in_text(self, tokens: List[str], max_words: int = 3) -> Tuple[List[str], set]:
+        """
+        Greedy longest-match of district names (exact, alias or prefix) in a
+        tokenized, normalized text. Returns the matched district names and
+        the consumed token positions.
+        """
+        matched: List[str] = []
+        consumed = set()
+        i = 0
+        while i < len(tokens):
+            for size in range(min(max_words, len(tokens) - i), 0, -1):
+                keys = self._exact_keys(" ".join(tokens[i:i + size]))
+                if keys:
+                    for key in keys:
+                        if self._key_names[key] not in matched:
+                            matched.append(self._key_names[key])
+                    consumed.update(range(i, i + size))
+                    i += size
+                    break
+            else:
+                i += 1
+        return matched, consumed
+
+    def resolve(self, names: Iterable[str]) -> Dict[str, Any]:
+        """
+        Resolve a batch of names in one pass.
+
+        Returns {"positions": [...], "matches": [...], "ambiguous": [...], "unmatched": [...]}
+        where "positions" are the de-duplicated row positions of every
+        resolved district in request order, and "ambiguous" lists the names
+        that matched more than one district.
+        """
+        positions: List[int] = []
+        seen = set()
+        matches, ambiguous, unmatched = [], [], []
+
+        for name in names:
+            result = self.lookup(name)
+            if result["match"] == "none":
+                unmatched.append(name)
+                continue
+
+            matches.append(result)
+            if len(result["names"]) > 1:
+                ambiguous.append({"query": name, "candidates": result["names"]})
+            for position in result["positions"]:
+                if position not in seen:
+                    seen.add(position)
+                    positions.append(position)
+
+        return {
+            "positions": positions,
+            "matches": matches,
+            "ambiguous": ambiguous,
+            "unmatched": unmatched
+        }
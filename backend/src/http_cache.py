@@ -0,0 +1,198 @@
+import gzip
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Callable, Hashable, Optional, Tuple
+
+from flask import Request, Response
+from metrics import registry
+
+try:
+    import brotli
+except ImportError:  # optional: without it responses are only gzip-compressed
+    brotli = None
+
+registry.counter("http_not_modified_total", "Conditional GETs answered with 304 Not Modified")
+registry.counter("http_compressed_responses_total", "Responses sent compressed, by encoding")
+
+COMPRESSIBLE_MIMETYPES = ("application/json", "text/plain", "text/html", "text/css", "application/javascript")
+
+
+def weak_etag(*parts: Any) -> str:
+    """
+    A weak validator from the values the body depends on (e.g. the data
+    version and the request). Weak, because gzip and brotli encodings of
+    the same body share it.
+    """
+    digest = hashlib.sha1("\x1f".join(str(part) for part in parts).encode()).hexdigest()[:16]
+    return f'W/"{digest}"'
+
+
+def not_modified(request: Request, etag: str) -> bool:
+    """Whether the client's If-None-Match already names `etag` (weak comparison)"""
+    header = request.headers.get("If-None-Match", "")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    wanted = etag[2:] if etag.startswith("W/") else etag
+    return any((tag.strip()[2:] if tag.strip().startswith("W/") else tag.strip()) == wanted
+               for tag in header.split(","))
+
+
+def preferred_encoding(request: Request) -> Optional[str]:
+    """br if the client accepts it and brotli is installed, else gzip if accepted, else None"""
+    accepted = {}
+    for item in request.headers.get("Accept-Encoding", "").split(","):
+        name, _, params = item.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        if name:
+            accepted[name.lower()] = quality
+    if brotli is not None and accepted.get("br", 0) > 0:
+        return "br"
+    if accepted.get("gzip", 0) > 0:
+        return "gzip"
+    return None
+
+
+def compress(body: bytes, encoding: str, static: bool = False) -> bytes:
+    """Static bodies are compressed once, so they get the slow, small setting"""
+    if encoding == "br":
+        return brotli.compress(body, quality=11 if static else 5)
+    return gzip.compress(body, compresslevel=9 if static else 6, mtime=0)
+
+
+class CachedBody:
+    def __init__(self, body: bytes, etag: str):
+        """A serialized JSON body with its ETag and compressed variants (made once, on first use)"""
+        self.body = body
+        self.etag = etag
+        self._encoded: Dict[str, bytes] = {}
+        self._lock = threading.Lock()
+
+    def encoded(self, encoding: str) -> bytes:
+        with self._lock:
+            if encoding not in self._encoded:
+                self._encoded[encoding] = compress(self.body, encoding, static=True)
+            return self._encoded[encoding]
+
+
+class HttpCache:
+    def __init__(self, min_compress_bytes: int = 1024, max_entries: int = 256):
+        """
+        Response-level caching and compression for the Flask app.
+
+        - Bodies that only depend on the data version (and the request) are
+          serialized once and kept, with their compressed variants, in an
+          LRU of max_entries keyed by the caller (e.g. endpoint + version).
+        - Conditional GETs: responses carry an ETag; a request whose
+          If-None-Match matches is answered 304 without a body, and before
+          the body is even built.
+        - compress_response() gzip/brotli-encodes any other response of at
+          least min_compress_bytes for clients that accept it.
+        """
+        self.min_compress_bytes = min_compress_bytes
+        self.max_entries = max_entries
+        self._bodies: "OrderedDict[Hashable, CachedBody]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "not_modified": 0, "compressed": 0,
+                      "bytes_in": 0, "bytes_out": 0}
+
+    def body(self, key: Hashable, build: Callable[[], Any], etag: str) -> CachedBody:
+        """The cached body for `key`, serializing build()'s JSON payload on a miss"""
+        with self._lock:
+            entry = self._bodies.get(key)
+            if entry is not None:
+                self._bodies.move_to_end(key)
+                self.stats["hits"] += 1
+                return entry
+            self.stats["misses"] += 1
+
+        entry = CachedBody(json.dumps(build(), separators=(",", ":"), sort_keys=True).encode(), etag)
+        with self._lock:
+            self._bodies[key] = entry
+            while len(self._bodies) > self.max_entries:
+                self._bodies.popitem(last=False)
+        return entry
+
+    def respond(self, request: Request, key: Hashable, build: Callable[[], Any], etag: str,
+                cache_control: str) -> Response:
+        """
+        A JSON response for a cacheable GET: 304 if the client has `etag`,
+        otherwise the (cached) serialized body, pre-compressed when accepted
+        """
+        if not_modified(request, etag):
+            return self.not_modified_response(etag, cache_control)
+
+        entry = self.body(key, build, etag)
+        response = Response(entry.body, mimetype="application/json")
+        encoding = preferred_encoding(request) if len(entry.body) >= self.min_compress_bytes else None
+        if encoding:
+            self._encode(response, entry.encoded(encoding), encoding, len(entry.body))
+        response.headers["ETag"] = etag
+        response.headers["Cache-Control"] = cache_control
+        response.headers["Vary"] = "Accept-Encoding"
+        return response
+
+    def not_modified_response(self, etag: str, cache_control: str) -> Response:
+        with self._lock:
+            self.stats["not_modified"] += 1
+        registry.inc("http_not_modified_total")
+        response = Response(status=304)
+        response.headers["ETag"] = etag
+        response.headers["Cache-Control"] = cache_control
+        response.headers["Vary"] = "Accept-Encoding"
+        return response
+
+    def compress_response(self, request: Request, response: Response) -> Response:
+        """Compress a finished, non-streamed response in place if it is large and compressible"""
+        if (response.direct_passthrough or response.is_streamed or "Content-Encoding" in response.headers
+                or response.status_code < 200 or response.status_code in (204, 206, 304)
+                or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+            return response
+        body = response.get_data()
+        if len(body) < self.min_compress_bytes:
+            return response
+        encoding = preferred_encoding(request)
+        if encoding:
+            self._encode(response, compress(body, encoding), encoding, len(body))
+        response.vary.add("Accept-Encoding")
+        return response
+
+    def compress_body(self, request: Request, body: bytes) -> Tuple[bytes, Optional[str]]:
+        """
+        (data, encoding) for a body outside Flask (the ASGI app): compressed
+        when it is large enough and the client accepts it, else (body, None)
+        """
+        encoding = preferred_encoding(request) if len(body) >= self.min_compress_bytes else None
+        if not encoding:
+            return body, None
+        data = compress(body, encoding)
+        self._count_compressed(encoding, len(body), len(data))
+        return data, encoding
+
+    def _encode(self, response: Response, data: bytes, encoding: str, original_size: int):
+        response.set_data(data)
+        response.headers["Content-Encoding"] = encoding
+        self._count_compressed(encoding, original_size, len(data))
+
+    def _count_compressed(self, encoding: str, original_size: int, size: int):
+        with self._lock:
+            self.stats["compressed"] += 1
+            self.stats["bytes_in"] += original_size
+            self.stats["bytes_out"] += size
+        registry.inc("http_compressed_responses_total", {"encoding": encoding})
+
+    def clear(self):
+        with self._lock:
+            self._bodies.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self.stats, entries=len(self._bodies), brotli=brotli is not None)
@@ -0,0 +1,429 @@
+import asyncio
+import contextvars
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from contextlib import contextmanager
+from typing import Dict, Any, AsyncIterator, Iterator, Optional, Tuple
+
+import groq
+import httpx
+
+from admission import LLMQuota
+from metrics import registry
+from prompt_builder import TokenUsageTracker, estimate_tokens
+from structured_log import logger
+
+registry.counter("llm_retries_total", "LLM calls retried after a retryable error")
+registry.counter("llm_failures_total", "LLM calls that failed after retries, by reason")
+registry.counter("llm_hedged_total", "Hedged LLM requests sent, and how many won")
+
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+# Absolute time.monotonic() deadline of the request being handled
+_request_deadline: contextvars.ContextVar = contextvars.ContextVar("samarth_llm_deadline", default=None)
+
+
+class LLMError(Exception):
+    def __init__(self, message: str, reason: str):
+        """
+        LLM call failed; reason is "deadline", "retries_exhausted",
+        "budget_exhausted", "rate_limited" (our own quota) or "error"
+        """
+        super().__init__(message)
+        self.reason = reason
+
+
+@contextmanager
+def request_deadline(seconds: float) -> Iterator[None]:
+    """All LLM calls inside the block share one deadline, `seconds` from now"""
+    token = _request_deadline.set(time.monotonic() + seconds if seconds and seconds > 0 else None)
+    try:
+        yield
+    finally:
+        _request_deadline.reset(token)
+
+
+def _is_retryable(error: Exception) -> bool:
+    if isinstance(error, (groq.APIConnectionError, groq.APITimeoutError)):
+        return True
+    return getattr(error, "status_code", None) in RETRYABLE_STATUS
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    """Seconds from a Retry-After header on the error's response, if any"""
+    response = getattr(error, "response", None)
+    value = getattr(response, "headers", {}).get("retry-after") if response is not None else None
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def _estimated_tokens(kwargs: Dict[str, Any]) -> int:
+    """Tokens a call may use: its prompt plus the completion it allows"""
+    prompt = sum(estimate_tokens(str(message.get("content") or "")) for message in kwargs.get("messages") or [])
+    return prompt + int(kwargs.get("max_tokens") or 1024)
+
+
+class _ThreadedStream:
+    """Async iteration over a blocking stream, one chunk per thread hop"""
+
+    def __init__(self, stream: Iterator[Any]):
+        self._stream = iter(stream)
+
+    def __aiter__(self) -> "_ThreadedStream":
+        return self
+
+    async def __anext__(self) -> Any:
+        chunk = await asyncio.to_thread(next, self._stream, StopIteration)
+        if chunk is StopIteration:
+            raise StopAsyncIteration
+        return chunk
+
+
+class RetryBudget:
+    def __init__(self, ratio: float = 0.2, min_balance: float = 10):
+        """
+        Caps retries at roughly `ratio` of calls: each call deposits `ratio`
+        tokens, each retry spends one. A floor of `min_balance` lets low
+        traffic still retry. Keeps retries from multiplying load during an outage.
+        """
+        self.ratio = ratio
+        self.min_balance = min_balance
+        self.max_balance = max(min_balance, 100 * ratio)
+        self._balance = min_balance
+        self._lock = threading.Lock()
+
+    def deposit(self):
+        with self._lock:
+            self._balance = min(self.max_balance, self._balance + self.ratio)
+
+    def try_spend(self) -> bool:
+        with self._lock:
+            if self._balance >= 1:
+                self._balance -= 1
+                return True
+            return False
+
+
+class LLMClient:
+    def __init__(self, api_key: str = None, backend: Any = None, timeout: float = 30.0, max_retries: int = 2,
+                 retry_budget: RetryBudget = None, backoff_base: float = 0.25, backoff_max: float = 4.0,
+                 hedge_delay: float = None, max_connections: int = 20, async_backend: Any = None,
+                 quota: LLMQuota = None):
+        """
+        Shared LLM client for all components.
+
+        backend is anything with .chat.completions.create(**kwargs), e.g. a
+        groq.Groq or a local stub; by default one Groq client with a pooled
+        HTTP connection is created, so connections are reused across calls.
+
+        Every call gets a timeout of min(timeout, time left until the request
+        deadline). 429/5xx/connection errors are retried up to max_retries
+        times with full-jitter exponential backoff, if the retry budget allows.
+        complete(..., hedge=True) sends a second identical request when the
+        first has not answered after hedge_delay seconds (or, if None, the
+        recent p95 latency) and uses whichever finishes first.
+
+        With a quota, every attempt first reserves its estimated tokens and
+        waits its turn; a call whose turn would come after the request
+        deadline fails at once with reason "rate_limited".
+
+        acomplete() and astream() are the same calls for an event loop. They
+        use async_backend (an object whose .chat.completions.create is a
+        coroutine function). By default a groq.AsyncGroq is created on first
+        use, inside the running loop, when the backend is a groq.Groq; any
+        other backend (e.g. a stub) without an async one is called on threads.
+        """
+        if backend is None:
+            api_key = api_key or os.getenv("GROQ_API_KEY")
+            if not api_key:
+                raise ValueError("GROQ_API_KEY not found in environment variables. Get one free at https://console.groq.com")
+            limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+            http_client = groq.DefaultHttpxClient(limits=limits) if hasattr(groq, "DefaultHttpxClient") else None
+            # Retries are handled here, with the deadline and budget in mind
+            backend = groq.Groq(api_key=api_key, max_retries=0, timeout=timeout, http_client=http_client)
+
+        self.backend = backend
+        self.async_backend = async_backend
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.retry_budget = retry_budget or RetryBudget()
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.hedge_delay = hedge_delay
+        self.quota = quota
+
+        self._latencies: deque = deque(maxlen=200)
+        self._hedge_pool = ThreadPoolExecutor(max_workers=max_connections, thread_name_prefix="llm-hedge")
+        self._lock = threading.Lock()
+        self.stats = {"calls": 0, "retries": 0, "retries_denied": 0, "deadline_exceeded": 0,
+                      "failures": 0, "hedged": 0, "hedge_wins": 0, "rate_limited": 0}
+
+    def _count(self, key: str, amount: int = 1):
+        with self._lock:
+            self.stats[key] += amount
+
+    def _time_left(self) -> Optional[float]:
+        deadline = _request_deadline.get()
+        return None if deadline is None else deadline - time.monotonic()
+
+    def _call_timeout(self) -> float:
+        left = self._time_left()
+        if left is not None and left <= 0:
+            self._count("deadline_exceeded")
+            registry.inc("llm_failures_total", {"reason": "deadline"})
+            raise LLMError("LLM request deadline exceeded", "deadline")
+        return self.timeout if left is None else min(self.timeout, left)
+
+    def _record_latency(self, started: float, **kwargs):
+        if not kwargs.get("stream"):
+            with self._lock:
+                self._latencies.append(time.monotonic() - started)
+
+    def _retry_delay(self, component: str, error: Exception, attempt: int) -> float:
+        """Seconds to wait before retrying after `error`; raises instead if it must not be retried"""
+        if not _is_retryable(error) or attempt >= self.max_retries:
+            reason = "retries_exhausted" if _is_retryable(error) else "error"
+            self._count("failures")
+            registry.inc("llm_failures_total", {"reason": reason})
+            raise error
+        if not self.retry_budget.try_spend():
+            self._count("retries_denied")
+            registry.inc("llm_failures_total", {"reason": "budget_exhausted"})
+            raise error
+
+        delay = _retry_after(error)
+        if delay is None:
+            delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        left = self._time_left()
+        if left is not None and delay >= left:
+            self._count("deadline_exceeded")
+            registry.inc("llm_failures_total", {"reason": "deadline"})
+            raise LLMError(f"LLM retry would exceed the request deadline: {error}", "deadline") from error
+
+        self._count("retries")
+        registry.inc("llm_retries_total", {"component": component})
+        logger.warning("llm_retry", component=component, attempt=attempt + 1,
+                       delay_s=round(delay, 3), error=str(error))
+        return delay
+
+    def _reserve_quota(self, **kwargs) -> Tuple[float, int]:
+        """(seconds to wait, tokens reserved) before an attempt may be sent"""
+        if self.quota is None:
+            return 0.0, 0
+        tokens = _estimated_tokens(kwargs)
+        wait_s = self.quota.reserve(tokens, max_wait=self._time_left())
+        if wait_s is None:
+            self._count("rate_limited")
+            registry.inc("llm_failures_total", {"reason": "rate_limited"})
+            raise LLMError("LLM quota exhausted: the call would have to wait past the request deadline",
+                           "rate_limited")
+        return wait_s, tokens
+
+    def _settle_quota(self, reserved: int, response: Any):
+        usage = TokenUsageTracker.usage_of(response)
+        if reserved and usage:
+            self.quota.settle(reserved, usage["total_tokens"])
+
+    def _refund_quota(self, reserved: int):
+        """Settle the reservation of an attempt that failed or was cancelled: it used no tokens"""
+        if reserved:
+            self.quota.settle(reserved, 0)
+
+    def _settled(self, response: Any, reserved: int, **kwargs) -> Any:
+        """The response, settling the quota reservation (for a stream, on its last chunk)"""
+        if not reserved:
+            return response
+        if not kwargs.get("stream"):
+            self._settle_quota(reserved, response)
+            return response
+
+        def chunks() -> Iterator[Any]:
+            for chunk in response:
+                self._settle_quota(reserved, chunk)
+                yield chunk
+        return chunks()
+
+    def _asettled(self, response: Any, reserved: int, **kwargs) -> Any:
+        if not reserved or not kwargs.get("stream"):
+            return self._settled(response, reserved, **kwargs)
+
+        async def chunks() -> AsyncIterator[Any]:
+            async for chunk in response:
+                self._settle_quota(reserved, chunk)
+                yield chunk
+        return chunks()
+
+    def _create_with_retries(self, component: str, **kwargs) -> Any:
+        attempt = 0
+        while True:
+            wait_s, reserved = self._reserve_quota(**kwargs)
+            try:
+                if wait_s:
+                    time.sleep(wait_s)
+                timeout = self._call_timeout()
+                started = time.monotonic()
+                response = self.backend.chat.completions.create(timeout=timeout, **kwargs)
+            except Exception as e:
+                self._refund_quota(reserved)
+                delay = self._retry_delay(component, e, attempt)
+            else:
+                self._record_latency(started, **kwargs)
+                return self._settled(response, reserved, **kwargs)
+            attempt += 1
+            time.sleep(delay)
+
+    def _get_async_backend(self) -> Optional[Any]:
+        if self.async_backend is None and isinstance(self.backend, groq.Groq):
+            limits = httpx.Limits(max_connections=self.max_connections,
+                                  max_keepalive_connections=self.max_connections)
+            http_client = groq.DefaultAsyncHttpxClient(limits=limits) \
+                if hasattr(groq, "DefaultAsyncHttpxClient") else None
+            self.async_backend = groq.AsyncGroq(api_key=self.backend.api_key, max_retries=0, timeout=self.timeout,
+                                                http_client=http_client)
+        return self.async_backend
+
+    async def _acreate(self, **kwargs) -> Any:
+        backend = self._get_async_backend()
+        if backend is not None:
+            return await backend.chat.completions.create(**kwargs)
+        response = await asyncio.to_thread(self.backend.chat.completions.create, **kwargs)
+        return _ThreadedStream(response) if kwargs.get("stream") else response
+
+    async def _acreate_with_retries(self, component: str, **kwargs) -> Any:
+        attempt = 0
+        while True:
+            wait_s, reserved = self._reserve_quota(**kwargs)
+            try:
+                if wait_s:
+                    await asyncio.sleep(wait_s)
+                timeout = self._call_timeout()
+                started = time.monotonic()
+                response = await self._acreate(timeout=timeout, **kwargs)
+            except asyncio.CancelledError:
+                # A losing hedged request, or the client went away
+                self._refund_quota(reserved)
+                raise
+            except Exception as e:
+                self._refund_quota(reserved)
+                delay = self._retry_delay(component, e, attempt)
+            else:
+                self._record_latency(started, **kwargs)
+                return self._asettled(response, reserved, **kwargs)
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    def _current_hedge_delay(self) -> Optional[float]:
+        if self.hedge_delay is not None:
+            return self.hedge_delay
+        with self._lock:
+            samples = sorted(self._latencies)
+        # Not enough history to know what "slow" is yet
+        if len(samples) < 20:
+            return None
+        return samples[int(len(samples) * 0.95) - 1]
+
+    def complete(self, component: str, hedge: bool = False, **kwargs) -> Any:
+        """A non-streaming chat completion, with deadline, retries and optional hedging"""
+        self.retry_budget.deposit()
+        self._count("calls")
+        delay = self._current_hedge_delay() if hedge else None
+        if delay is None:
+            return self._create_with_retries(component, **kwargs)
+
+        # Each attempt runs in the caller's context so it sees the same deadline
+        context = contextvars.copy_context()
+        primary = self._hedge_pool.submit(context.run, self._create_with_retries, component, **kwargs)
+        done, _ = wait([primary], timeout=delay)
+        if done:
+            return primary.result()
+
+        self._count("hedged")
+        registry.inc("llm_hedged_total", {"outcome": "sent"})
+        context = contextvars.copy_context()
+        backup = self._hedge_pool.submit(context.run, self._create_with_retries, component, **kwargs)
+        pending = {primary, backup}
+        error = None
+        while pending:
+            done, pending = wait(pending, timeout=self._time_left(), return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                if future.exception() is None:
+                    if future is backup:
+                        self._count("hedge_wins")
+                        registry.inc("llm_hedged_total", {"outcome": "won"})
+                    return future.result()
+                error = future.exception()
+        if error is not None:
+            raise error
+        self._count("deadline_exceeded")
+        raise LLMError("LLM request deadline exceeded", "deadline")
+
+    async def acomplete(self, component: str, hedge: bool = False, **kwargs) -> Any:
+        """complete() on the event loop; the losing hedged request is cancelled"""
+        self.retry_budget.deposit()
+        self._count("calls")
+        delay = self._current_hedge_delay() if hedge else None
+        if delay is None:
+            return await self._acreate_with_retries(component, **kwargs)
+
+        # Tasks copy the caller's context, so they see the same deadline
+        primary = asyncio.ensure_future(self._acreate_with_retries(component, **kwargs))
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+        if done:
+            return primary.result()
+
+        self._count("hedged")
+        registry.inc("llm_hedged_total", {"outcome": "sent"})
+        backup = asyncio.ensure_future(self._acreate_with_retries(component, **kwargs))
+        pending = {primary, backup}
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, timeout=self._time_left(),
+                                                   return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    break
+                for task in done:
+                    if task.exception() is None:
+                        if task is backup:
+                            self._count("hedge_wins")
+                            registry.inc("llm_hedged_total", {"outcome": "won"})
+                        return task.result()
+                    error = task.exception()
+        finally:
+            for task in pending:
+                task.cancel()
+        if error is not None:
+            raise error
+        self._count("deadline_exceeded")
+        raise LLMError("LLM request deadline exceeded", "deadline")
+
+    async def astream(self, component: str, **kwargs) -> AsyncIterator[Any]:
+        """stream() on the event loop: an async iterator of chunks"""
+        self.retry_budget.deposit()
+        self._count("calls")
+        return await self._acreate_with_retries(component, stream=True, **kwargs)
+
+    def stream(self, component: str, **kwargs) -> Iterator[Any]:
+        """
+        A streaming chat completion. Opening the stream is retried like
+        complete(); once chunks flow, errors are passed to the caller.
+        """
+        self.retry_budget.deposit()
+        self._count("calls")
+        return self._create_with_retries(component, stream=True, **kwargs)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self.stats)
+        delay = self._current_hedge_delay()
+        stats["hedge_delay"] = round(delay, 3) if delay is not None else None
+        return stats
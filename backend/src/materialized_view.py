@@ -0,0 +1,153 @@
+import numpy as np
+import pandas as pd
+from typing import Dict, Any, List, Optional
+
+CROP_DISTRICT_COLUMN = 'district'
+RAINFALL_DISTRICT_COLUMN = 'district'
+
+TOTAL_ACTUAL_RAINFALL = 'total_actual'
+TOTAL_NORMAL_RAINFALL = 'total_normal'
+RAINFALL_DEPARTURE = 'total_departure_pct'
+
+# Numeric columns that are meaningless to rank by
+ID_COLUMNS = {'sl_no', 'year'}
+
+
+class MaterializedView:
+    def __init__(self, crop_df: pd.DataFrame, rainfall_df: pd.DataFrame, data_version: str,
+                 orders: Optional[Dict[str, Dict[str, Dict[str, np.ndarray]]]] = None):
+        """
+        Per-data-version precomputed state shared by all requests:
+        - the district-level frames of the snapshot (canonical schema, state
+          total/average rows already removed by the loader), not copied
+        - ascending and descending argsort orders for every numeric column
+        - summary statistics and the /data-summary payload
+
+        Built once when data is loaded, before the snapshot is published; it
+        adds the rainfall departure column to the rainfall frame in place.
+        Read-only afterwards. Sort orders already computed for these frames
+        (e.g. attached from shared memory) can be passed in as `orders`.
+        """
+        self.data_version = data_version
+
+        if RAINFALL_DEPARTURE not in rainfall_df.columns:
+            rainfall_df[RAINFALL_DEPARTURE] = (
+                (rainfall_df[TOTAL_ACTUAL_RAINFALL] - rainfall_df[TOTAL_NORMAL_RAINFALL])
+                / rainfall_df[TOTAL_NORMAL_RAINFALL] * 100
+            ).round(1)
+
+        self.frames = {"crop": crop_df, "rainfall": rainfall_df}
+        self.district_columns = {"crop": CROP_DISTRICT_COLUMN, "rainfall": RAINFALL_DISTRICT_COLUMN}
+
+        self.orders: Dict[str, Dict[str, Dict[str, np.ndarray]]] = orders if orders is not None else {
+            dataset: self._sort_orders(frame) for dataset, frame in self.frames.items()
+        }
+
+        self.column_stats = {
+            dataset: {
+                column: {
+                    "min": float(frame[column].min()),
+                    "max": float(frame[column].max()),
+                    "mean": float(frame[column].mean()),
+                    "sum": float(frame[column].sum())
+                }
+                for column in self.orders[dataset]
+            }
+            for dataset, frame in self.frames.items()
+        }
+
+        self.summary = self._build_data_summary(crop_df, rainfall_df)
+        self.crop_summary = self._build_crop_summary()
+        self.rainfall_summary = self._build_rainfall_summary()
+
+    @staticmethod
+    def _sort_orders(frame: pd.DataFrame) -> Dict[str, Dict[str, np.ndarray]]:
+        orders = {}
+        for column in frame.select_dtypes(include="number").columns:
+            if column in ID_COLUMNS:
+                continue
+            values = frame[column].to_numpy(dtype=float)
+            # NaNs sort last in both directions
+            orders[column] = {
+                "asc": np.argsort(values, kind="stable"),
+                "desc": np.argsort(-values, kind="stable")
+            }
+        return orders
+
+    def _build_data_summary(self, crop_df: pd.DataFrame, rainfall_df: pd.DataFrame) -> Dict[str, Any]:
+        return {
+            "crop_data": {
+                "rows": len(crop_df),
+                "columns": list(crop_df.columns),
+                "districts": crop_df[CROP_DISTRICT_COLUMN].unique().tolist()
+            },
+            "rainfall_data": {
+                "rows": len(rainfall_df),
+                "columns": list(rainfall_df.columns),
+                "districts": rainfall_df[RAINFALL_DISTRICT_COLUMN].unique().tolist()
+            }
+        }
+
+    def _build_crop_summary(self) -> Dict[str, Any]:
+        crop_df = self.frames["crop"]
+        stats = self.column_stats["crop"]
+        top = self.orders["crop"]['total_production']["desc"][0]
+        return {
+            "total_districts": len(crop_df),
+            "total_production": stats['total_production']["sum"],
+            "avg_yield": stats['total_yield']["mean"],
+            "total_area": stats['total_area']["sum"],
+            "top_district": crop_df[CROP_DISTRICT_COLUMN].iloc[top],
+            "top_production": stats['total_production']["max"]
+        }
+
+    def _build_rainfall_summary(self) -> Dict[str, Any]:
+        rainfall_df = self.frames["rainfall"]
+        stats = self.column_stats["rainfall"][TOTAL_ACTUAL_RAINFALL]
+        top = self.orders["rainfall"][TOTAL_ACTUAL_RAINFALL]["desc"][0]
+        return {
+            "total_districts": len(rainfall_df),
+            "avg_rainfall": stats["mean"],
+            "max_rainfall": stats["max"],
+            "min_rainfall": stats["min"],
+            "highest_rainfall_district": rainfall_df[RAINFALL_DISTRICT_COLUMN].iloc[top]
+        }
+
+    def top_k_positions(self, dataset: str, column: str, k: int = 10, ascending: bool = False,
+                        offset: int = 0, within: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Row positions ranked by `column`. Over all rows this is an O(k)
+        slice of the precomputed order. With `within`, only those positions
+        are ranked: argpartition selects the first offset + k in O(len(within))
+        and only they are sorted, with the same order as the full ranking
+        (NaNs last, ties by row position), so pages never overlap.
+        """
+        offset, k = max(offset, 0), max(k, 0)
+        if within is None:
+            return self.orders[dataset][column]["asc" if ascending else "desc"][offset:offset + k]
+
+        within = np.unique(np.asarray(within, dtype=np.int64))
+        values = self.frames[dataset][column].to_numpy(dtype=float)[within]
+        key = values if ascending else -values
+        key[np.isnan(key)] = np.inf
+        needed = offset + k
+        if needed < len(within):
+            # Everything strictly before the needed-th key, then as many of
+            # the keys equal to it as fit, lowest positions first
+            threshold = key[np.argpartition(key, needed - 1)[needed - 1]] if needed > 0 else -np.inf
+            before = np.flatnonzero(key < threshold)
+            tied = np.flatnonzero(key == threshold)[:needed - len(before)]
+            selected = np.concatenate([before, tied])
+        else:
+            selected = np.arange(len(within))
+        ranked = selected[np.lexsort((within[selected], key[selected]))]
+        return within[ranked][offset:offset + k]
+
+    def top_k(self, dataset: str, column: str, k: int = 10, ascending: bool = False,
+              offset: int = 0, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """
+        Rows ranked by `column` as an O(k) slice of the precomputed order.
+        Returns the rows in rank order.
+        """
+        rows = self.frames[dataset].iloc[self.top_k_positions(dataset, column, k, ascending, offset)]
+        return rows if columns is None else rows[columns]
@@ -0,0 +1,176 @@
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Any, List, Tuple, Callable, Optional, Iterator
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+# A collector returns samples computed at scrape time: (labels, value)
+Sample = Tuple[Dict[str, Any], float]
+
+
+def _label_key(labels: Optional[Dict[str, Any]]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in (labels or {}).items()))
+
+
+def _format_labels(key: LabelKey, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    pairs = key + extra
+    if not pairs:
+        return ""
+    escaped = (v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+def _format_number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class MetricsRegistry:
+    def __init__(self, prefix: str = "samarth"):
+        """
+        Minimal in-process metrics with Prometheus text exposition.
+
+        Counters and histograms are updated in place; collectors registered
+        with add_collector() are called at scrape time for values that other
+        components already track (cache hit counts, token totals).
+        """
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._meta: Dict[str, Tuple[str, str]] = {}
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        self._histograms: Dict[str, Dict[LabelKey, Dict[str, Any]]] = {}
+        self._buckets: Dict[str, Tuple[float, ...]] = {}
+        self._collectors: List[Tuple[str, str, str, Callable[[], List[Sample]]]] = []
+
+    def _name(self, name: str) -> str:
+        return f"{self.prefix}_{name}"
+
+    def counter(self, name: str, help_text: str):
+        with self._lock:
+            self._meta[self._name(name)] = ("counter", help_text)
+            self._counters.setdefault(self._name(name), {})
+
+    def histogram(self, name: str, help_text: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        with self._lock:
+            self._meta[self._name(name)] = ("histogram", help_text)
+            self._histograms.setdefault(self._name(name), {})
+            self._buckets[self._name(name)] = tuple(sorted(buckets))
+
+    def add_collector(self, name: str, kind: str, help_text: str, collect: Callable[[], List[Sample]]):
+        """Register a gauge/counter family whose samples come from `collect()`"""
+        with self._lock:
+            self._collectors.append((self._name(name), kind, help_text, collect))
+
+    def inc(self, name: str, labels: Dict[str, Any] = None, value: float = 1):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(self._name(name), {})
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name: str, value: float, labels: Dict[str, Any] = None):
+        full_name = self._name(name)
+        key = _label_key(labels)
+        with self._lock:
+            buckets = self._buckets.setdefault(full_name, DEFAULT_BUCKETS)
+            series = self._histograms.setdefault(full_name, {})
+            entry = series.get(key)
+            if entry is None:
+                entry = series[key] = {"counts": [0] * len(buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    entry["counts"][i] += 1
+            entry["sum"] += value
+            entry["count"] += 1
+
+    def render(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)"""
+        lines = []
+        with self._lock:
+            counters = {name: dict(series) for name, series in self._counters.items()}
+            histograms = {name: {k: dict(v, counts=list(v["counts"])) for k, v in series.items()}
+                          for name, series in self._histograms.items()}
+            meta = dict(self._meta)
+            collectors = list(self._collectors)
+
+        for name, series in counters.items():
+            kind, help_text = meta.get(name, ("counter", ""))
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+            for key, value in sorted(series.items()):
+                lines.append(f"{name}{_format_labels(key)} {_format_number(value)}")
+
+        for name, series in histograms.items():
+            kind, help_text = meta.get(name, ("histogram", ""))
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+            buckets = self._buckets[name]
+            for key, entry in sorted(series.items()):
+                for bound, count in zip(buckets, entry["counts"]):
+                    lines.append(f"{name}_bucket{_format_labels(key, (('le', _format_number(bound)),))} {count}")
+                lines.append(f"{name}_bucket{_format_labels(key, (('le', '+Inf'),))} {entry['count']}")
+                lines.append(f"{name}_sum{_format_labels(key)} {_format_number(round(entry['sum'], 6))}")
+                lines.append(f"{name}_count{_format_labels(key)} {entry['count']}")
+
+        for name, kind, help_text, collect in collectors:
+            try:
+                samples = collect()
+            except Exception as e:
+                print(f"Metrics collector {name} failed: {e}")
+                continue
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+            for labels, value in samples:
+                lines.append(f"{name}{_format_labels(_label_key(labels))} {_format_number(value)}")
+
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+registry.histogram("stage_duration_seconds", "Time spent in each query pipeline stage")
+registry.histogram("llm_request_duration_seconds", "Latency of LLM API calls")
+registry.histogram("http_request_duration_seconds", "HTTP request latency by endpoint")
+registry.counter("http_requests_total", "HTTP requests by endpoint, method and status")
+registry.counter("stage_errors_total", "Query pipeline failures by stage")
+
+# Spans of the request being handled, in order: [(name, seconds)]
+_current_trace: contextvars.ContextVar = contextvars.ContextVar("samarth_trace", default=None)
+
+
+def start_trace() -> List[Tuple[str, float]]:
+    trace: List[Tuple[str, float]] = []
+    _current_trace.set(trace)
+    return trace
+
+
+def current_trace() -> Optional[List[Tuple[str, float]]]:
+    return _current_trace.get()
+
+
+@contextmanager
+def span(name: str, metric: str = "stage_duration_seconds", labels: Dict[str, Any] = None) -> Iterator[None]:
+    """
+    Time a block: observed in `metric` (labelled stage=name unless labels are
+    given) and appended to the current request's trace, if there is one
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        registry.observe(metric, elapsed, labels if labels is not None else {"stage": name})
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.append((name, elapsed))
+
+
+def record_error(stage: str):
+    registry.inc("stage_errors_total", {"stage": stage})
+
+
+def server_timing(trace: List[Tuple[str, float]], total: float = None) -> str:
+    """Format a trace as a Server-Timing header value (durations in ms)"""
+    parts = [f"{name};dur={elapsed * 1000:.1f}" for name, elapsed in trace]
+    if total is not None:
+        parts.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(parts)
@@ -0,0 +1,245 @@
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Any, List, Optional, Iterable, Tuple
+import numpy as np
+import pandas as pd
+from columnar_cache import ColumnarCache
+from district_index import DistrictIndex, normalize_name
+from schema import compact_frame
+
+PartitionKey = Tuple[str, str, int]
+# (version, frame in the canonical schema with a state column, its DistrictIndex)
+FrameSource = Callable[[], Tuple[str, pd.DataFrame, DistrictIndex]]
+
+
+def state_slug(state: str) -> str:
+    """'Tamil Nadu' -> 'tamil_nadu'"""
+    return normalize_name(state).replace(" ", "_")
+
+
+class PartitionStore:
+    def __init__(self, root_dir: str, max_memory_mb: float = 256, cache: ColumnarCache = None):
+        """
+        Multi-year, multi-state data store partitioned by (dataset, state, year).
+
+        Partitions are discovered from the directory layout
+            <root_dir>/<dataset>/<state>/<year>.csv
+        e.g. partitions/crop/karnataka/2017.csv, or added with register().
+        Discovery only lists files; a partition is parsed the first time a
+        scan selects it. Loaded partitions are kept in an LRU cache capped at
+        max_memory_mb and re-read if their file changes. A partition
+        registered with a source is served from frames already in memory
+        (the loaded snapshot) instead.
+        """
+        self.root_dir = root_dir
+        self.max_bytes = int(max_memory_mb * 1024 * 1024)
+        self.cache = cache
+
+        self._paths: Dict[PartitionKey, str] = {}
+        self._state_names: Dict[str, str] = {}
+        self._registered: Dict[PartitionKey, str] = {}
+        self._sources: Dict[PartitionKey, FrameSource] = {}
+        self._loaded: "OrderedDict[PartitionKey, Dict[str, Any]]" = OrderedDict()
+        self._resident_bytes = 0
+        self._lock = threading.Lock()
+        self._key_locks: Dict[PartitionKey, threading.Lock] = {}
+        self.stats = {"loads": 0, "hits": 0, "evictions": 0}
+        self.refresh()
+
+    def refresh(self):
+        """Re-discover partition files on disk (cheap: no files are read)"""
+        paths = dict(self._registered)
+        if os.path.isdir(self.root_dir):
+            for dataset in os.listdir(self.root_dir):
+                dataset_dir = os.path.join(self.root_dir, dataset)
+                if not os.path.isdir(dataset_dir):
+                    continue
+                for state in os.listdir(dataset_dir):
+                    state_dir = os.path.join(dataset_dir, state)
+                    if not os.path.isdir(state_dir):
+                        continue
+                    for file_name in os.listdir(state_dir):
+                        match = re.match(r"^(\d{4})\.csv$", file_name)
+                        if match:
+                            key = (dataset, state_slug(state), int(match.group(1)))
+                            paths.setdefault(key, os.path.join(state_dir, file_name))
+                            self._state_names.setdefault(state_slug(state), state.replace("_", " ").title())
+        with self._lock:
+            self._paths = paths
+
+    def register(self, dataset: str, state: str, year: int, path: str, source: FrameSource = None):
+        """
+        Add a partition backed by a file outside the directory layout. With a
+        source, the partition is its current frame (reused, not copied, and
+        rebuilt when its version changes) and the file is never read.
+        """
+        key = (dataset, state_slug(state), int(year))
+        self._registered[key] = path
+        if source is not None:
+            self._sources[key] = source
+        self._state_names[state_slug(state)] = state
+        with self._lock:
+            self._paths[key] = path
+
+    def partitions(self, dataset: str = None) -> List[Dict[str, Any]]:
+        """List known partitions and whether they are resident"""
+        with self._lock:
+            keys = sorted(k for k in self._paths if dataset is None or k[0] == dataset)
+            return [{
+                "dataset": k[0],
+                "state": self._state_names.get(k[1], k[1]),
+                "year": k[2],
+                "loaded": k in self._loaded
+            } for k in keys]
+
+    def fingerprint(self) -> str:
+        """Short fingerprint of all partition files (key, size, mtime); changes when any does"""
+        digest = hashlib.sha1()
+        with self._lock:
+            paths = sorted(self._paths.items())
+        for key, path in paths:
+            try:
+                stat = os.stat(path)
+                digest.update(f"{key}:{stat.st_size}:{stat.st_mtime_ns};".encode())
+            except OSError:
+                digest.update(f"{key}:missing;".encode())
+        return digest.hexdigest()[:12]
+
+    def select(self, dataset: str, states: Iterable[str] = None,
+               year_range: Tuple[Optional[int], Optional[int]] = None) -> List[PartitionKey]:
+        """
+        Partition pruning: keys matching the state filter and the inclusive
+        (start, end) year range, without loading anything
+        """
+        state_keys = {state_slug(s) for s in states} if states else None
+        start, end = year_range or (None, None)
+        with self._lock:
+            keys = list(self._paths)
+        return sorted(
+            k for k in keys
+            if k[0] == dataset
+            and (state_keys is None or k[1] in state_keys)
+            and (start is None or k[2] >= start)
+            and (end is None or k[2] <= end)
+        )
+
+    def _read_partition(self, key: PartitionKey, path: str) -> pd.DataFrame:
+        df = None
+        if self.cache is not None:
+            df = self.cache.load(path)
+        if df is None:
+            df = pd.read_csv(path)
+            if self.cache is not None:
+                self.cache.store(path, df)
+
+        return compact_frame(key[0], df, state=self._state_names.get(key[1], key[1]), year=key[2])
+
+    @staticmethod
+    def _with_year(frame: pd.DataFrame, year: int) -> pd.DataFrame:
+        """frame with a year column after state; the other columns stay views of frame's"""
+        columns = {}
+        for name in frame.columns:
+            series = frame[name]
+            columns[name] = series.array if isinstance(series.dtype, pd.CategoricalDtype) else series.to_numpy()
+            if name == "state":
+                columns["year"] = np.full(len(frame), year, dtype=np.int16)
+        # copy=False keeps every column a view (no consolidation)
+        return pd.DataFrame(columns, index=pd.RangeIndex(len(frame)), copy=False)
+
+    def get(self, key: PartitionKey) -> Optional[Dict[str, Any]]:
+        """Return the resident partition ({"frame", "index", ...}), loading it if needed"""
+        with self._lock:
+            path = self._paths.get(key)
+            if path is None:
+                return None
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        # Loads of different partitions proceed in parallel; the same
+        # partition is only parsed once
+        with key_lock:
+            source = self._sources.get(key)
+            if source is not None:
+                version, frame, index = source()
+                signature = version
+            else:
+                stat = os.stat(path)
+                signature = (stat.st_size, stat.st_mtime_ns)
+
+            with self._lock:
+                entry = self._loaded.get(key)
+                if entry is not None and entry["signature"] == signature:
+                    self._loaded.move_to_end(key)
+                    self.stats["hits"] += 1
+                    return entry
+
+            if source is not None:
+                frame = self._with_year(frame, key[2])
+                # Only the year column is this partition's own
+                entry = {"frame": frame, "index": index, "signature": signature,
+                         "bytes": int(frame["year"].memory_usage(index=False))}
+            else:
+                frame = self._read_partition(key, path)
+                entry = {
+                    "frame": frame,
+                    "index": DistrictIndex(frame["district"].tolist()),
+                    "signature": signature,
+                    "bytes": int(frame.memory_usage(deep=True).sum())
+                }
+
+            with self._lock:
+                previous = self._loaded.pop(key, None)
+                if previous is not None:
+                    self._resident_bytes -= previous["bytes"]
+                self._loaded[key] = entry
+                self._resident_bytes += entry["bytes"]
+                self.stats["loads"] += 1
+                self._evict(keep=key)
+            return entry
+
+    def _evict(self, keep: PartitionKey):
+        """Drop least recently used partitions until under the memory cap"""
+        while self._resident_bytes > self.max_bytes and len(self._loaded) > 1:
+            oldest = next(iter(self._loaded))
+            if oldest == keep:
+                self._loaded.move_to_end(oldest)
+                continue
+            self._resident_bytes -= self._loaded.pop(oldest)["bytes"]
+            self.stats["evictions"] += 1
+
+    def scan(self, dataset: str, states: Iterable[str] = None,
+             year_range: Tuple[Optional[int], Optional[int]] = None,
+             districts: Iterable[str] = None, columns: List[str] = None) -> pd.DataFrame:
+        """
+        Rows of `dataset` matching the filters, as one frame with "state"
+        and "year" columns. State/year filters prune partitions before any
+        file is read; district and column filters are applied per partition.
+        """
+        frames = []
+        districts = list(districts) if districts else None
+        for key in self.select(dataset, states, year_range):
+            entry = self.get(key)
+            if entry is None:
+                continue
+            frame = entry["frame"]
+            if districts:
+                frame = frame.iloc[entry["index"].resolve(districts)["positions"]]
+            if columns:
+                frame = frame[["district", "state", "year"] + [c for c in columns if c in frame.columns]]
+            frames.append(frame)
+
+        if not frames:
+            return pd.DataFrame(columns=["district", "state", "year"] + list(columns or []))
+        return pd.concat(frames, ignore_index=True)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(
+                self.stats,
+                partitions=len(self._paths),
+                resident=len(self._loaded),
+                resident_bytes=self._resident_bytes,
+                max_bytes=self.max_bytes
+            )
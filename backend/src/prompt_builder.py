@@ -0,0 +1,140 @@
+import json
+import math
+import threading
+from typing import Dict, Any, List, Optional
+
+# Rough size of a token for English text and numbers with Llama tokenizers;
+# used to stay under the budget without shipping a tokenizer
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def _format_value(value: Any, decimals: int) -> str:
+    if value is None:
+        return "-"
+    if isinstance(value, bool):
+        return str(value).lower()
+    if isinstance(value, float):
+        if math.isnan(value):
+            return "-"
+        value = round(value, decimals)
+        return str(int(value)) if value.is_integer() else str(value)
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, separators=(",", ":"), default=str)
+    return str(value).replace("|", "/").replace("\n", " ")
+
+
+def _is_table(value: Any) -> bool:
+    return isinstance(value, list) and bool(value) and all(isinstance(item, dict) for item in value)
+
+
+class PromptBuilder:
+    def __init__(self, token_budget: int = 1500, decimals: int = 2):
+        """
+        Compact serialization of query results for LLM prompts.
+
+        Lists of records become one header line plus one "|"-separated line
+        per row; numbers are rounded to `decimals`. If the result is larger
+        than `token_budget` (estimated), rows are dropped from the end of the
+        longest tables (results are already ranked) and replaced by a
+        one-line summary of what was left out.
+        """
+        self.token_budget = token_budget
+        self.decimals = decimals
+
+    def _table_lines(self, rows: List[Dict[str, Any]]) -> List[str]:
+        columns: List[str] = []
+        for row in rows:
+            for column in row:
+                if column not in columns:
+                    columns.append(column)
+        lines = ["|".join(columns)]
+        lines += ["|".join(_format_value(row.get(column), self.decimals) for column in columns) for row in rows]
+        return lines
+
+    def _omitted_summary(self, rows: List[Dict[str, Any]]) -> str:
+        """'+N more rows; col min..max' for the numeric columns of omitted rows"""
+        parts = [f"+{len(rows)} more rows omitted"]
+        columns = [c for c, v in rows[0].items() if isinstance(v, (int, float)) and not isinstance(v, bool)]
+        for column in columns[:4]:
+            values = [row[column] for row in rows
+                      if isinstance(row.get(column), (int, float)) and not math.isnan(row[column])]
+            if values:
+                parts.append(f"{column} {_format_value(float(min(values)), self.decimals)}"
+                             f"..{_format_value(float(max(values)), self.decimals)}")
+        return "; ".join(parts)
+
+    def _render(self, results: Dict[str, Any], row_limits: Dict[str, int]) -> str:
+        lines = []
+        for key, value in results.items():
+            if _is_table(value):
+                limit = row_limits.get(key, len(value))
+                lines.append(f"{key} ({len(value)} rows):")
+                lines += self._table_lines(value[:limit])
+                if limit < len(value):
+                    lines.append(self._omitted_summary(value[limit:]))
+            elif isinstance(value, dict):
+                lines.append(f"{key}:")
+                for sub_key, sub_value in value.items():
+                    lines.append(f" {sub_key}: {_format_value(sub_value, self.decimals)}")
+            else:
+                lines.append(f"{key}: {_format_value(value, self.decimals)}")
+        return "\n".join(lines)
+
+    def serialize(self, results: Dict[str, Any]) -> str:
+        """Render results compactly, shrinking tables until the text fits the token budget"""
+        row_limits = {key: len(value) for key, value in results.items() if _is_table(value)}
+        text = self._render(results, row_limits)
+
+        while estimate_tokens(text) > self.token_budget:
+            shrinkable = [key for key, limit in row_limits.items() if limit > 1]
+            if not shrinkable:
+                break
+            key = max(shrinkable, key=lambda k: row_limits[k])
+            # Halve the longest table: few re-renders even for thousands of rows
+            row_limits[key] = max(1, row_limits[key] // 2)
+            text = self._render(results, row_limits)
+        return text
+
+
+class TokenUsageTracker:
+    def __init__(self):
+        """Thread-safe running totals of LLM token usage per component (analysis, answer)"""
+        self._lock = threading.Lock()
+        self.totals: Dict[str, Dict[str, int]] = {}
+
+    @staticmethod
+    def usage_of(response: Any) -> Optional[Dict[str, int]]:
+        """Token usage of a Groq completion (or final stream chunk), if reported"""
+        usage = getattr(response, "usage", None)
+        if usage is None:
+            # Streamed responses report usage on the last chunk under x_groq
+            usage = getattr(getattr(response, "x_groq", None), "usage", None)
+        if usage is None:
+            return None
+        return {
+            "prompt_tokens": int(getattr(usage, "prompt_tokens", 0) or 0),
+            "completion_tokens": int(getattr(usage, "completion_tokens", 0) or 0),
+            "total_tokens": int(getattr(usage, "total_tokens", 0) or 0)
+        }
+
+    def record(self, component: str, usage: Optional[Dict[str, int]]):
+        if not usage:
+            return
+        with self._lock:
+            totals = self.totals.setdefault(component, {
+                "requests": 0, "prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0
+            })
+            totals["requests"] += 1
+            for key in ("prompt_tokens", "completion_tokens", "total_tokens"):
+                totals[key] += usage.get(key, 0)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = {component: dict(totals) for component, totals in self.totals.items()}
+        for totals in stats.values():
+            totals["avg_prompt_tokens"] = round(totals["prompt_tokens"] / totals["requests"], 1)
+        return stats
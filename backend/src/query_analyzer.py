@@ -1,20 +1,75 @@
+import asyncio
 import os
 import json
-from typing import Dict, Any
-from groq import Groq
+import threading
+from typing import Dict, Any, Optional
+from llm_client import LLMClient
+from rule_analyzer import RuleBasedAnalyzer, normalize_text
+from analysis_cache import AnalysisCache
+from prompt_builder import TokenUsageTracker
+from response_store import ResponseStore, prompt_version
+from metrics import span
+
+# Sent with every LLM analysis, so kept short: compact schema, one example
+ANALYZER_SYSTEM_PROMPT = """You analyze questions for an agricultural and climate data system.
+Data: crop (Karnataka districts; Kharif/Rabi/Summer; area, yield, production) and rainfall (Tamil Nadu districts; South West Monsoon/North East Monsoon/Winter/Hot Weather; actual and normal mm).
+Reply with ONLY a JSON object:
+{"query_type":"comparison|trend|ranking|correlation|recommendation","data_sources":["crop"|"rainfall"],"entities":{"districts":[],"states":[],"crops":[],"seasons":[]},"metrics":["production|yield|area|rainfall"],"time_period":"years mentioned or all available","order":"desc|asc (asc for lowest/least/bottom)","limit":10,"analysis_type":"short description"}
+Example: "Top 3 Karnataka districts by yield" ->
+{"query_type":"ranking","data_sources":["crop"],"entities":{"districts":[],"states":["Karnataka"],"crops":[],"seasons":[]},"metrics":["yield"],"time_period":"all available","order":"desc","limit":3,"analysis_type":"Rank districts by total yield"}"""
+ANALYZER_USER_PROMPT = "Query: {query}\n\nProvide ONLY the JSON response:"
+ANALYZER_PROMPT_VERSION = prompt_version(ANALYZER_SYSTEM_PROMPT, ANALYZER_USER_PROMPT)
 
 class QueryAnalyzer:
-    def __init__(self, api_key: str = None):
+    def __init__(self, api_key: str = None, rule_analyzer: RuleBasedAnalyzer = None,
+                 cache: AnalysisCache = None, usage_tracker: TokenUsageTracker = None,
+                 llm_client: LLMClient = None, hedge: bool = False, store: ResponseStore = None):
         """
         Initialize QueryAnalyzer with Groq API
         Get your free API key from: https://console.groq.com
-        """
-        self.api_key = api_key or os.getenv("GROQ_API_KEY")
-        if not self.api_key:
-            raise ValueError("GROQ_API_KEY not found in environment variables. Get one free at https://console.groq.com")
 
-        self.client = Groq(api_key=self.api_key)
+        If a rule_analyzer is given, it is tried first and the LLM is only
+        called when the rules are not confident enough. If a cache is given,
+        successful LLM analyses are stored in it and reused for the same or
+        near-duplicate questions. Token usage of LLM calls is recorded in
+        usage_tracker. LLM calls go through llm_client (shared with other
+        components); with hedge=True a slow analysis call is hedged.
+
+        If a store is given, LLM analyses are also persisted in it, keyed on
+        the normalized query, the model and the prompt version, so they are
+        shared by all worker processes and survive restarts. The prompt only
+        describes the datasets' schema, so analyses do not depend on the data
+        version.
+        """
+        self.llm = llm_client or LLMClient(api_key=api_key or os.getenv("GROQ_API_KEY"))
+        self.hedge = hedge
         self.model = "llama-3.3-70b-versatile"  # Free Llama 3.3 70B model
+        self.rule_analyzer = rule_analyzer
+        self.cache = cache
+        self.store = store
+        self.usage_tracker = usage_tracker or TokenUsageTracker()
+
+        # How each analysis was produced, so the fast-path hit rate can be tracked
+        self.path_counts = {"rules": 0, "cache": 0, "store": 0, "llm": 0}
+        self._stats_lock = threading.Lock()
+
+    def _count_path(self, path: str):
+        with self._stats_lock:
+            self.path_counts[path] = self.path_counts.get(path, 0) + 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Return analysis path counters and the rule fast-path hit rate"""
+        with self._stats_lock:
+            counts = dict(self.path_counts)
+        total = sum(counts.values())
+        stats = {
+            "paths": counts,
+            "total": total,
+            "rules_hit_rate": round(counts.get("rules", 0) / total, 4) if total else 0.0
+        }
+        if self.cache is not None:
+            stats["cache"] = self.cache.get_stats()
+        return stats
 
     def analyze_query(self, query: str, available_data: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -22,103 +77,146 @@ class QueryAnalyzer:
         - Query type (comparison, trend, ranking, correlation, recommendation)
         - Entities (states, districts, crops, years, seasons)
         - Parameters (time periods, metrics)
+
+        The returned dict carries "analysis_path" ("rules", "cache", "store"
+        or "llm").
         """
+        analysis = self._fast_analysis(query)
+        if analysis is None and self.store is not None:
+            analysis = self._stored_analysis(query, self.store.get("analysis", self._store_key(query)))
+        if analysis is not None:
+            return analysis
+
+        self._count_path("llm")
+        analysis = self._analyze_with_llm(query, available_data)
+        # Usage belongs to this request only, not to later cache or store hits
+        usage = analysis.pop("token_usage", None)
+        if self.store is not None and "error" not in analysis:
+            self.store.put("analysis", self._store_key(query), analysis)
+        return self._finish_llm_analysis(query, analysis, usage)
+
+    async def analyze_query_async(self, query: str, available_data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        analyze_query() for the event loop: the LLM call is awaited, and the
+        store (SQLite, which may wait on other workers' writes) is read and
+        written in a thread
+        """
+        analysis = self._fast_analysis(query)
+        if analysis is None and self.store is not None:
+            stored = await asyncio.to_thread(self.store.get, "analysis", self._store_key(query))
+            analysis = self._stored_analysis(query, stored)
+        if analysis is not None:
+            return analysis
+
+        self._count_path("llm")
+        analysis = await self._analyze_with_llm_async(query, available_data)
+        usage = analysis.pop("token_usage", None)
+        if self.store is not None and "error" not in analysis:
+            await asyncio.to_thread(self.store.put, "analysis", self._store_key(query), analysis)
+        return self._finish_llm_analysis(query, analysis, usage)
+
+    def _fast_analysis(self, query: str) -> Optional[Dict[str, Any]]:
+        """The rule-based or cached analysis, if there is one"""
+        if self.rule_analyzer is not None:
+            analysis = self.rule_analyzer.analyze(query)
+            if self.rule_analyzer.is_confident(analysis):
+                self._count_path("rules")
+                analysis["analysis_path"] = "rules"
+                return analysis
+
+        if self.cache is not None:
+            cached = self.cache.get(query)
+            if cached is not None:
+                self._count_path("cache")
+                cached["analysis_path"] = "cache"
+                return cached
+        return None
+
+    def _stored_analysis(self, query: str, stored: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """An analysis read from the store, also kept in the cache"""
+        if stored is None:
+            return None
+        self._count_path("store")
+        if self.cache is not None:
+            self.cache.put(query, stored)
+        stored["analysis_path"] = "store"
+        return stored
+
+    def _store_key(self, query: str) -> str:
+        return ResponseStore.key("analysis", normalize_text(query), self.model, ANALYZER_PROMPT_VERSION)
+
+    def _finish_llm_analysis(self, query: str, analysis: Dict[str, Any],
+                             usage: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        if "error" not in analysis and self.cache is not None:
+            self.cache.put(query, analysis)
+        analysis["analysis_path"] = "llm"
+        if usage:
+            analysis["token_usage"] = usage
+        return analysis
+
+    def _llm_request(self, query: str) -> Dict[str, Any]:
+        """Chat completion arguments for analyzing the query"""
+        user_prompt = ANALYZER_USER_PROMPT.format(query=query)
+        return {
+            "messages": [
+                {
+                    "role": "system",
+                    "content": ANALYZER_SYSTEM_PROMPT
+                },
+                {
+                    "role": "user",
+                    "content": user_prompt
+                }
+            ],
+            "model": self.model,
+            "temperature": 0.1,
+            "max_tokens": 1024,
+            "response_format": {"type": "json_object"}
+        }
+
+    def _analyze_with_llm(self, query: str, available_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Analyze the query with a Groq chat completion"""
+        try:
+            with span("llm_analysis", metric="llm_request_duration_seconds", labels={"component": "analysis"}):
+                chat_completion = self.llm.complete("analysis", hedge=self.hedge, **self._llm_request(query))
+            return self._parse_completion(chat_completion)
 
-        system_prompt = """You are a query analyzer for an agricultural and climate data system.
-
-Available data:
-- Crop Production Data (Karnataka): Contains district-level data for Kharif, Rabi, and Summer seasons with Area, Yield, and Production metrics
-- Rainfall Data (Tamil Nadu): Contains district-level rainfall data for South West Monsoon, North East Monsoon, Winter, and Hot Weather seasons
-
-Your task is to analyze the user's natural language query and extract structured information.
-
-Return ONLY a JSON object with the following structure (no additional text):
-{
-    "query_type": "comparison|trend|ranking|correlation|recommendation",
-    "data_sources": ["crop"|"rainfall"],
-    "entities": {
-        "districts": ["list of districts mentioned"],
-        "states": ["list of states mentioned"],
-        "crops": ["list of crops mentioned if any"],
-        "seasons": ["list of seasons mentioned"]
-    },
-    "metrics": ["list of metrics to analyze: production, yield, area, rainfall"],
-    "time_period": "description of time period if mentioned",
-    "analysis_type": "description of what analysis to perform"
-}
-
-Examples:
-Query: "Compare rainfall in Chennai vs Coimbatore"
-Response: {
-    "query_type": "comparison",
-    "data_sources": ["rainfall"],
-    "entities": {
-        "districts": ["Chennai", "Coimbatore"],
-        "states": ["Tamil Nadu"],
-        "crops": [],
-        "seasons": []
-    },
-    "metrics": ["rainfall"],
-    "time_period": "all available",
-    "analysis_type": "Compare total and seasonal rainfall between two districts"
-}
-
-Query: "Which district has highest crop production in Karnataka?"
-Response: {
-    "query_type": "ranking",
-    "data_sources": ["crop"],
-    "entities": {
-        "districts": [],
-        "states": ["Karnataka"],
-        "crops": [],
-        "seasons": []
-    },
-    "metrics": ["production"],
-    "time_period": "all available",
-    "analysis_type": "Find district with maximum total crop production"
-}"""
-
-        user_prompt = f"Query: {query}\n\nProvide ONLY the JSON response:"
+        except Exception as e:
+            return {"error": f"Query analysis failed: {str(e)}"}
 
+    async def _analyze_with_llm_async(self, query: str, available_data: Dict[str, Any]) -> Dict[str, Any]:
         try:
-            chat_completion = self.client.chat.completions.create(
-                messages=[
-                    {
-                        "role": "system",
-                        "content": system_prompt
-                    },
-                    {
-                        "role": "user",
-                        "content": user_prompt
-                    }
-                ],
-                model=self.model,
-                temperature=0.1,
-                max_tokens=1024,
-                response_format={"type": "json_object"}
-            )
-
-            response_text = chat_completion.choices[0].message.content
-
-            # Try to parse JSON from response
-            try:
-                # Clean the response text
-                response_text = response_text.strip()
-
-                # Find JSON in the response
-                start_idx = response_text.find('{')
-                end_idx = response_text.rfind('}') + 1
-
-                if start_idx != -1 and end_idx > start_idx:
-                    json_str = response_text[start_idx:end_idx]
-                    analysis = json.loads(json_str)
-                    return analysis
-                else:
-                    # If no JSON found, return error
-                    return {"error": "Could not parse query analysis", "raw_response": response_text}
-
-            except json.JSONDecodeError as e:
-                return {"error": f"JSON parsing error: {str(e)}", "raw_response": response_text}
+            with span("llm_analysis", metric="llm_request_duration_seconds", labels={"component": "analysis"}):
+                chat_completion = await self.llm.acomplete("analysis", hedge=self.hedge, **self._llm_request(query))
+            return self._parse_completion(chat_completion)
 
         except Exception as e:
             return {"error": f"Query analysis failed: {str(e)}"}
+
+    def _parse_completion(self, chat_completion: Any) -> Dict[str, Any]:
+        """The analysis JSON in a completion, with its token usage"""
+        response_text = chat_completion.choices[0].message.content
+        usage = self.usage_tracker.usage_of(chat_completion)
+        self.usage_tracker.record("analysis", usage)
+
+        # Try to parse JSON from response
+        try:
+            # Clean the response text
+            response_text = response_text.strip()
+
+            # Find JSON in the response
+            start_idx = response_text.find('{')
+            end_idx = response_text.rfind('}') + 1
+
+            if start_idx != -1 and end_idx > start_idx:
+                json_str = response_text[start_idx:end_idx]
+                analysis = json.loads(json_str)
+                if usage:
+                    analysis["token_usage"] = usage
+                return analysis
+            else:
+                # If no JSON found, return error
+                return {"error": "Could not parse query analysis", "raw_response": response_text}
+
+        except json.JSONDecodeError as e:
+            return {"error": f"JSON parsing error: {str(e)}", "raw_response": response_text}
@@ -0,0 +1,399 @@
+import asyncio
+import contextvars
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, AsyncIterator, Iterator, List, Optional, Tuple
+from data_loader import DataLoader, DataSnapshot
+from query_analyzer import QueryAnalyzer
+from query_processor import QueryProcessor
+from answer_generator import AnswerGenerator
+from rule_analyzer import normalize_text
+from single_flight import SingleFlight, SingleFlightTimeout
+from metrics import span, record_error, current_trace, start_trace
+from llm_client import request_deadline
+from structured_log import logger, current_request_id, request_context
+
+
+class PipelineError(Exception):
+    def __init__(self, message: str, stage: str, status: int = 500):
+        """Error raised by a pipeline stage; maps onto the API error response"""
+        super().__init__(message)
+        self.message = message
+        self.stage = stage
+        self.status = status
+
+    def to_response(self) -> Dict[str, Any]:
+        return {
+            "success": False,
+            "error": self.message,
+            "stage": self.stage
+        }
+
+
+class QueryPipeline:
+    def __init__(self, data_loader: DataLoader, query_analyzer: QueryAnalyzer,
+                 query_processor: QueryProcessor, answer_generator: AnswerGenerator,
+                 request_timeout: float = 60.0, single_flight: SingleFlight = None, process_threads: int = 4):
+        """
+        The analyze -> process -> generate pipeline behind /query, split into
+        stages so that streaming and batch endpoints can reuse them.
+        LLM calls of one query share a deadline of request_timeout seconds.
+
+        With single_flight, concurrent run() calls for the same normalized
+        query, data version and answer mode share one computation.
+
+        The *_async methods are the same pipeline for an event loop (the
+        ASGI app): LLM calls are awaited, and only the CPU-bound process
+        stage runs on a pool of process_threads threads.
+        """
+        self.data_loader = data_loader
+        self.query_analyzer = query_analyzer
+        self.query_processor = query_processor
+        self.answer_generator = answer_generator
+        self.request_timeout = request_timeout
+        self.single_flight = single_flight
+        self.process_threads = process_threads
+        self._process_pool: Optional[ThreadPoolExecutor] = None
+
+    def analyze(self, user_query: str, snapshot: DataSnapshot) -> Dict[str, Any]:
+        """Step 1: Analyze the query"""
+        available_data = snapshot.view.summary
+        with span("analyze"):
+            query_analysis = self.query_analyzer.analyze_query(user_query, available_data)
+        return self._checked_analysis(query_analysis)
+
+    async def analyze_async(self, user_query: str, snapshot: DataSnapshot) -> Dict[str, Any]:
+        available_data = snapshot.view.summary
+        with span("analyze"):
+            query_analysis = await self.query_analyzer.analyze_query_async(user_query, available_data)
+        return self._checked_analysis(query_analysis)
+
+    @staticmethod
+    def _checked_analysis(query_analysis: Dict[str, Any]) -> Dict[str, Any]:
+        if "error" in query_analysis:
+            record_error("query_analysis")
+            logger.warning("query_failed", stage="query_analysis", error=query_analysis["error"])
+            raise PipelineError(query_analysis["error"], "query_analysis")
+
+        logger.payload("query_analysis", analysis=query_analysis)
+        return query_analysis
+
+    def process(self, query_analysis: Dict[str, Any], snapshot: DataSnapshot) -> Dict[str, Any]:
+        """Step 2: Process the query and retrieve data"""
+        with span("process"):
+            query_results = self.query_processor.process_query(query_analysis, snapshot)
+
+        if "error" in query_results:
+            record_error("query_processing")
+            logger.warning("query_failed", stage="query_processing", error=query_results["error"])
+            raise PipelineError(query_results["error"], "query_processing")
+
+        logger.payload("query_results", results=query_results)
+        return query_results
+
+    async def process_async(self, query_analysis: Dict[str, Any], snapshot: DataSnapshot) -> Dict[str, Any]:
+        """process() on the process pool, in the caller's context (trace, request id)"""
+        if self._process_pool is None:
+            self._process_pool = ThreadPoolExecutor(max_workers=self.process_threads,
+                                                    thread_name_prefix="query-process")
+        context = contextvars.copy_context()
+        return await asyncio.get_running_loop().run_in_executor(
+            self._process_pool, context.run, self.process, query_analysis, snapshot)
+
+    def generate(self, user_query: str, query_analysis: Dict[str, Any],
+                 query_results: Dict[str, Any], snapshot: DataSnapshot, mode: str = None) -> Dict[str, Any]:
+        """Step 3: Generate natural language answer (mode: "auto", "fast" or "llm")"""
+        with span("generate"):
+            answer = self.answer_generator.generate_answer(user_query, query_results, mode=mode,
+                                                           data_version=snapshot.version)
+        return self._finish_answer(answer, query_analysis, snapshot)
+
+    async def generate_async(self, user_query: str, query_analysis: Dict[str, Any],
+                             query_results: Dict[str, Any], snapshot: DataSnapshot,
+                             mode: str = None) -> Dict[str, Any]:
+        with span("generate"):
+            answer = await self.answer_generator.generate_answer_async(
+                user_query, query_results, mode=mode, data_version=snapshot.version)
+        return self._finish_answer(answer, query_analysis, snapshot)
+
+    @staticmethod
+    def _finish_answer(answer: Dict[str, Any], query_analysis: Dict[str, Any],
+                       snapshot: DataSnapshot) -> Dict[str, Any]:
+        if not answer.get("success"):
+            record_error("answer_generation")
+            logger.warning("query_failed", stage="answer_generation", error=answer.get("error"))
+        answer["analysis_path"] = query_analysis.get("analysis_path")
+        answer["data_version"] = snapshot.version
+        # LLM tokens spent on this request (None for a stage that made no call)
+        answer["token_usage"] = {
+            "analysis": query_analysis.get("token_usage"),
+            "answer": answer.get("token_usage")
+        }
+        return answer
+
+    def run(self, user_query: str, mode: str = None) -> Dict[str, Any]:
+        """Run all three stages and return the /query response body"""
+        # One snapshot for the whole request, even if data is reloaded meanwhile
+        snapshot = self.data_loader.snapshot()
+        if self.single_flight is None:
+            return self._run(user_query, snapshot, mode)
+
+        try:
+            answer, shared = self.single_flight.do(self._flight_key(user_query, snapshot, mode),
+                                                   lambda: self._run(user_query, snapshot, mode),
+                                                   timeout=self.request_timeout)
+        except SingleFlightTimeout as e:
+            raise self._coalesce_error(user_query, e)
+        return self._coalesced(user_query, answer, shared)
+
+    async def run_async(self, user_query: str, mode: str = None) -> Dict[str, Any]:
+        snapshot = self.data_loader.snapshot()
+        if self.single_flight is None:
+            return await self._run_async(user_query, snapshot, mode)
+
+        try:
+            answer, shared = await self.single_flight.do_async(self._flight_key(user_query, snapshot, mode),
+                                                               lambda: self._run_async(user_query, snapshot, mode),
+                                                               timeout=self.request_timeout)
+        except SingleFlightTimeout as e:
+            raise self._coalesce_error(user_query, e)
+        return self._coalesced(user_query, answer, shared)
+
+    def _flight_key(self, user_query: str, snapshot: DataSnapshot, mode: str = None) -> Tuple[str, str, str]:
+        return normalize_text(user_query), snapshot.version, mode or self.answer_generator.default_mode
+
+    @staticmethod
+    def _coalesce_error(user_query: str, error: SingleFlightTimeout) -> PipelineError:
+        record_error("coalesce")
+        logger.warning("query_failed", stage="coalesce", query=user_query, error=str(error))
+        return PipelineError(str(error), "coalesce", 504)
+
+    @staticmethod
+    def _coalesced(user_query: str, answer: Dict[str, Any], shared: bool) -> Dict[str, Any]:
+        if shared:
+            logger.info("query_coalesced", query=user_query)
+            answer["query"] = user_query
+            answer["coalesced"] = True
+        return answer
+
+    def _run(self, user_query: str, snapshot: DataSnapshot, mode: str = None) -> Dict[str, Any]:
+        started = time.perf_counter()
+        with request_deadline(self.request_timeout):
+            query_analysis = self.analyze(user_query, snapshot)
+            query_results = self.process(query_analysis, snapshot)
+            answer = self.generate(user_query, query_analysis, query_results, snapshot, mode=mode)
+
+        self._log_answered(user_query, query_analysis, answer.get("answer_renderer"), snapshot, started,
+                           success=answer.get("success"))
+        return answer
+
+    async def _run_async(self, user_query: str, snapshot: DataSnapshot, mode: str = None) -> Dict[str, Any]:
+        started = time.perf_counter()
+        with request_deadline(self.request_timeout):
+            query_analysis = await self.analyze_async(user_query, snapshot)
+            query_results = await self.process_async(query_analysis, snapshot)
+            answer = await self.generate_async(user_query, query_analysis, query_results, snapshot, mode=mode)
+
+        self._log_answered(user_query, query_analysis, answer.get("answer_renderer"), snapshot, started,
+                           success=answer.get("success"))
+        return answer
+
+    @staticmethod
+    def _log_answered(user_query: str, query_analysis: Dict[str, Any], renderer: str, snapshot: DataSnapshot,
+                      started: float, success: bool = True):
+        """One summary record per answered query, with the time spent in each stage"""
+        stages: Dict[str, float] = {}
+        for name, elapsed in current_trace() or []:
+            stages[name] = round(stages.get(name, 0.0) + elapsed * 1000, 2)
+        logger.info("query_answered", query=user_query, success=success,
+                    query_type=query_analysis.get("query_type"), analysis_path=query_analysis.get("analysis_path"),
+                    answer_renderer=renderer, data_version=snapshot.version,
+                    duration_ms=round((time.perf_counter() - started) * 1000, 2), stages_ms=stages)
+
+    def run_safe(self, user_query: str, mode: str = None) -> Dict[str, Any]:
+        """Like run(), but returns failures as /query-shaped error bodies"""
+        try:
+            return self.run(user_query, mode=mode)
+        except Exception as e:
+            return self._error_response(user_query, e)
+
+    async def run_safe_async(self, user_query: str, mode: str = None) -> Dict[str, Any]:
+        try:
+            return await self.run_async(user_query, mode=mode)
+        except Exception as e:
+            return self._error_response(user_query, e)
+
+    @staticmethod
+    def _error_response(user_query: str, error: Exception) -> Dict[str, Any]:
+        if isinstance(error, PipelineError):
+            return error.to_response()
+        logger.error("query_failed", stage="internal", query=user_query, error=str(error))
+        record_error("internal")
+        return {
+            "success": False,
+            "error": f"Internal server error: {str(error)}"
+        }
+
+    def run_batch(self, queries: List[str], concurrency: int = 4, mode: str = None) -> Dict[str, Any]:
+        """
+        Run many queries with at most `concurrency` pipelines in flight.
+        Queries that differ only in case/whitespace are computed once.
+        Results keep the input order and the shape of /query responses.
+        """
+        unique, keys = self._batch_keys(queries)
+
+        answers: Dict[str, Dict[str, Any]] = {}
+        request_id = current_request_id()
+        if unique:
+            with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(unique)))) as executor:
+                futures = {key: executor.submit(self._run_safe_in_request, request_id, user_query, mode)
+                           for key, user_query in unique.items()}
+                for key, future in futures.items():
+                    answers[key] = future.result()
+
+        return self._batch_response(keys, unique, answers)
+
+    async def run_batch_async(self, queries: List[str], concurrency: int = 4, mode: str = None) -> Dict[str, Any]:
+        """run_batch() as tasks on the event loop, at most `concurrency` in flight"""
+        unique, keys = self._batch_keys(queries)
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+
+        async def run_one(user_query: str) -> Dict[str, Any]:
+            async with semaphore:
+                # Each task runs in a copy of the request context: own trace, same request id
+                start_trace()
+                return await self.run_safe_async(user_query, mode)
+
+        results = await asyncio.gather(*(run_one(user_query) for user_query in unique.values()))
+        return self._batch_response(keys, unique, dict(zip(unique, results)))
+
+    @staticmethod
+    def _batch_keys(queries: List[str]) -> Tuple[Dict[str, str], List[Any]]:
+        """The distinct queries by normalized key, and each input's key (None for an empty query)"""
+        unique: Dict[str, str] = {}
+        keys: List[Any] = []
+        for user_query in queries:
+            if not isinstance(user_query, str) or not user_query.strip():
+                keys.append(None)
+                continue
+            key = " ".join(user_query.split()).casefold()
+            unique.setdefault(key, user_query.strip())
+            keys.append(key)
+        return unique, keys
+
+    @staticmethod
+    def _batch_response(keys: List[Any], unique: Dict[str, str],
+                        answers: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+        results = []
+        for index, key in enumerate(keys):
+            if key is None:
+                item = {"success": False, "error": "Query cannot be empty"}
+            else:
+                item = dict(answers[key])
+            item["index"] = index
+            results.append(item)
+
+        return {
+            "success": True,
+            "count": len(results),
+            "unique": len(unique),
+            "results": results
+        }
+
+    def _run_safe_in_request(self, request_id: str, user_query: str, mode: str = None) -> Dict[str, Any]:
+        """run_safe() on a worker thread, logging under the batch request's id with its own stage timings"""
+        with request_context(request_id):
+            start_trace()
+            return self.run_safe(user_query, mode)
+
+    def stream(self, user_query: str, mode: str = None) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Run the pipeline as a sequence of (event, payload) pairs:
+        "analysis" and "data" as soon as each stage finishes, one "token" per
+        answer chunk, then "done" with the sources. Failures are reported as a
+        final "error" event instead of being raised.
+        """
+        with request_deadline(self.request_timeout):
+            yield from self._stream(user_query, mode)
+
+    def _stream(self, user_query: str, mode: str = None) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        started = time.perf_counter()
+        snapshot = self.data_loader.snapshot()
+        try:
+            query_analysis = self.analyze(user_query, snapshot)
+            yield "analysis", query_analysis
+
+            query_results = self.process(query_analysis, snapshot)
+            yield "data", query_results
+        except PipelineError as e:
+            yield "error", e.to_response()
+            return
+
+        renderer = self.answer_generator.renderer_for(query_results, mode)
+        try:
+            with span("generate"):
+                for token in self.answer_generator.stream_answer(user_query, query_results, mode=mode,
+                                                                 data_version=snapshot.version):
+                    yield "token", {"text": token}
+        except Exception as e:
+            yield "error", self._stream_error(user_query, e)
+            return
+
+        yield "done", self._stream_done(user_query, query_analysis, query_results, renderer, snapshot)
+        self._log_answered(user_query, query_analysis, renderer, snapshot, started)
+
+    async def stream_async(self, user_query: str, mode: str = None) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """stream() for the event loop"""
+        with request_deadline(self.request_timeout):
+            async for event in self._stream_async(user_query, mode):
+                yield event
+
+    async def _stream_async(self, user_query: str,
+                            mode: str = None) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        started = time.perf_counter()
+        snapshot = self.data_loader.snapshot()
+        try:
+            query_analysis = await self.analyze_async(user_query, snapshot)
+            yield "analysis", query_analysis
+
+            query_results = await self.process_async(query_analysis, snapshot)
+            yield "data", query_results
+        except PipelineError as e:
+            yield "error", e.to_response()
+            return
+
+        renderer = self.answer_generator.renderer_for(query_results, mode)
+        try:
+            with span("generate"):
+                async for token in self.answer_generator.stream_answer_async(
+                        user_query, query_results, mode=mode, data_version=snapshot.version):
+                    yield "token", {"text": token}
+        except Exception as e:
+            yield "error", self._stream_error(user_query, e)
+            return
+
+        yield "done", self._stream_done(user_query, query_analysis, query_results, renderer, snapshot)
+        self._log_answered(user_query, query_analysis, renderer, snapshot, started)
+
+    @staticmethod
+    def _stream_error(user_query: str, error: Exception) -> Dict[str, Any]:
+        record_error("answer_generation")
+        logger.warning("query_failed", stage="answer_generation", query=user_query, error=str(error))
+        return PipelineError(f"Answer generation failed: {str(error)}", "answer_generation").to_response()
+
+    def _stream_done(self, user_query: str, query_analysis: Dict[str, Any], query_results: Dict[str, Any],
+                     renderer: str, snapshot: DataSnapshot) -> Dict[str, Any]:
+        return {
+            "success": True,
+            "query": user_query,
+            "sources": self.answer_generator._extract_sources(query_results),
+            "answer_renderer": renderer,
+            "analysis_path": query_analysis.get("analysis_path"),
+            "data_version": snapshot.version
+        }
+
+    def shutdown(self):
+        """Stop the process pool of the async methods (if it was started)"""
+        if self._process_pool is not None:
+            self._process_pool.shutdown(wait=False)
+            self._process_pool = None
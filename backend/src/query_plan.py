@@ -0,0 +1,421 @@
+from typing import Dict, Any, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+from data_loader import DataSnapshot
+from district_index import normalize_name
+from materialized_view import RAINFALL_DEPARTURE
+from partition_store import PartitionStore
+from schema import SEASON_CODES
+
+CROP_METRICS = ("production", "yield", "area")
+CROP_SEASONS = ("kharif", "rabi", "summer")
+RAINFALL_SEASONS = ("sw_monsoon", "ne_monsoon", "winter", "hot_weather")
+
+# Output field -> canonical column, always projected for each query type
+COMPARISON_RAINFALL_FIELDS = {
+    "total_actual_rainfall": "total_actual",
+    "total_normal_rainfall": "total_normal",
+    "southwest_monsoon": "sw_monsoon_actual",
+    "northeast_monsoon": "ne_monsoon_actual",
+    "winter": "winter_actual",
+    "hot_weather": "hot_weather_actual",
+}
+COMPARISON_CROP_FIELDS = {
+    "total_production": "total_production",
+    "total_yield": "total_yield",
+    "total_area": "total_area",
+    "kharif_production": "kharif_production",
+    "rabi_production": "rabi_production",
+    "summer_production": "summer_production",
+}
+RANKING_CROP_FIELDS = {"total_production": "total_production", "total_yield": "total_yield",
+                       "total_area": "total_area"}
+RANKING_RAINFALL_FIELDS = {"total_rainfall": "total_actual", "normal_rainfall": "total_normal"}
+
+YearRange = Optional[Tuple[Optional[int], Optional[int]]]
+
+
+def crop_columns(metrics: List[str], seasons: List[str]) -> List[str]:
+    """Every requested crop metric for every requested season (default: total production), primary first"""
+    wanted = [m for m in metrics if m in CROP_METRICS] or ["production"]
+    codes = [SEASON_CODES[s] for s in seasons if SEASON_CODES.get(s) in CROP_SEASONS] or ["total"]
+    return list(dict.fromkeys(f"{code}_{metric}" for metric in wanted for code in codes))
+
+
+def rainfall_columns(metrics: List[str], seasons: List[str], departure: bool = True) -> List[str]:
+    """Every requested rainfall measure for every requested season (default: total actual), primary first"""
+    codes = [SEASON_CODES[s] for s in seasons if SEASON_CODES.get(s) in RAINFALL_SEASONS] or ["total"]
+    kinds = [k for k in ("normal", "actual") if k in metrics] or ["actual"]
+    columns = [f"{code}_{kind}" for kind in kinds for code in codes]
+    # Departure from normal only exists for the whole year
+    if departure and "departure" in metrics:
+        if codes == ["total"] and kinds == ["actual"]:
+            columns.insert(0, RAINFALL_DEPARTURE)
+        else:
+            columns.append(RAINFALL_DEPARTURE)
+    return list(dict.fromkeys(columns))
+
+
+# Logical steps. A branch is a Scan followed by some of Filter, Project,
+# Aggregate, Sort and Limit; TopK is the physical form of Sort + Limit over
+# a snapshot, served from the materialized view's precomputed orders.
+
+class Scan:
+    def __init__(self, dataset: str, source: str, columns: List[str] = None, districts: List[str] = None,
+                 states: List[str] = None, year_range: YearRange = None):
+        self.dataset = dataset
+        self.source = source  # "snapshot" (current year) or "partitions" (multi-year)
+        self.columns = list(columns or [])
+        # None reads every district; a list (even an empty one) only those named
+        self.districts = list(districts) if districts is not None else None
+        self.states = list(states or [])
+        self.year_range = year_range
+
+    def __repr__(self) -> str:
+        predicates = [f"{name}={value}" for name, value in
+                      (("districts", self.districts), ("states", self.states), ("years", self.year_range))
+                      if value or (name == "districts" and value is not None)]
+        return f"Scan({self.dataset}@{self.source}, columns={self.columns}{''.join(', ' + p for p in predicates)})"
+
+
+class Filter:
+    def __init__(self, field: str, values: Any):
+        self.field = field  # "district", "state" or "year" (values is then a year range)
+        self.values = values
+
+    def __repr__(self) -> str:
+        return f"Filter({self.field} in {self.values})"
+
+
+class Project:
+    def __init__(self, fields: Dict[str, str]):
+        self.fields = dict(fields)  # output name -> column
+
+    def __repr__(self) -> str:
+        return f"Project({list(self.fields)})"
+
+
+class Aggregate:
+    def __init__(self, keys: List[str], aggregations: Dict[str, Tuple[str, Optional[str]]]):
+        """Per keys + year: column -> (how, weight column); how is "sum", "mean" or "weighted" (by weight)"""
+        self.keys = list(keys)
+        self.aggregations = dict(aggregations)
+
+    def __repr__(self) -> str:
+        return f"Aggregate(by={self.keys + ['year']}, {self.aggregations})"
+
+
+class Sort:
+    def __init__(self, column: str, ascending: bool = False):
+        self.column = column
+        self.ascending = ascending
+
+    def __repr__(self) -> str:
+        return f"Sort({self.column} {'asc' if self.ascending else 'desc'})"
+
+
+class Limit:
+    def __init__(self, count: int, offset: int = 0):
+        self.count = count
+        self.offset = offset
+
+    def __repr__(self) -> str:
+        return f"Limit({self.count}, offset={self.offset})"
+
+
+class TopK:
+    def __init__(self, column: str, ascending: bool, count: int, offset: int = 0):
+        self.column = column
+        self.ascending = ascending
+        self.count = count
+        self.offset = offset
+
+    def __repr__(self) -> str:
+        return f"TopK({self.column} {'asc' if self.ascending else 'desc'}, {self.count}, offset={self.offset})"
+
+
+class Branch:
+    def __init__(self, name: str, scan: Scan, steps: List[Any]):
+        self.name = name
+        self.scan = scan
+        self.steps = steps
+
+    def __repr__(self) -> str:
+        return " -> ".join(repr(step) for step in [self.scan] + self.steps)
+
+
+class QueryPlan:
+    def __init__(self, query_type: str, branches: List[Branch], params: Dict[str, Any] = None):
+        """Branches in output order; params carry what the result needs besides rows (e.g. ranked columns)"""
+        self.query_type = query_type
+        self.branches = branches
+        self.params = params or {}
+        self.optimized = False
+
+    def describe(self) -> List[str]:
+        return [f"{branch.name}: {branch!r}" for branch in self.branches]
+
+    def __repr__(self) -> str:
+        return "; ".join(self.describe())
+
+
+class PlanCompiler:
+    def __init__(self):
+        """
+        Turns a query analysis into a QueryPlan for comparison, ranking and
+        trend queries. The compiled plan is naive (filters after the scan,
+        every column read); optimize() rewrites it before execution.
+        """
+
+    def compile(self, query_analysis: Dict[str, Any], year_range: YearRange = None) -> Optional[QueryPlan]:
+        query_type = query_analysis.get("query_type", "")
+        compiler = getattr(self, f"_compile_{query_type}", None)
+        if compiler is None:
+            return None
+        entities = query_analysis.get("entities") or {}
+        return compiler(
+            data_sources=query_analysis.get("data_sources") or [],
+            metrics=query_analysis.get("metrics") or [],
+            districts=entities.get("districts") or [],
+            states=entities.get("states") or [],
+            seasons=entities.get("seasons") or [],
+            analysis=query_analysis,
+            year_range=year_range
+        )
+
+    @staticmethod
+    def _fields(base: Dict[str, str], columns: List[str]) -> Dict[str, str]:
+        """The base output fields plus each requested column (under its own name) not already among them"""
+        fields = dict(base)
+        for column in columns:
+            if column not in fields.values():
+                fields[column] = column
+        return fields
+
+    def _compile_comparison(self, data_sources, metrics, districts, seasons, **_) -> QueryPlan:
+        # A comparison is between the districts the query names; without any
+        # there is nothing to compare
+        branches = []
+        if districts and "rainfall" in data_sources:
+            fields = self._fields(COMPARISON_RAINFALL_FIELDS, rainfall_columns(metrics, seasons))
+            branches.append(Branch("rainfall", Scan("rainfall", "snapshot"),
+                                   [Filter("district", districts), Project(fields)]))
+        if districts and "crop" in data_sources:
+            fields = self._fields(COMPARISON_CROP_FIELDS, crop_columns(metrics, seasons))
+            branches.append(Branch("crop", Scan("crop", "snapshot"),
+                                   [Filter("district", districts), Project(fields)]))
+        return QueryPlan("comparison", branches, {"districts": districts})
+
+    def _compile_ranking(self, data_sources, metrics, districts, seasons, analysis, **_) -> QueryPlan:
+        ascending = str(analysis.get("order") or "desc").lower().startswith("asc")
+        try:
+            limit = max(1, int(analysis.get("limit") or 10))
+        except (TypeError, ValueError):
+            limit = 10
+
+        branches, params = [], {"order": "asc" if ascending else "desc", "districts": districts}
+        for dataset, columns, base in (("crop", crop_columns(metrics, seasons), RANKING_CROP_FIELDS),
+                                       ("rainfall", rainfall_columns(metrics, seasons), RANKING_RAINFALL_FIELDS)):
+            if dataset not in data_sources:
+                continue
+            # Ranked by the primary column; the other requested columns come along
+            steps = [Filter("district", districts)] if districts else []
+            steps += [Sort(columns[0], ascending), Limit(limit), Project(self._fields(base, columns))]
+            branches.append(Branch(dataset, Scan(dataset, "snapshot"), steps))
+            params[f"{dataset}_ranked_by"] = columns[0]
+        return QueryPlan("ranking", branches, params)
+
+    def _compile_trend(self, data_sources, metrics, districts, states, seasons, year_range, **_) -> QueryPlan:
+        keys = ["state", "district_key"] if districts else ["state"]
+        branches = []
+        if "crop" in data_sources:
+            # Production and area add up across districts; yield is area-weighted
+            aggregations = {}
+            for column in crop_columns(metrics, seasons):
+                season, metric = column.rsplit("_", 1)
+                aggregations[column] = ("weighted", f"{season}_area") if metric == "yield" else ("sum", None)
+            branches.append(Branch("crop", Scan("crop", "partitions"), [Aggregate(keys, aggregations)]))
+        if "rainfall" in data_sources:
+            aggregations = {column: ("mean", None)
+                            for column in rainfall_columns(metrics, seasons, departure=False)}
+            branches.append(Branch("rainfall", Scan("rainfall", "partitions"), [Aggregate(keys, aggregations)]))
+
+        for branch in branches:
+            predicates = [Filter("state", states), Filter("year", year_range), Filter("district", districts)]
+            branch.steps[:0] = [p for p in predicates if p.values]
+        return QueryPlan("trend", branches, {"districts": districts, "year_range": year_range})
+
+
+def optimize(plan: QueryPlan) -> QueryPlan:
+    """
+    Rewrite a compiled plan in place:
+    - predicate pushdown: district/state/year filters move into the scan, so
+      partitions are pruned before loading and district rows are picked by
+      index positions instead of a pass over the frame
+    - Sort + Limit over a snapshot becomes TopK on the precomputed orders
+    - column pruning: a scan reads only the columns later steps use
+    """
+    if plan.optimized:
+        return plan
+    for branch in plan.branches:
+        scan, steps = branch.scan, []
+        for step in branch.steps:
+            if isinstance(step, Filter) and step.field == "district":
+                scan.districts = list(step.values)
+            elif isinstance(step, Filter) and step.field == "state":
+                scan.states = list(step.values)
+            elif isinstance(step, Filter) and step.field == "year":
+                scan.year_range = step.values
+            elif (isinstance(step, Limit) and steps and isinstance(steps[-1], Sort)
+                  and scan.source == "snapshot"):
+                sort = steps.pop()
+                steps.append(TopK(sort.column, sort.ascending, step.count, step.offset))
+            else:
+                steps.append(step)
+        branch.steps = steps
+
+        columns = [c for step in steps if isinstance(step, Project) for c in step.fields.values()]
+        for step in steps:
+            if isinstance(step, Aggregate):
+                for column, (_, weight) in step.aggregations.items():
+                    columns += [column] + ([weight] if weight else [])
+            elif isinstance(step, (Sort, TopK)):
+                columns.append(step.column)
+        scan.columns = list(dict.fromkeys(columns))
+    plan.optimized = True
+    return plan
+
+
+class ScanResult:
+    def __init__(self, frame: pd.DataFrame, positions: Optional[np.ndarray] = None, lookup: Dict = None,
+                 years: List[int] = None):
+        """Rows read by a scan: `frame` restricted to `positions` (all rows when None)"""
+        self.frame = frame
+        self.positions = positions
+        self.lookup = lookup
+        self.years = years
+
+    def take(self, positions: Optional[np.ndarray]) -> pd.DataFrame:
+        return self.frame if positions is None else self.frame.iloc[positions]
+
+    def rows(self) -> pd.DataFrame:
+        return self.take(self.positions)
+
+
+class PlanExecutor:
+    def __init__(self, snapshot: DataSnapshot, partitions: PartitionStore):
+        """
+        Runs an optimized plan against one data snapshot (and the partition
+        store for multi-year scans). Every step works on whole columns.
+        """
+        self.snapshot = snapshot
+        self.partitions = partitions
+
+    def execute(self, plan: QueryPlan) -> Dict[str, Dict[str, Any]]:
+        """Branch name -> {"frame": result rows, "scan": ScanResult}"""
+        plan = optimize(plan)
+        results = {}
+        for branch in plan.branches:
+            scan = self._scan(branch.scan)
+            frame = None
+            for step in branch.steps:
+                frame = self._step(step, branch.scan, scan, frame)
+            results[branch.name] = {"frame": scan.rows() if frame is None else frame, "scan": scan}
+        return results
+
+    def _scan(self, scan: Scan) -> ScanResult:
+        if scan.source == "partitions":
+            if scan.districts == []:
+                # Filtered to no district at all (the store reads an empty list as every district)
+                frame = pd.DataFrame(columns=["district", "state", "year"] + scan.columns)
+            else:
+                frame = self.partitions.scan(scan.dataset, scan.states, scan.year_range, scan.districts,
+                                             columns=scan.columns)
+            return ScanResult(frame, years=sorted(frame["year"].unique().tolist()))
+
+        frame = self.snapshot.crop_data if scan.dataset == "crop" else self.snapshot.rainfall_data
+        index = self.snapshot.crop_index if scan.dataset == "crop" else self.snapshot.rainfall_index
+        # Snapshot frames are shared, not copied: rows are picked first and
+        # only the projected columns of those rows are read
+        if scan.districts is None:
+            return ScanResult(frame)
+        lookup = index.resolve(scan.districts)
+        return ScanResult(frame, np.asarray(lookup["positions"], dtype=np.int64), lookup)
+
+    def _step(self, step: Any, scan: Scan, result: ScanResult, frame: Optional[pd.DataFrame]) -> pd.DataFrame:
+        if isinstance(step, TopK):
+            view = self.snapshot.view
+            positions = view.top_k_positions(scan.dataset, step.column, step.count, step.ascending,
+                                             offset=step.offset, within=result.positions)
+            return result.take(positions)
+        if frame is None:
+            frame = result.rows()
+        if isinstance(step, Project):
+            # Entries read only the projected columns, so selecting them
+            # here would just copy the rows
+            missing = [c for c in step.fields.values() if c not in frame.columns]
+            if missing:
+                raise KeyError(f"Columns not in the data: {missing}")
+            return frame
+        if isinstance(step, Sort):
+            return frame.sort_values(step.column, ascending=step.ascending, kind="stable", na_position="last")
+        if isinstance(step, Limit):
+            return frame.iloc[max(step.offset, 0):max(step.offset, 0) + max(step.count, 0)]
+        if isinstance(step, Aggregate):
+            return self._aggregate(frame, step)
+        raise ValueError(f"Unexpected plan step {step!r}")
+
+    @staticmethod
+    def _aggregate(frame: pd.DataFrame, step: Aggregate) -> pd.DataFrame:
+        """
+        All aggregations of the step in one grouped pass: sums of the value
+        (and weighted value) columns and non-null counts, from which means
+        and weighted means follow. Missing values are skipped, weights
+        included, and a group with no value at all aggregates to NaN, not 0. Returns value, change and pct_change
+        columns per aggregated column, indexed by keys + year, plus the
+        district label per group when grouping by district.
+        """
+        keys = step.keys + ["year"]
+        if frame.empty:
+            return pd.DataFrame(index=pd.MultiIndex.from_tuples([], names=keys))
+
+        if "district_key" in step.keys:
+            # Normalize each distinct name once, not once per row
+            codes, names = pd.factorize(frame["district"])
+            frame = frame.assign(district_key=np.asarray([normalize_name(n) for n in names], dtype=object)[codes])
+
+        measures = {}
+        for column, (how, weight) in step.aggregations.items():
+            values = frame[column].to_numpy(dtype=float) if column in frame.columns else np.full(len(frame), np.nan)
+            measures[column] = values
+            if how == "weighted":
+                # In float: the product of two downcast integer columns could overflow
+                weights = frame[weight].to_numpy(dtype=float)
+                measures[f"{column}*w"] = values * weights
+                # Only the weights of rows with a value
+                measures[f"{column}:w"] = np.where(np.isnan(values), np.nan, weights)
+        grouped = pd.DataFrame(measures, index=frame.index).groupby(
+            [frame[k] for k in keys], sort=True, observed=True)
+        sums = grouped.sum(min_count=1)
+        counts = grouped.count()
+
+        values = {}
+        for column, (how, weight) in step.aggregations.items():
+            if how == "weighted":
+                area = sums[f"{column}:w"]
+                values[column] = sums[f"{column}*w"] / area.where(area > 0)
+            elif how == "mean":
+                values[column] = sums[column] / counts[column].where(counts[column] > 0)
+            else:
+                values[column] = sums[column]
+        values = pd.DataFrame(values)
+
+        by_group = values.groupby(level=step.keys, observed=True)
+        change = by_group.diff()
+        previous = by_group.shift()
+        pct_change = change / previous.where(previous != 0) * 100
+        table = pd.concat({"value": values, "change": change, "pct_change": pct_change}, axis=1).round(2)
+        if "district_key" in step.keys:
+            labels = frame.groupby([frame[k] for k in step.keys], sort=True, observed=True)["district"].last()
+            table[("label", "")] = labels.reindex(table.index.droplevel("year")).to_numpy()
+        return table
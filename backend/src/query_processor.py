@@ -1,182 +1,218 @@
+import re
 import pandas as pd
-from typing import Dict, Any, List
-from data_loader import DataLoader
+from typing import Dict, Any, List, Optional, Tuple
+from correlation_engine import CorrelationEngine, CROP_SEASON_CODES, RAINFALL_SEASON_CODES
+from data_loader import DataLoader, DataSnapshot
+from query_plan import PlanCompiler, PlanExecutor, QueryPlan, optimize
+from structured_log import logger
 
 class QueryProcessor:
-    def __init__(self, data_loader: DataLoader):
+    def __init__(self, data_loader: DataLoader, correlation_engine: CorrelationEngine = None):
         self.data_loader = data_loader
+        self.correlation_engine = correlation_engine or CorrelationEngine(data_loader.get_partition_store())
+        self.compiler = PlanCompiler()
 
-    def process_query(self, query_analysis: Dict[str, Any]) -> Dict[str, Any]:
+    def process_query(self, query_analysis: Dict[str, Any], snapshot: DataSnapshot = None) -> Dict[str, Any]:
         """
         Process the analyzed query and return results
+
+        All handlers read from a single data snapshot (the current one unless
+        given), so a concurrent reload cannot change data mid-query.
         """
         if "error" in query_analysis:
             return query_analysis
 
+        snapshot = snapshot or self.data_loader.snapshot()
+
         query_type = query_analysis.get("query_type", "")
         data_sources = query_analysis.get("data_sources", [])
         entities = query_analysis.get("entities", {})
         metrics = query_analysis.get("metrics", [])
 
         try:
-            if query_type == "comparison":
-                return self._handle_comparison(data_sources, entities, metrics)
-            elif query_type == "ranking":
-                return self._handle_ranking(data_sources, entities, metrics)
-            elif query_type == "trend":
-                return self._handle_trend(data_sources, entities, metrics)
+            # Comparison, ranking and trend queries run as a compiled plan
+            plan = self.compiler.compile(query_analysis, self._parse_year_range(query_analysis.get("time_period")))
+            if plan is not None:
+                return self._execute_plan(optimize(plan), snapshot)
             elif query_type == "correlation":
-                return self._handle_correlation(data_sources, entities, metrics)
+                return self._handle_correlation(snapshot, data_sources, entities, metrics,
+                                                year_range=self._parse_year_range(query_analysis.get("time_period")))
             else:
-                return self._handle_general_query(data_sources, entities, metrics)
+                return self._handle_general_query(snapshot, data_sources, entities, metrics)
 
         except Exception as e:
             return {"error": f"Query processing failed: {str(e)}"}
 
-    def _handle_comparison(self, data_sources: List[str], entities: Dict, metrics: List[str]) -> Dict:
-        """Handle comparison queries"""
-        results = {"query_type": "comparison", "data": []}
-
-        if "rainfall" in data_sources:
-            districts = entities.get("districts", [])
-            rainfall_df = self.data_loader.get_rainfall_data()
-
-            for district in districts:
-                district_data = rainfall_df[rainfall_df['District'].str.contains(district, case=False, na=False)]
-                if not district_data.empty:
-                    row = district_data.iloc[0]
-                    results["data"].append({
-                        "district": row['District'],
-                        "total_actual_rainfall": float(row['Total Actual Rainfall (June\'17 to May\'18) in mm']),
-                        "total_normal_rainfall": float(row['Total Normal Rainfall (June\'17 to May\'18) in mm']),
-                        "southwest_monsoon": float(row['Actual Rainfall in South West Monsoon (June\'17 to September\'17) in mm']),
-                        "northeast_monsoon": float(row['Actual Rainfall in North East Monsoon (October\'17 to December\'17) in mm']),
-                        "winter": float(row['Actual Rainfall in Winter Season (January\'18 to and February\'18) in mm']),
-                        "hot_weather": float(row['Actual Rainfall in Hot Weather Season (March\'18 to May\'18) in mm'])
-                    })
-
-        if "crop" in data_sources:
-            districts = entities.get("districts", [])
-            crop_df = self.data_loader.get_crop_data()
-
-            for district in districts:
-                district_data = crop_df[crop_df['District Name'].str.contains(district, case=False, na=False)]
-                if not district_data.empty:
-                    row = district_data.iloc[0]
-                    results["data"].append({
-                        "district": row['District Name'],
-                        "total_production": float(row['All Seasons_Production']),
-                        "total_yield": float(row['All Seasons_Yield']),
-                        "total_area": float(row['All Seasons_AreaAfter bund correction factor']),
-                        "kharif_production": float(row['Kharif_Production']),
-                        "rabi_production": float(row['Rabi_Production']),
-                        "summer_production": float(row['Summer_Production'])
-                    })
-
+    def _execute_plan(self, plan: QueryPlan, snapshot: DataSnapshot) -> Dict:
+        # Formatted on the log writer thread, and only at debug level
+        logger.debug("query_plan", query_type=plan.query_type, plan=plan)
+        branches = PlanExecutor(snapshot, self.data_loader.get_partition_store()).execute(plan)
+        shape = getattr(self, f"_{plan.query_type}_results")
+        results = shape(plan, branches)
+        # The datasets the results come from, for the answer's source citations
+        results["data_sources"] = list(dict.fromkeys(branch.scan.dataset for branch in plan.branches
+                                                     if not branches[branch.name]["frame"].empty))
         return results
 
-    def _handle_ranking(self, data_sources: List[str], entities: Dict, metrics: List[str]) -> Dict:
-        """Handle ranking/top/highest/lowest queries"""
-        results = {"query_type": "ranking", "data": []}
-
-        if "crop" in data_sources:
-            crop_df = self.data_loader.get_crop_data()
-
-            # Exclude state total row
-            crop_df = crop_df[crop_df['District Name'] != 'State Total']
-
-            if "production" in metrics:
-                # Sort by total production
-                sorted_df = crop_df.sort_values('All Seasons_Production', ascending=False)
-                top_10 = sorted_df.head(10)
-
-                for _, row in top_10.iterrows():
-                    results["data"].append({
-                        "rank": len(results["data"]) + 1,
-                        "district": row['District Name'],
-                        "total_production": float(row['All Seasons_Production']),
-                        "total_yield": float(row['All Seasons_Yield']),
-                        "total_area": float(row['All Seasons_AreaAfter bund correction factor'])
-                    })
-
-            elif "yield" in metrics:
-                sorted_df = crop_df.sort_values('All Seasons_Yield', ascending=False)
-                top_10 = sorted_df.head(10)
-
-                for _, row in top_10.iterrows():
-                    results["data"].append({
-                        "rank": len(results["data"]) + 1,
-                        "district": row['District Name'],
-                        "total_yield": float(row['All Seasons_Yield']),
-                        "total_production": float(row['All Seasons_Production'])
-                    })
-
-        if "rainfall" in data_sources:
-            rainfall_df = self.data_loader.get_rainfall_data()
-
-            # Exclude state average
-            rainfall_df = rainfall_df[rainfall_df['District'] != 'State Average']
-
-            sorted_df = rainfall_df.sort_values('Total Actual Rainfall (June\'17 to May\'18) in mm', ascending=False)
-            top_10 = sorted_df.head(10)
+    def _comparison_results(self, plan: QueryPlan, branches: Dict[str, Dict]) -> Dict:
+        results = {"query_type": "comparison", "data": []}
+        districts = plan.params["districts"]
+        ambiguous, unmatched = [], []
+        for branch in plan.branches:
+            output = branches[branch.name]
+            lookup = output["scan"].lookup or {"ambiguous": [], "unmatched": []}
+            ambiguous += lookup["ambiguous"]
+            unmatched.append(set(lookup["unmatched"]))
+            results["data"] += self._entries(output["frame"], branch.steps[-1].fields)
+
+        # A name like "Bengaluru" matching both URBAN and RURAL is reported
+        # rather than silently picking one
+        if ambiguous:
+            results["ambiguous_districts"] = ambiguous
+        not_found = set.intersection(*unmatched) if unmatched else set()
+        if not_found:
+            results["unmatched_districts"] = [d for d in districts if d in not_found]
+        return results
 
-            for _, row in top_10.iterrows():
-                results["data"].append({
-                    "rank": len(results["data"]) + 1,
-                    "district": row['District'],
-                    "total_rainfall": float(row['Total Actual Rainfall (June\'17 to May\'18) in mm']),
-                    "normal_rainfall": float(row['Total Normal Rainfall (June\'17 to May\'18) in mm'])
-                })
+    def _ranking_results(self, plan: QueryPlan, branches: Dict[str, Dict]) -> Dict:
+        results = {"query_type": "ranking", "order": plan.params["order"], "data": []}
+        unmatched = []
+        for branch in plan.branches:
+            output = branches[branch.name]
+            results[f"{branch.name}_ranked_by"] = plan.params[f"{branch.name}_ranked_by"]
+            results["data"] += self._entries(output["frame"], branch.steps[-1].fields, ranked=True)
+            if output["scan"].lookup is not None:
+                unmatched.append(set(output["scan"].lookup["unmatched"]))
+        not_found = set.intersection(*unmatched) if unmatched else set()
+        if not_found:
+            results["unmatched_districts"] = [d for d in plan.params["districts"] if d in not_found]
+        return results
 
+    @staticmethod
+    def _entries(rows: pd.DataFrame, fields: Dict[str, str], ranked: bool = False) -> List[Dict]:
+        """Result entries for `rows`: district plus each output field read from its column"""
+        values = {name: rows[column].to_numpy(dtype=float) for name, column in fields.items()}
+        districts = rows["district"].astype(str).tolist()
+
+        entries = []
+        for i, district in enumerate(districts):
+            entry = {"rank": i + 1} if ranked else {}
+            entry["district"] = district
+            for name, column_values in values.items():
+                entry[name] = float(column_values[i])
+            entries.append(entry)
+        return entries
+
+    @staticmethod
+    def _parse_year_range(time_period: Any) -> Optional[Tuple[Optional[int], Optional[int]]]:
+        """'2010-2015' -> (2010, 2015), 'since 2012' -> (2012, None); None if no year is given"""
+        text = str(time_period or "").lower()
+        years = [int(y) for y in re.findall(r"\b(?:19|20)\d{2}\b", text)]
+        if not years:
+            return None
+        if len(years) >= 2:
+            return min(years), max(years)
+        if re.search(r"\b(since|after|from)\b", text):
+            return years[0], None
+        if re.search(r"\b(until|till|before|up to)\b", text):
+            return None, years[0]
+        return years[0], years[0]
+
+    def _trend_results(self, plan: QueryPlan, branches: Dict[str, Dict]) -> Dict:
+        results = {"query_type": "trend", "data": [], "years_available": {}}
+        if plan.params["year_range"]:
+            results["year_range"] = list(plan.params["year_range"])
+
+        for branch in plan.branches:
+            output = branches[branch.name]
+            aggregate = branch.steps[-1]
+            results["years_available"][branch.name] = output["scan"].years
+            results["data"] += self._trend_series(output["frame"], branch.name, aggregate.keys,
+                                                  aggregate.aggregations)
+
+        if all(len(entry["series"]) < 2 for entry in results["data"]):
+            results["message"] = ("Trend analysis needs at least two years of data for the selection; "
+                                  f"years available: {results['years_available']}.")
         return results
 
-    def _handle_trend(self, data_sources: List[str], entities: Dict, metrics: List[str]) -> Dict:
-        """Handle trend analysis queries"""
-        # Note: Current data is single time period, so trend analysis is limited
-        return {
-            "query_type": "trend",
-            "message": "Trend analysis requires multi-year data. Current dataset contains single time period.",
-            "data": []
-        }
+    @staticmethod
+    def _trend_series(table: pd.DataFrame, dataset: str, keys: List[str],
+                      aggregations: Dict[str, Tuple[str, Optional[str]]]) -> List[Dict]:
+        """One series per group (state, or state and district) and aggregated column, with year-on-year changes"""
+        if table.empty:
+            return []
+
+        by_district = "district_key" in keys
+        series = []
+        for group, rows in table.groupby(level=keys, sort=True, observed=True):
+            group = group if isinstance(group, tuple) else (group,)
+            years = rows.index.get_level_values("year")
+            district = rows[("label", "")].iloc[-1] if by_district else "All districts"
+            for column, (aggregation, _) in aggregations.items():
+                value, change, pct = (rows[(part, column)].to_numpy() for part in ("value", "change", "pct_change"))
+                series.append({
+                    "dataset": dataset,
+                    "metric": column,
+                    "aggregation": aggregation,
+                    "state": group[0],
+                    "district": district,
+                    "series": [
+                        {
+                            "year": int(year),
+                            "value": None if pd.isna(value[i]) else float(value[i]),
+                            "change": None if pd.isna(change[i]) else float(change[i]),
+                            "pct_change": None if pd.isna(pct[i]) else float(pct[i])
+                        }
+                        for i, year in enumerate(years)
+                    ]
+                })
+        return series
 
-    def _handle_correlation(self, data_sources: List[str], entities: Dict, metrics: List[str]) -> Dict:
+    def _handle_correlation(self, snapshot: DataSnapshot, data_sources: List[str], entities: Dict,
+                            metrics: List[str], year_range: Tuple[Optional[int], Optional[int]] = None) -> Dict:
         """Handle correlation queries between crop and rainfall data"""
-        results = {"query_type": "correlation", "data": [], "message": ""}
-
-        # Note: Crop data is from Karnataka, rainfall data is from Tamil Nadu
-        # Cannot directly correlate unless we have matching geographic data
-
-        results["message"] = "Direct correlation not possible: Crop data is from Karnataka districts, rainfall data is from Tamil Nadu districts. Need matching geographic data for correlation analysis."
-
+        results = {"query_type": "correlation", "data": [], "data_sources": ["crop", "rainfall"]}
+        metric = next((m for m in metrics if m in ("production", "yield", "area")), "yield")
+        rainfall_kind = "normal" if "normal" in metrics else "actual"
+
+        # Headline (whole year) plus every season pairing, and last year's
+        # rainfall against this year's crop
+        correlation = self.correlation_engine.correlate(
+            [f"{season}_{metric}" for season in CROP_SEASON_CODES],
+            [f"{season}_{rainfall_kind}" for season in RAINFALL_SEASON_CODES],
+            lags=(0, 1),
+            states=entities.get("states", []),
+            year_range=year_range
+        )
+        pairs = correlation["pairs"]
+        results["observations"] = correlation["observations"]
+
+        if not pairs:
+            coverage = self.correlation_engine.coverage()
+            results["message"] = (
+                "Correlation needs districts present in both datasets. "
+                f"Crop data covers {', '.join(coverage.get('crop', [])) or 'no states'}; "
+                f"rainfall data covers {', '.join(coverage.get('rainfall', [])) or 'no states'}."
+            )
+            return results
+
+        headline = f"total_{metric}", f"total_{rainfall_kind}"
+        results["overall"] = next(
+            (p for p in pairs if (p["crop_metric"], p["rainfall_metric"]) == headline and p["lag_years"] == 0), None)
+        results["data"] = sorted(pairs, key=lambda p: abs(p["pearson"]), reverse=True)
         return results
 
-    def _handle_general_query(self, data_sources: List[str], entities: Dict, metrics: List[str]) -> Dict:
+    def _handle_general_query(self, snapshot: DataSnapshot, data_sources: List[str], entities: Dict,
+                              metrics: List[str]) -> Dict:
         """Handle general queries - provide summary statistics"""
         results = {"query_type": "general", "data": {}}
+        view = snapshot.view
 
         if "crop" in data_sources:
-            crop_df = self.data_loader.get_crop_data()
-            crop_df = crop_df[crop_df['District Name'] != 'State Total']
-
-            results["data"]["crop_summary"] = {
-                "total_districts": len(crop_df),
-                "total_production": float(crop_df['All Seasons_Production'].sum()),
-                "avg_yield": float(crop_df['All Seasons_Yield'].mean()),
-                "total_area": float(crop_df['All Seasons_AreaAfter bund correction factor'].sum()),
-                "top_district": crop_df.loc[crop_df['All Seasons_Production'].idxmax(), 'District Name'],
-                "top_production": float(crop_df['All Seasons_Production'].max())
-            }
+            results["data"]["crop_summary"] = dict(view.crop_summary)
 
         if "rainfall" in data_sources:
-            rainfall_df = self.data_loader.get_rainfall_data()
-            rainfall_df = rainfall_df[rainfall_df['District'] != 'State Average']
-
-            results["data"]["rainfall_summary"] = {
-                "total_districts": len(rainfall_df),
-                "avg_rainfall": float(rainfall_df['Total Actual Rainfall (June\'17 to May\'18) in mm'].mean()),
-                "max_rainfall": float(rainfall_df['Total Actual Rainfall (June\'17 to May\'18) in mm'].max()),
-                "min_rainfall": float(rainfall_df['Total Actual Rainfall (June\'17 to May\'18) in mm'].min()),
-                "highest_rainfall_district": rainfall_df.loc[rainfall_df['Total Actual Rainfall (June\'17 to May\'18) in mm'].idxmax(), 'District']
-            }
+            results["data"]["rainfall_summary"] = dict(view.rainfall_summary)
 
+        results["data_sources"] = [dataset for dataset in ("crop", "rainfall") if dataset in data_sources]
         return results
@@ -0,0 +1,110 @@
+import json
+from typing import Dict, Any, List, Optional, Tuple
+from template_renderer import ANSWER_MODES
+
+
+class RequestError(Exception):
+    def __init__(self, message: str, status: int = 400):
+        """Invalid /query request body; maps onto the API error response"""
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+    def to_response(self) -> Dict[str, Any]:
+        return {"success": False, "error": self.message}
+
+
+# Parsing of the /query, /query/batch and /query/stream request bodies,
+# shared by the Flask app and the ASGI app
+
+def query_text(data: Optional[Dict[str, Any]]) -> str:
+    """The 'query' field of a request payload"""
+    if not data or 'query' not in data:
+        raise RequestError("Missing 'query' field in request body")
+
+    user_query = data['query']
+
+    if not user_query or len(user_query.strip()) == 0:
+        raise RequestError("Query cannot be empty")
+
+    return user_query
+
+
+def answer_mode(data: Optional[Dict[str, Any]]) -> Optional[str]:
+    """The optional 'mode' field (None: the default mode)"""
+    mode = (data or {}).get('mode')
+    if mode is None:
+        return None
+    if not isinstance(mode, str) or mode.lower() not in ANSWER_MODES:
+        raise RequestError(f"'mode' must be one of: {', '.join(ANSWER_MODES)}")
+    return mode.lower()
+
+
+def raw_data_option(data: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """
+    The optional 'raw_data' ("full" or "omit"), 'raw_data_offset' and
+    'raw_data_limit' fields; None when raw_data is sent in full
+    """
+    data = data or {}
+    raw_data = data.get('raw_data', 'full')
+    if raw_data is False or str(raw_data).lower() in ('omit', 'false', 'none'):
+        return {"omit": True}
+    if raw_data is not True and str(raw_data).lower() not in ('full', 'true'):
+        raise RequestError("'raw_data' must be 'full' or 'omit'")
+    if data.get('raw_data_offset') is None and data.get('raw_data_limit') is None:
+        return None
+    try:
+        offset = int(data.get('raw_data_offset') or 0)
+        limit = int(data['raw_data_limit']) if data.get('raw_data_limit') is not None else None
+    except (TypeError, ValueError):
+        offset, limit = -1, None
+    if offset < 0 or (limit is not None and limit < 0):
+        raise RequestError("'raw_data_offset' and 'raw_data_limit' must be non-negative integers")
+    return {"omit": False, "offset": offset, "limit": limit}
+
+
+def batch_queries(data: Optional[Dict[str, Any]], max_queries: int, default_concurrency: int,
+                  max_concurrency: int) -> Tuple[List[Any], int]:
+    """The 'queries' list and the 'concurrency' (capped by max_concurrency) of a batch request"""
+    if not data or not isinstance(data.get('queries'), list):
+        raise RequestError("Missing 'queries' list in request body")
+
+    queries = data['queries']
+
+    if len(queries) > max_queries:
+        raise RequestError(f"Too many queries: {len(queries)} (maximum {max_queries})")
+
+    try:
+        concurrency = int(data.get('concurrency', default_concurrency))
+    except (TypeError, ValueError):
+        raise RequestError("'concurrency' must be an integer")
+    return queries, max(1, min(concurrency, max_concurrency))
+
+
+def shape_raw_data(raw_data: Optional[Dict[str, Any]], option: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """
+    raw_data as requested: unchanged, omitted (None) or one page of its
+    "data" rows. Pages are copies: results are shared with logs and with
+    coalesced requests.
+    """
+    if option is None or raw_data is None:
+        return raw_data
+    if option["omit"]:
+        return None
+    rows = raw_data.get("data")
+    if not isinstance(rows, list):
+        return raw_data
+    offset, limit = option["offset"], option["limit"]
+    page = rows[offset:] if limit is None else rows[offset:offset + limit]
+    return dict(raw_data, data=page, data_page={"offset": offset, "limit": limit, "total": len(rows)})
+
+
+def with_raw_data(answer: Dict[str, Any], option: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    if option is None or "raw_data" not in answer:
+        return answer
+    return dict(answer, raw_data=shape_raw_data(answer["raw_data"], option))
+
+
+def sse(event: str, payload: Any) -> str:
+    """Format one Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
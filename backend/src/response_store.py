@@ -0,0 +1,177 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Any, Optional
+
+from structured_log import logger
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    value TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    expires REAL NOT NULL,
+    accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed);
+"""
+
+# A hit refreshes its entry's recency at most this often, to keep reads cheap
+TOUCH_INTERVAL = 60.0
+
+
+def prompt_version(*templates: str) -> str:
+    """A short digest of the prompts a response depends on; editing them starts a fresh key space"""
+    return hashlib.sha1("\x1f".join(templates).encode()).hexdigest()[:12]
+
+
+class ResponseStore:
+    def __init__(self, path: str, max_bytes: int = 64 * 1024 * 1024, ttl_seconds: float = 7 * 86400,
+                 evict_every: int = 64, timeout: float = 2.0):
+        """
+        LLM analyses and answers persisted in a local SQLite database in WAL
+        mode, so they survive restarts and deploys and are shared by every
+        worker process on the host. Readers never block writers; each thread
+        (and each forked worker) opens its own connection.
+
+        Callers build keys with key(kind, ...) from the normalized query, the
+        data version and the model/prompt version. Entries expire after
+        ttl_seconds. Every evict_every writes, expired entries are deleted
+        and, while the values exceed max_bytes, the least recently used.
+
+        The store is only a cache: database errors are logged and counted,
+        and treated as misses.
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.evict_every = evict_every
+        self.timeout = timeout
+
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._writes_since_evict = 0
+        self.stats = {"hits": 0, "misses": 0, "expired": 0, "writes": 0, "evictions": 0, "errors": 0}
+        self._kinds: Dict[str, Dict[str, int]] = {}
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._connection()
+
+    @staticmethod
+    def key(kind: str, *parts: Any) -> str:
+        return hashlib.sha256(json.dumps([kind, *parts], default=str).encode()).hexdigest()
+
+    def _connection(self) -> sqlite3.Connection:
+        """This thread's connection, reopened in a forked child"""
+        connection = getattr(self._local, "connection", None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.executescript(SCHEMA)
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def _count(self, event: str, kind: str = None):
+        with self._lock:
+            self.stats[event] += 1
+            if kind is not None:
+                counts = self._kinds.setdefault(kind, {"hits": 0, "misses": 0, "writes": 0})
+                if event in counts:
+                    counts[event] += 1
+
+    def _failed(self, operation: str, error: sqlite3.Error):
+        self._count("errors")
+        logger.warning("response_store_error", operation=operation, error=str(error))
+
+    def get(self, kind: str, key: str) -> Optional[Any]:
+        """The stored value for `key`, or None if missing or expired"""
+        now = time.time()
+        try:
+            connection = self._connection()
+            row = connection.execute("SELECT value, expires, accessed FROM responses WHERE key = ?",
+                                     (key,)).fetchone()
+            if row is not None and row[1] <= now:
+                connection.execute("DELETE FROM responses WHERE key = ? AND expires <= ?", (key, now))
+                self._count("expired")
+                row = None
+            if row is None:
+                self._count("misses", kind)
+                return None
+            if now - row[2] > TOUCH_INTERVAL:
+                connection.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+        except sqlite3.Error as e:
+            self._failed("get", e)
+            return None
+        self._count("hits", kind)
+        return json.loads(row[0])
+
+    def put(self, kind: str, key: str, value: Any):
+        now = time.time()
+        data = json.dumps(value, separators=(",", ":"), default=str)
+        try:
+            self._connection().execute(
+                "INSERT OR REPLACE INTO responses (key, kind, value, size, expires, accessed) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, kind, data, len(data), now + self.ttl_seconds, now)
+            )
+        except sqlite3.Error as e:
+            self._failed("put", e)
+            return
+        self._count("writes", kind)
+
+        with self._lock:
+            self._writes_since_evict += 1
+            evict = self._writes_since_evict >= self.evict_every
+            if evict:
+                self._writes_since_evict = 0
+        if evict:
+            self.evict()
+
+    def evict(self) -> int:
+        """Delete expired entries, then the least recently used beyond max_bytes; returns how many"""
+        try:
+            connection = self._connection()
+            removed = connection.execute("DELETE FROM responses WHERE expires <= ?", (time.time(),)).rowcount
+            total = connection.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            if total > self.max_bytes:
+                # Free down to 90% so eviction does not run on every later write
+                excess, victims = total - int(self.max_bytes * 0.9), []
+                for key, size in connection.execute("SELECT key, size FROM responses ORDER BY accessed"):
+                    if excess <= 0:
+                        break
+                    victims.append((key,))
+                    excess -= size
+                connection.executemany("DELETE FROM responses WHERE key = ?", victims)
+                removed += len(victims)
+        except sqlite3.Error as e:
+            self._failed("evict", e)
+            return 0
+        with self._lock:
+            self.stats["evictions"] += removed
+        return removed
+
+    def clear(self):
+        try:
+            self._connection().execute("DELETE FROM responses")
+        except sqlite3.Error as e:
+            self._failed("clear", e)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self.stats, kinds={kind: dict(counts) for kind, counts in self._kinds.items()})
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        try:
+            entries, size = self._connection().execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+            stats.update(entries=entries, bytes=size)
+        except sqlite3.Error as e:
+            self._failed("stats", e)
+        stats.update(path=self.path, max_bytes=self.max_bytes, ttl_seconds=self.ttl_seconds)
+        return stats
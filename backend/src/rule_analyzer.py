@@ -0,0 +1,214 @@
+import re
+from typing import Dict, Any, List
+from data_loader import DataLoader
+
+# Intent keywords, checked in order of specificity. Open-ended intents
+# (trend, correlation, recommendation) are recognised only so that we can
+# lower our confidence and hand them over to the LLM. Keywords match whole
+# words; a trailing "*" allows any suffix.
+INTENT_KEYWORDS = {
+    "correlation": ["correlat*", "relationship", "relation between", "impact", "affect*", "effect of", "depend*"],
+    "trend": ["trend*", "over the years", "over time", "year on year", "yoy", "growth", "historical*", "declin*"],
+    "recommendation": ["recommend*", "suggest*", "should", "advise", "best crop"],
+    "comparison": ["compar*", "vs", "versus", "difference between", "between", "or"],
+    "ranking": ["top", "highest", "lowest", "rank*", "most", "least", "best", "worst", "maximum", "minimum",
+                "bottom", "largest", "smallest", "max", "min"],
+    "general": ["average", "mean", "total", "summary", "overall", "how much", "what is", "data for", "pattern*"],
+}
+
+OPEN_ENDED_INTENTS = {"correlation", "trend", "recommendation"}
+
+METRIC_KEYWORDS = {
+    "production": ["production", "produce*", "output", "tonnes"],
+    "yield": ["yield*", "productivity"],
+    "area": ["area", "cultivat*", "hectare*", "acreage", "sown"],
+    "rainfall": ["rainfall", "rain*", "monsoon*", "precipitation", "wettest", "driest"],
+}
+
+CROP_SOURCE_KEYWORDS = ["crop*", "production", "yield*", "area", "cultivat*", "harvest*", "farming",
+                        "agricultur*", "kharif", "rabi", "karnataka"]
+RAINFALL_SOURCE_KEYWORDS = ["rainfall", "rain*", "monsoon*", "precipitation", "winter", "hot weather",
+                            "tamil nadu", "wettest", "driest"]
+
+SEASON_KEYWORDS = {
+    "Kharif": ["kharif"],
+    "Rabi": ["rabi"],
+    "Summer": ["summer"],
+    "South West Monsoon": ["south west monsoon", "southwest monsoon", "sw monsoon"],
+    "North East Monsoon": ["north east monsoon", "northeast monsoon", "ne monsoon"],
+    "Winter": ["winter"],
+    "Hot Weather": ["hot weather"],
+}
+
+STATE_KEYWORDS = {
+    "Karnataka": ["karnataka"],
+    "Tamil Nadu": ["tamil nadu", "tamilnadu"],
+}
+
+# Individual crops are not broken out in our datasets, so a query naming one
+# needs the LLM to explain the limitation rather than a canned lookup.
+CROP_NAMES = ["rice", "paddy", "wheat", "maize", "ragi", "jowar", "bajra", "sugarcane", "cotton",
+              "groundnut", "pulses", "millet", "coffee", "coconut", "banana", "tur", "gram"]
+
+# Words that commonly follow "in"/"for"/"between" without being a place name.
+VOCABULARY = {
+    "the", "a", "an", "all", "each", "every", "district", "districts", "state", "states", "terms",
+    "karnataka", "tamil", "nadu", "tamilnadu", "india", "total", "crop", "crops", "rainfall", "rain",
+    "production", "yield", "area", "season", "seasons", "kharif", "rabi", "summer", "winter", "monsoon",
+    "hot", "weather", "2017", "2018", "this", "that", "which", "what", "my", "our", "their", "its",
+    "cultivation", "data", "mm", "hectares", "tonnes", "average", "order", "descending", "ascending",
+}
+
+ENTITY_PREFIXES = {"in", "for", "of", "between", "and", "vs", "versus", "or", "from"}
+
+
+def normalize_text(text: str) -> str:
+    """Lowercase and collapse punctuation/whitespace into single spaces"""
+    return " ".join(re.sub(r"[^a-z0-9]+", " ", text.lower()).split())
+
+
+def _keyword_pattern(keywords: List[str]) -> re.Pattern:
+    parts = []
+    for keyword in keywords:
+        if keyword.endswith("*"):
+            parts.append(r"\b" + re.escape(keyword[:-1]))
+        else:
+            parts.append(r"\b" + re.escape(keyword) + r"\b")
+    return re.compile("|".join(parts))
+
+
+INTENT_PATTERNS = {intent: _keyword_pattern(keywords) for intent, keywords in INTENT_KEYWORDS.items()}
+METRIC_PATTERNS = {metric: _keyword_pattern(keywords) for metric, keywords in METRIC_KEYWORDS.items()}
+SEASON_PATTERNS = {season: _keyword_pattern(keywords) for season, keywords in SEASON_KEYWORDS.items()}
+STATE_PATTERNS = {state: _keyword_pattern(keywords) for state, keywords in STATE_KEYWORDS.items()}
+CROP_SOURCE_PATTERN = _keyword_pattern(CROP_SOURCE_KEYWORDS)
+RAINFALL_SOURCE_PATTERN = _keyword_pattern(RAINFALL_SOURCE_KEYWORDS)
+CROP_NAME_PATTERN = _keyword_pattern(CROP_NAMES)
+ASCENDING_PATTERN = _keyword_pattern(["lowest", "least", "minimum", "min", "smallest", "bottom", "worst",
+                                      "driest", "fewest", "ascending"])
+LIMIT_PATTERN = re.compile(r"\b(?:top|bottom|first|last|best|worst)\s+(\d+)\b|\b(\d+)\s+(?:districts?|highest|lowest)\b")
+
+
+class RuleBasedAnalyzer:
+    def __init__(self, data_loader: DataLoader, min_confidence: float = 0.75):
+        """
+        Deterministic keyword/grammar analyzer that answers common queries
+        without an LLM round-trip. Produces the same structure as
+        QueryAnalyzer.analyze_query plus a confidence score.
+        """
+        self.data_loader = data_loader
+        self.min_confidence = min_confidence
+
+    def analyze(self, query: str) -> Dict[str, Any]:
+        """
+        Analyze a query with keyword rules. Returns the query_analysis dict
+        with an extra "confidence" field in [0, 1].
+        """
+        text = normalize_text(query)
+        tokens = text.split()
+
+        crop_districts, crop_consumed = self.data_loader.get_crop_index().find_in_text(tokens)
+        rainfall_districts, rainfall_consumed = self.data_loader.get_rainfall_index().find_in_text(tokens)
+        consumed = crop_consumed | rainfall_consumed
+
+        intent = next((name for name, pattern in INTENT_PATTERNS.items() if pattern.search(text)), None)
+        metrics = [metric for metric, pattern in METRIC_PATTERNS.items() if pattern.search(text)]
+        seasons = [season for season, pattern in SEASON_PATTERNS.items() if pattern.search(text)]
+        states = [state for state, pattern in STATE_PATTERNS.items() if pattern.search(text)]
+
+        data_sources = []
+        if crop_districts or CROP_SOURCE_PATTERN.search(text):
+            data_sources.append("crop")
+        if rainfall_districts or RAINFALL_SOURCE_PATTERN.search(text):
+            data_sources.append("rainfall")
+        if "crop" in data_sources and not any(m in metrics for m in ("production", "yield", "area")):
+            metrics.insert(0, "production")
+        if "rainfall" in data_sources and "rainfall" not in metrics:
+            metrics.append("rainfall")
+
+        districts = crop_districts + [d for d in rainfall_districts if d not in crop_districts]
+
+        # A question about specific districts that is not a ranking is a lookup,
+        # which the comparison handler serves district by district.
+        if districts and intent in (None, "general"):
+            intent = "comparison"
+        if intent == "ranking" and len(districts) >= 2:
+            intent = "comparison"
+
+        confidence = 0.0
+        if intent:
+            confidence += 0.4
+        if data_sources:
+            confidence += 0.3
+        if metrics:
+            confidence += 0.1
+        if intent == "comparison" and districts:
+            confidence += 0.2
+        elif intent in ("ranking", "general") and not districts:
+            confidence += 0.2
+
+        if intent in OPEN_ENDED_INTENTS:
+            confidence -= 0.5
+        if intent == "comparison" and not districts:
+            confidence -= 0.4
+        if len(data_sources) > 1 and intent != "general":
+            confidence -= 0.2
+        if CROP_NAME_PATTERN.search(text):
+            confidence -= 0.4
+        if "which season" in text or "what season" in text:
+            confidence -= 0.4
+        if self._has_unknown_entity(tokens, consumed):
+            confidence -= 0.4
+        if tokens and tokens[0] in ("why", "explain", "how") and "how much" not in text:
+            confidence -= 0.3
+
+        order = "asc" if ASCENDING_PATTERN.search(text) else "desc"
+        limit_match = LIMIT_PATTERN.search(text)
+        limit = int(limit_match.group(1) or limit_match.group(2)) if limit_match else 10
+
+        query_type = intent if intent in ("comparison", "ranking", "trend", "correlation", "recommendation") else "general"
+
+        return {
+            "query_type": query_type,
+            "data_sources": data_sources,
+            "entities": {
+                "districts": districts,
+                "states": states,
+                "crops": [],
+                "seasons": seasons
+            },
+            "metrics": metrics,
+            "time_period": "all available",
+            "order": order,
+            "limit": limit,
+            "analysis_type": self._describe(query_type, metrics, districts),
+            "confidence": round(max(0.0, min(1.0, confidence)), 2)
+        }
+
+    def _has_unknown_entity(self, tokens: List[str], consumed: set) -> bool:
+        """Detect a place-like word after 'in'/'for'/'vs' that we could not resolve"""
+        for i, token in enumerate(tokens[:-1]):
+            if token not in ENTITY_PREFIXES:
+                continue
+            nxt = i + 1
+            if nxt in consumed:
+                continue
+            word = tokens[nxt]
+            if word in VOCABULARY or word in ENTITY_PREFIXES or word.isdigit():
+                continue
+            if any(pattern.match(word) for pattern in METRIC_PATTERNS.values()):
+                continue
+            return True
+        return False
+
+    @staticmethod
+    def _describe(query_type: str, metrics: List[str], districts: List[str]) -> str:
+        metric_text = ", ".join(metrics) if metrics else "available metrics"
+        if query_type == "comparison":
+            return f"Compare {metric_text} for {', '.join(districts)}"
+        if query_type == "ranking":
+            return f"Rank districts by {metric_text}"
+        return f"Summarize {metric_text}"
+
+    def is_confident(self, analysis: Dict[str, Any]) -> bool:
+        return analysis.get("confidence", 0.0) >= self.min_confidence
@@ -0,0 +1,141 @@
+import re
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+from district_index import normalize_name, AGGREGATE_ROW_NAMES
+
+# Canonical, year-agnostic column names for each dataset. Source CSVs embed
+# the period in their headers ("... (June'17 to May'18) in mm"), so headers
+# are matched by pattern rather than by exact name.
+
+CROP_SEASONS = {"Kharif": "kharif", "Rabi": "rabi", "Summer": "summer", "All Seasons": "total"}
+
+RAINFALL_SEASONS = {
+    "South West Monsoon": "sw_monsoon",
+    "North East Monsoon": "ne_monsoon",
+    "Winter Season": "winter",
+    "Hot Weather Season": "hot_weather",
+}
+
+# Season names used in query analyses -> canonical column prefix
+SEASON_CODES = {
+    "Kharif": "kharif",
+    "Rabi": "rabi",
+    "Summer": "summer",
+    "South West Monsoon": "sw_monsoon",
+    "North East Monsoon": "ne_monsoon",
+    "Winter": "winter",
+    "Hot Weather": "hot_weather",
+}
+
+_CROP_PATTERNS = [
+    (re.compile(r"^(SlNo|S\.?\s*No\.?)$", re.I), lambda m: "sl_no"),
+    (re.compile(r"^District(\s+Name)?$", re.I), lambda m: "district"),
+    (re.compile(r"^(Kharif|Rabi|Summer|All Seasons)_AreaBefore bund correction factor$", re.I),
+     lambda m: f"{CROP_SEASONS[m.group(1).title()]}_area_raw"),
+    (re.compile(r"^(Kharif|Rabi|Summer|All Seasons)_AreaAfter bund correction factor$", re.I),
+     lambda m: f"{CROP_SEASONS[m.group(1).title()]}_area"),
+    (re.compile(r"^(Kharif|Rabi|Summer|All Seasons)_Yield$", re.I),
+     lambda m: f"{CROP_SEASONS[m.group(1).title()]}_yield"),
+    (re.compile(r"^(Kharif|Rabi|Summer|All Seasons)_Production$", re.I),
+     lambda m: f"{CROP_SEASONS[m.group(1).title()]}_production"),
+]
+
+_RAINFALL_PATTERNS = [
+    (re.compile(r"^(SlNo|S\.?\s*No\.?)$", re.I), lambda m: "sl_no"),
+    (re.compile(r"^District(\s+Name)?$", re.I), lambda m: "district"),
+    (re.compile(r"^(Actual|Normal) Rainfall in (South West Monsoon|North East Monsoon|Winter Season|Hot Weather Season)\b",
+                re.I),
+     lambda m: f"{RAINFALL_SEASONS[m.group(2).title()]}_{m.group(1).lower()}"),
+    (re.compile(r"^Total (Actual|Normal) Rainfall\b", re.I), lambda m: f"total_{m.group(1).lower()}"),
+]
+
+SCHEMAS = {"crop": _CROP_PATTERNS, "rainfall": _RAINFALL_PATTERNS}
+
+
+def canonical_columns(dataset: str, columns: List[str]) -> Dict[str, str]:
+    """
+    Map source column names to canonical names for a dataset.
+    Columns that match no pattern are left out of the mapping.
+    """
+    mapping = {}
+    for column in columns:
+        name = str(column).strip()
+        for pattern, rename in SCHEMAS[dataset]:
+            match = pattern.match(name)
+            if match:
+                mapping[column] = rename(match)
+                break
+    return mapping
+
+
+# Canonical columns no query reads; they are not kept in memory
+UNUSED_COLUMN_PATTERN = re.compile(r"^(sl_no|\w+_area_raw)$")
+
+
+def downcast(series: pd.Series) -> pd.Series:
+    """
+    The smallest dtype that holds every value exactly: whole numbers become
+    the narrowest integer type, other floats become float32 only if no value
+    changes (so 1021.2 stays float64 rather than turning into 1021.2000122)
+    """
+    if not pd.api.types.is_numeric_dtype(series) or pd.api.types.is_bool_dtype(series):
+        return series
+    values = series.to_numpy(dtype=float)
+    finite = values[~np.isnan(values)]
+    if len(finite) == len(values) and np.array_equal(finite, np.round(finite)):
+        return pd.to_numeric(series, downcast="integer") if pd.api.types.is_integer_dtype(series) \
+            else pd.to_numeric(series.astype(np.int64), downcast="integer")
+    narrow = values.astype(np.float32)
+    if np.array_equal(narrow.astype(float), values, equal_nan=True):
+        return pd.Series(narrow, index=series.index, name=series.name)
+    return series.astype(np.float64)
+
+
+def compact_frame(dataset: str, df: pd.DataFrame, state: Optional[str] = None, year: Optional[int] = None,
+                  keep_unused: bool = False) -> pd.DataFrame:
+    """
+    A source frame in the canonical schema: short column names, district
+    (and state, when given) as categoricals, numbers downcast, unused columns
+    and state total/average rows dropped. Raises ValueError for a
+    non-numeric metric column.
+    """
+    mapping = canonical_columns(dataset, list(df.columns))
+    if not keep_unused:
+        mapping = {source: name for source, name in mapping.items() if not UNUSED_COLUMN_PATTERN.match(name)}
+
+    columns = {}
+    for source, name in mapping.items():
+        series = df[source]
+        if name == "district":
+            columns[name] = series.where(series.isna(), series.astype(str).str.strip())
+            continue
+        if not pd.api.types.is_numeric_dtype(series):
+            raise ValueError(f"{dataset} column '{str(source).strip()}' is not numeric")
+        columns[name] = downcast(series)
+
+    frame = pd.DataFrame(columns, index=pd.RangeIndex(len(df)))
+    if "district" in frame.columns:
+        # State total/average rows are not districts. Only distinct names
+        # that mention "state" are normalized, not every row
+        district = frame["district"].astype("category")
+        categories = district.cat.categories
+        aggregate = np.zeros(len(categories), dtype=bool)
+        candidates = np.flatnonzero(categories.str.contains("state", case=False, regex=False))
+        aggregate[candidates] = [normalize_name(categories[i]) in AGGREGATE_ROW_NAMES for i in candidates]
+        codes = district.cat.codes.to_numpy()
+        keep = (codes < 0) | ~aggregate[np.maximum(codes, 0)]
+        frame = frame.assign(district=district)[keep].reset_index(drop=True)
+        frame["district"] = frame["district"].cat.remove_unused_categories()
+    if state is not None:
+        frame.insert(1, "state", pd.Categorical([state] * len(frame)))
+    if year is not None:
+        frame.insert(2 if state is not None else 1, "year", np.full(len(frame), year, dtype=np.int16))
+    return frame
+
+
+def memory_report(df: pd.DataFrame) -> Dict[str, Dict[str, object]]:
+    """Per-column dtype and bytes (including string payloads)"""
+    usage = df.memory_usage(deep=True, index=False)
+    return {str(column): {"dtype": str(df[column].dtype), "bytes": int(usage[column])} for column in df.columns}
@@ -0,0 +1,210 @@
+import json
+import os
+import sys
+import threading
+from multiprocessing import resource_tracker, shared_memory
+from typing import Dict, Any, List, Optional
+
+import numpy as np
+import pandas as pd
+
+# Set by the gunicorn master (see gunicorn.conf.py) to the manifest of its
+# exported block; workers inherit it on fork
+SHARED_DATA_ENV = "SAMARTH_SHARED_DATA"
+
+ALIGNMENT = 64
+
+# Attached blocks stay mapped for the life of the process: frames of an
+# older snapshot may still be in use by a request
+_attached: List["SharedData"] = []
+_attach_lock = threading.Lock()
+
+
+def _align(offset: int) -> int:
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+class _Layout:
+    """Arrays to copy into one block, with their aligned offsets"""
+
+    def __init__(self):
+        self.arrays = []
+        self.size = 0
+
+    def add(self, values: np.ndarray) -> Dict[str, Any]:
+        values = np.ascontiguousarray(values)
+        offset = _align(self.size)
+        self.arrays.append((offset, values))
+        self.size = offset + values.nbytes
+        return {"offset": offset, "dtype": values.dtype.str, "shape": list(values.shape)}
+
+
+def _column_spec(layout: _Layout, name: str, series: pd.Series) -> Dict[str, Any]:
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        categories = series.cat.categories
+        return {"name": name, "kind": "categorical", "values": layout.add(series.cat.codes.to_numpy()),
+                "categories": layout.add(np.asarray(categories.astype(str), dtype=str))}
+    if pd.api.types.is_numeric_dtype(series.dtype) and isinstance(series.dtype, np.dtype) \
+            and not pd.api.types.is_bool_dtype(series.dtype):
+        return {"name": name, "kind": "numeric", "values": layout.add(series.to_numpy())}
+    raise ValueError(f"column '{name}' ({series.dtype}) cannot be shared")
+
+
+def _open(name: str) -> shared_memory.SharedMemory:
+    """Attach to an existing block without taking ownership of it"""
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    # Before 3.13 attaching also registers the block with the resource
+    # tracker. A tracker inherited from the master already knows it; one
+    # started by this process would unlink the block when the process exits
+    own_tracker = getattr(resource_tracker._resource_tracker, "_fd", None) is None
+    block = shared_memory.SharedMemory(name=name)
+    if own_tracker:
+        resource_tracker.unregister(block._name, "shared_memory")
+    return block
+
+
+class SharedDataExport:
+    def __init__(self, snapshot):
+        """
+        The frames and sort orders of a data snapshot copied into one
+        shared memory block, owned by the process that made it (the
+        gunicorn master). `manifest` describes where each array lives;
+        workers pass it to SharedData.attach. Call unlink() once no new
+        worker should attach; workers already attached keep their mapping.
+        """
+        layout = _Layout()
+        frames = {}
+        for dataset, frame in (("crop", snapshot.crop_data), ("rainfall", snapshot.rainfall_data)):
+            frames[dataset] = {
+                "rows": len(frame),
+                "columns": [_column_spec(layout, str(name), frame[name]) for name in frame.columns]
+            }
+        orders = {
+            dataset: {column: {direction: layout.add(order) for direction, order in directions.items()}
+                      for column, directions in columns.items()}
+            for dataset, columns in snapshot.view.orders.items()
+        }
+
+        self.block = shared_memory.SharedMemory(create=True, size=max(layout.size, 1))
+        for offset, values in layout.arrays:
+            self.block.buf[offset:offset + values.nbytes] = values.tobytes()
+        self.version = snapshot.version
+        self.manifest = {
+            "name": self.block.name,
+            "size": layout.size,
+            "version": snapshot.version,
+            "memory": snapshot.memory,
+            "frames": frames,
+            "orders": orders
+        }
+
+    def manifest_json(self) -> str:
+        return json.dumps(self.manifest, separators=(",", ":"))
+
+    def unlink(self):
+        try:
+            self.block.close()
+            self.block.unlink()
+        except (FileNotFoundError, BufferError):
+            pass
+
+
+class SharedData:
+    def __init__(self, block: shared_memory.SharedMemory, manifest: Dict[str, Any]):
+        """
+        A worker's read-only, zero-copy view of an exported block: numeric
+        columns, categorical codes and sort orders are NumPy arrays over
+        the shared pages. Only category labels (district and state names)
+        are copied into the worker. Each column is checked to really be a
+        view of the block; any that pandas copied anyway are listed in
+        get_stats() with the bytes they take in this worker.
+        """
+        self.block = block
+        self.name = manifest["name"]
+        self.size = manifest["size"]
+        self.version = manifest["version"]
+        self.memory = manifest.get("memory", {})
+        self.copied: Dict[str, int] = {}
+        self.frames = {dataset: self._frame(dataset, spec) for dataset, spec in manifest["frames"].items()}
+        self.orders = {
+            dataset: {column: {direction: self._array(spec) for direction, spec in directions.items()}
+                      for column, directions in columns.items()}
+            for dataset, columns in manifest["orders"].items()
+        }
+
+    @classmethod
+    def attach(cls, manifest_json: str) -> "SharedData":
+        manifest = json.loads(manifest_json)
+        shared = cls(_open(manifest["name"]), manifest)
+        with _attach_lock:
+            _attached.append(shared)
+        return shared
+
+    @staticmethod
+    def manifest_version(manifest_json: Optional[str]) -> Optional[str]:
+        """The data version a manifest was exported for, without attaching"""
+        if not manifest_json:
+            return None
+        try:
+            return json.loads(manifest_json).get("version")
+        except ValueError:
+            return None
+
+    def _array(self, spec: Dict[str, Any]) -> np.ndarray:
+        values = np.ndarray(tuple(spec["shape"]), dtype=np.dtype(spec["dtype"]), buffer=self.block.buf,
+                            offset=spec["offset"])
+        values.flags.writeable = False
+        return values
+
+    def _frame(self, dataset: str, spec: Dict[str, Any]) -> pd.DataFrame:
+        columns, shared = {}, {}
+        for column in spec["columns"]:
+            values = shared[column["name"]] = self._array(column["values"])
+            if column["kind"] == "categorical":
+                categories = pd.Index(self._array(column["categories"]).astype(object))
+                # The codes are used as they are: they were written with the
+                # dtype pandas picks for this many categories
+                values = pd.Categorical.from_codes(values, dtype=pd.CategoricalDtype(categories))
+            columns[column["name"]] = values
+        # copy=False keeps every column a view of the block (no consolidation)
+        frame = pd.DataFrame(columns, index=pd.RangeIndex(spec["rows"]), copy=False)
+
+        for name, values in shared.items():
+            series = frame[name]
+            backing = series.array.codes if isinstance(series.dtype, pd.CategoricalDtype) else series.to_numpy()
+            if not np.shares_memory(backing, values):
+                self.copied[f"{dataset}.{name}"] = backing.nbytes
+        return frame
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {"name": self.name, "version": self.version, "bytes": self.size,
+                "copied_bytes": sum(self.copied.values()), "copied_columns": sorted(self.copied)}
+
+
+def process_memory() -> Dict[str, Any]:
+    """
+    Resident memory of this process. On Linux, private_bytes (anonymous
+    pages) is what each extra worker costs; shared_bytes counts file and
+    shared memory pages also mapped by the other workers.
+    """
+    fields = {}
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if key in ("VmRSS", "RssAnon", "RssFile", "RssShmem"):
+                    fields[key] = int(value.split()[0]) * 1024
+    except OSError:
+        pass
+    if "VmRSS" not in fields:
+        import resource
+        # Peak RSS only: kilobytes on Linux, bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return {"pid": os.getpid(), "max_rss_bytes": peak if sys.platform == "darwin" else peak * 1024}
+    return {
+        "pid": os.getpid(),
+        "rss_bytes": fields["VmRSS"],
+        "private_bytes": fields.get("RssAnon"),
+        "shared_bytes": fields.get("RssFile", 0) + fields.get("RssShmem", 0)
+    }
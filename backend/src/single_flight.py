@@ -0,0 +1,109 @@
+import asyncio
+import copy
+import threading
+from typing import Dict, Any, Awaitable, Callable, Hashable, Tuple
+
+
+class SingleFlightTimeout(Exception):
+    """Waited longer than the timeout for another caller's computation"""
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: BaseException = None
+
+
+class SingleFlight:
+    def __init__(self):
+        """
+        Coalesces concurrent calls with the same key into one computation.
+
+        The first caller for a key (the leader) runs the function; callers
+        arriving while it is in flight wait for it and get a copy of its
+        result, or its exception re-raised. Nothing is kept once the call
+        finishes, so this is not a cache: the next call computes afresh.
+
+        do_async() does the same for coroutines on the event loop; sync and
+        async callers of one key coalesce separately.
+        """
+        self._calls: Dict[Hashable, _Call] = {}
+        self._tasks: Dict[Hashable, asyncio.Future] = {}
+        self._lock = threading.Lock()
+        self.stats = {"leaders": 0, "followers": 0, "shared_errors": 0, "timeouts": 0}
+
+    def do(self, key: Hashable, fn: Callable[[], Any], timeout: float = None) -> Tuple[Any, bool]:
+        """
+        Return (result, shared): shared is True when the result came from
+        another caller's computation. A follower waits at most `timeout`
+        seconds and then raises SingleFlightTimeout; the leader is unaffected.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.stats["leaders"] += 1
+            else:
+                self.stats["followers"] += 1
+
+        if leader:
+            try:
+                call.result = fn()
+                return call.result, False
+            except BaseException as e:
+                call.error = e
+                raise
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call.done.set()
+
+        if not call.done.wait(timeout):
+            with self._lock:
+                self.stats["timeouts"] += 1
+            raise SingleFlightTimeout(f"Timed out after {timeout}s waiting for an identical request")
+        if call.error is not None:
+            with self._lock:
+                self.stats["shared_errors"] += 1
+            raise call.error
+        # Each caller gets its own copy, so nobody can mutate another's response
+        return copy.deepcopy(call.result), True
+
+    async def do_async(self, key: Hashable, fn: Callable[[], Awaitable[Any]],
+                       timeout: float = None) -> Tuple[Any, bool]:
+        """
+        do() for the event loop: the leader's coroutine runs as a task that
+        a cancelled caller does not cancel, as followers may still wait for it
+        """
+        task = self._tasks.get(key)
+        leader = task is None
+        with self._lock:
+            self.stats["leaders" if leader else "followers"] += 1
+        if leader:
+            task = self._tasks[key] = asyncio.ensure_future(fn())
+            task.add_done_callback(lambda done: self._forget(key, done))
+            return await asyncio.shield(task), False
+
+        try:
+            result = await asyncio.wait_for(asyncio.shield(task), timeout)
+        except asyncio.TimeoutError:
+            with self._lock:
+                self.stats["timeouts"] += 1
+            raise SingleFlightTimeout(f"Timed out after {timeout}s waiting for an identical request")
+        except Exception:
+            with self._lock:
+                self.stats["shared_errors"] += 1
+            raise
+        return copy.deepcopy(result), True
+
+    def _forget(self, key: Hashable, task: asyncio.Future):
+        self._tasks.pop(key, None)
+        # Retrieved here in case every caller was cancelled before it finished
+        if not task.cancelled():
+            task.exception()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self.stats, in_flight=len(self._calls) + len(self._tasks))
@@ -0,0 +1,163 @@
+import atexit
+import contextvars
+import json
+import queue
+import random
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Dict, Any, Iterator, Optional, TextIO
+
+from metrics import registry
+
+registry.counter("log_records_dropped_total", "Log records dropped because the log queue was full")
+
+LEVELS = {"debug": 10, "info": 20, "warning": 30, "error": 40}
+
+_request_id: contextvars.ContextVar = contextvars.ContextVar("samarth_request_id", default=None)
+
+
+def start_request(request_id: str = None) -> str:
+    """Set the id of the request being handled (a new one unless given) and return it"""
+    request_id = (request_id or "").strip()[:64] or uuid.uuid4().hex[:16]
+    _request_id.set(request_id)
+    return request_id
+
+
+def current_request_id() -> Optional[str]:
+    return _request_id.get()
+
+
+@contextmanager
+def request_context(request_id: Optional[str]) -> Iterator[None]:
+    """Log under `request_id` inside the block, e.g. in a worker thread serving that request"""
+    token = _request_id.set(request_id)
+    try:
+        yield
+    finally:
+        _request_id.reset(token)
+
+
+class StructuredLogger:
+    def __init__(self, stream: TextIO = None, level: str = "info", payload_sample_rate: float = 1.0,
+                 max_field_chars: int = 2000, queue_size: int = 10000):
+        """
+        JSON-lines logger that keeps formatting and I/O off the request path.
+
+        log() only checks the level and puts the record on a bounded queue; a
+        background thread serializes and writes it. When the queue is full
+        the record is dropped (and counted) rather than blocking the caller.
+
+        payload() is for large fields (query analyses, result sets): only a
+        payload_sample_rate fraction is logged, and each field is cut to
+        max_field_chars of JSON. The values are serialized later on the
+        writer thread, so they must not be mutated after logging.
+        """
+        self.stream = stream
+        self.level = LEVELS.get(level, LEVELS["info"])
+        self.payload_sample_rate = payload_sample_rate
+        self.max_field_chars = max_field_chars
+        self._queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._writer: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.stats = {"written": 0, "dropped": 0, "sampled_out": 0, "truncated_fields": 0}
+
+    def configure(self, level: str = None, payload_sample_rate: float = None, max_field_chars: int = None):
+        if level is not None:
+            self.level = LEVELS.get(level.lower(), LEVELS["info"])
+        if payload_sample_rate is not None:
+            self.payload_sample_rate = payload_sample_rate
+        if max_field_chars is not None:
+            self.max_field_chars = max_field_chars
+
+    def log(self, level: str, event: str, **fields):
+        if LEVELS.get(level, 0) < self.level:
+            return
+        record = {"ts": time.time(), "level": level, "event": event, "request_id": _request_id.get()}
+        self._enqueue((record, fields, False))
+
+    def debug(self, event: str, **fields):
+        self.log("debug", event, **fields)
+
+    def info(self, event: str, **fields):
+        self.log("info", event, **fields)
+
+    def warning(self, event: str, **fields):
+        self.log("warning", event, **fields)
+
+    def error(self, event: str, **fields):
+        self.log("error", event, **fields)
+
+    def payload(self, event: str, **fields):
+        """A sampled, size-capped info record for large values"""
+        if self.payload_sample_rate <= 0 or LEVELS["info"] < self.level:
+            return
+        if self.payload_sample_rate < 1 and random.random() >= self.payload_sample_rate:
+            with self._lock:
+                self.stats["sampled_out"] += 1
+            return
+        record = {"ts": time.time(), "level": "info", "event": event, "request_id": _request_id.get()}
+        self._enqueue((record, fields, True))
+
+    def _enqueue(self, item):
+        if self._writer is None:
+            self._start_writer()
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            with self._lock:
+                self.stats["dropped"] += 1
+            registry.inc("log_records_dropped_total")
+
+    def _start_writer(self):
+        with self._lock:
+            if self._writer is not None:
+                return
+            self._writer = threading.Thread(target=self._write_loop, name="structured-log", daemon=True)
+            self._writer.start()
+        atexit.register(self.flush)
+
+    def _capped(self, value: Any) -> Any:
+        text = json.dumps(value, default=str)
+        if len(text) <= self.max_field_chars:
+            return value
+        with self._lock:
+            self.stats["truncated_fields"] += 1
+        return {"truncated": True, "chars": len(text), "preview": text[:self.max_field_chars]}
+
+    def _format(self, item) -> str:
+        record, fields, capped = item
+        for key, value in fields.items():
+            record[key] = self._capped(value) if capped else value
+        return json.dumps(record, default=str)
+
+    def _write_loop(self):
+        while True:
+            item = self._queue.get()
+            try:
+                line = self._format(item)
+                stream = self.stream or sys.stdout
+                stream.write(line + "\n")
+                if self._queue.empty():
+                    stream.flush()
+                with self._lock:
+                    self.stats["written"] += 1
+            except Exception as e:
+                sys.stderr.write(f"structured log write failed: {e}\n")
+            finally:
+                self._queue.task_done()
+
+    def flush(self, timeout: float = 2.0):
+        """Wait (up to timeout seconds) for queued records to be written"""
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self.stats, queued=self._queue.qsize())
+
+
+logger = StructuredLogger()
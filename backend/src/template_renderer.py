@@ -0,0 +1,215 @@
+from typing import Dict, Any, List, Optional, Tuple
+
+ANSWER_MODES = ("auto", "fast", "llm")
+
+# Result shapes whose numbers are the whole answer; "auto" renders these
+# without the LLM and keeps it for open-ended analysis (trends, correlations)
+TEMPLATE_QUERY_TYPES = ("ranking", "comparison", "general")
+
+# Ranked-by column -> (entry key holding its value, label, unit)
+CROP_FIELDS = {
+    'total_production': ("total_production", "total production", "tonnes"),
+    'total_yield': ("total_yield", "yield", "kg/ha"),
+    'total_area': ("total_area", "cropped area", "ha"),
+}
+RAINFALL_FIELDS = {
+    'total_actual': ("total_rainfall", "total rainfall", "mm"),
+    'total_normal': ("normal_rainfall", "normal rainfall", "mm"),
+}
+SEASON_LABELS = {
+    "kharif": "Kharif", "rabi": "Rabi", "summer": "Summer", "total": "total",
+    "sw_monsoon": "south-west monsoon", "ne_monsoon": "north-east monsoon",
+    "winter": "winter", "hot_weather": "hot weather season",
+}
+UNITS = {"production": "tonnes", "yield": "kg/ha", "area": "ha", "actual": "mm", "normal": "mm", "pct": "%"}
+
+
+def _number(value: Any, decimals: int = 1) -> str:
+    if value is None:
+        return "n/a"
+    value = float(value)
+    if value.is_integer():
+        return f"{int(value):,}"
+    return f"{value:,.{decimals}f}"
+
+
+def _metric_label(metric: str) -> str:
+    """Canonical column name, e.g. 'kharif_production' -> 'Kharif production'"""
+    for code, label in SEASON_LABELS.items():
+        if metric.startswith(code + "_"):
+            return f"{label} {metric[len(code) + 1:].replace('_', ' ')}"
+    return metric.replace("_", " ")
+
+
+def _column_label(column: str) -> Tuple[str, str]:
+    """Label and unit for a canonical column, e.g. 'sw_monsoon_actual' -> ('south-west monsoon actual rainfall', 'mm')"""
+    if column in CROP_FIELDS:
+        return CROP_FIELDS[column][1:]
+    if column in RAINFALL_FIELDS:
+        return RAINFALL_FIELDS[column][1:]
+    if column == "total_departure_pct":
+        return "rainfall departure from normal", "%"
+    suffix = column.rsplit("_", 1)[-1]
+    label = _metric_label(column)
+    if suffix in ("actual", "normal"):
+        label += " rainfall"
+    return label, UNITS.get(suffix, "")
+
+
+class TemplateRenderer:
+    def __init__(self, max_rows: int = 10):
+        """
+        Deterministic answers for structured query results.
+
+        Ranking, comparison and summary results already hold the exact
+        numbers, so restating them needs no model: render() formats them in
+        microseconds. Tables longer than max_rows are cut, with a note.
+        """
+        self.max_rows = max_rows
+
+    def supports(self, query_results: Dict[str, Any]) -> bool:
+        return query_results.get("query_type", "general") in TEMPLATE_QUERY_TYPES + ("trend", "correlation")
+
+    def render(self, query: str, query_results: Dict[str, Any]) -> str:
+        query_type = query_results.get("query_type", "general")
+        renderer = getattr(self, f"_render_{query_type}", self._render_general)
+        lines = renderer(query_results)
+        if query_results.get("message"):
+            lines.append(query_results["message"])
+        return "\n".join(line for line in lines if line is not None).strip()
+
+    def _truncated(self, total: int) -> Optional[str]:
+        if total > self.max_rows:
+            return f"...and {total - self.max_rows} more (see raw_data)."
+        return None
+
+    def _render_ranking(self, results: Dict[str, Any]) -> List[str]:
+        order = "lowest" if results.get("order") == "asc" else "highest"
+        crop = [e for e in results.get("data", []) if "total_production" in e]
+        rainfall = [e for e in results.get("data", []) if "total_rainfall" in e]
+        lines = []
+
+        for entries, column, fields in ((crop, results.get("crop_ranked_by"), CROP_FIELDS),
+                                        (rainfall, results.get("rainfall_ranked_by"), RAINFALL_FIELDS)):
+            if not entries or not column:
+                continue
+            key = fields[column][0] if column in fields else column
+            label, unit = _column_label(column)
+            first = entries[0]
+            if lines:
+                lines.append("")
+            lines.append(f"{first['district']} has the {order} {label}: {_number(first.get(key))} {unit}.")
+            if len(entries) > 1:
+                lines.append(f"Districts ranked by {label} ({order} first):")
+                for entry in entries[:self.max_rows]:
+                    lines.append(f"{entry['rank']}. {entry['district']}: {_number(entry.get(key))} {unit}")
+                lines.append(self._truncated(len(entries)))
+
+        if not lines:
+            lines.append("No districts matched the ranking criteria.")
+        return lines
+
+    def _render_comparison(self, results: Dict[str, Any]) -> List[str]:
+        lines = []
+        rainfall = [e for e in results.get("data", []) if "total_actual_rainfall" in e]
+        crop = [e for e in results.get("data", []) if "total_production" in e]
+
+        if rainfall:
+            lines.append("Rainfall, June 2017 to May 2018:")
+            for entry in rainfall:
+                actual, normal = entry.get("total_actual_rainfall"), entry.get("total_normal_rainfall")
+                departure = ""
+                if actual is not None and normal:
+                    departure = f", {(actual - normal) / normal * 100:+.1f}% vs normal"
+                lines.append(
+                    f"- {entry['district']}: {_number(actual)} mm (normal {_number(normal)} mm{departure}); "
+                    f"south-west monsoon {_number(entry.get('southwest_monsoon'))} mm, "
+                    f"north-east monsoon {_number(entry.get('northeast_monsoon'))} mm"
+                )
+            if len(rainfall) > 1:
+                wettest = max(rainfall, key=lambda e: e.get("total_actual_rainfall") or 0)
+                lines.append(f"{wettest['district']} received the most rainfall.")
+
+        if crop:
+            if lines:
+                lines.append("")
+            lines.append("Crop production, all seasons:")
+            for entry in crop:
+                lines.append(
+                    f"- {entry['district']}: {_number(entry.get('total_production'))} tonnes from "
+                    f"{_number(entry.get('total_area'))} ha (yield {_number(entry.get('total_yield'))} kg/ha); "
+                    f"Kharif {_number(entry.get('kharif_production'))}, Rabi {_number(entry.get('rabi_production'))}, "
+                    f"Summer {_number(entry.get('summer_production'))} tonnes"
+                )
+            if len(crop) > 1:
+                top = max(crop, key=lambda e: e.get("total_production") or 0)
+                lines.append(f"{top['district']} has the highest production.")
+
+        if not lines:
+            lines.append("None of the requested districts were found in the data.")
+        if results.get("ambiguous_districts"):
+            for item in results["ambiguous_districts"]:
+                lines.append(f"\"{item['query']}\" matches several districts: {', '.join(item['candidates'])}.")
+        if results.get("unmatched_districts"):
+            lines.append(f"Not found in the data: {', '.join(results['unmatched_districts'])}.")
+        return lines
+
+    def _render_general(self, results: Dict[str, Any]) -> List[str]:
+        data = results.get("data") or {}
+        lines = []
+        crop = data.get("crop_summary") if isinstance(data, dict) else None
+        rainfall = data.get("rainfall_summary") if isinstance(data, dict) else None
+
+        if crop:
+            lines.append(
+                f"Crop data covers {crop['total_districts']} districts with a total production of "
+                f"{_number(crop['total_production'])} tonnes from {_number(crop['total_area'])} ha "
+                f"(average yield {_number(crop['avg_yield'])} kg/ha). {crop['top_district']} produces the most, "
+                f"{_number(crop['top_production'])} tonnes."
+            )
+        if rainfall:
+            lines.append(
+                f"Rainfall data covers {rainfall['total_districts']} districts, averaging "
+                f"{_number(rainfall['avg_rainfall'])} mm (range {_number(rainfall['min_rainfall'])} to "
+                f"{_number(rainfall['max_rainfall'])} mm). {rainfall['highest_rainfall_district']} "
+                f"received the most rainfall."
+            )
+        if not lines:
+            lines.append("No summary data is available for this query.")
+        return lines
+
+    def _render_trend(self, results: Dict[str, Any]) -> List[str]:
+        lines = []
+        entries = [e for e in results.get("data", []) if len(e.get("series", [])) >= 2]
+        for entry in entries[:self.max_rows]:
+            label, unit = _column_label(entry["metric"])
+            points = [p for p in entry["series"] if p["value"] is not None]
+            if len(points) < 2:
+                continue
+            first, last = points[0], points[-1]
+            change = last["value"] - first["value"]
+            pct = f" ({change / first['value'] * 100:+.1f}%)" if first["value"] else ""
+            lines.append(
+                f"{entry['district']}, {entry['state']}: {label} went from {_number(first['value'])} {unit} "
+                f"in {first['year']} to {_number(last['value'])} {unit} in {last['year']}{pct}."
+            )
+        lines.append(self._truncated(len(entries)))
+        return lines
+
+    def _render_correlation(self, results: Dict[str, Any]) -> List[str]:
+        lines = []
+        overall = results.get("overall")
+        if overall:
+            lines.append(
+                f"{_metric_label(overall['crop_metric']).capitalize()} and "
+                f"{_metric_label(overall['rainfall_metric'])} rainfall show a {overall['strength']} correlation "
+                f"(Pearson r = {overall['pearson']}, {overall['observations']} district-years)."
+            )
+        strongest = [p for p in results.get("data", []) if p is not overall][:3]
+        if strongest:
+            lines.append("Strongest season pairings:")
+            for pair in strongest:
+                lag = f", rainfall {pair['lag_years']} year earlier" if pair.get("lag_years") else ""
+                lines.append(f"- {_metric_label(pair['crop_metric'])} vs {_metric_label(pair['rainfall_metric'])} "
+                             f"rainfall{lag}: r = {pair['pearson']} ({pair['strength']})")
+        return lines
@@ -0,0 +1,30 @@
+import os
+import sys
+
+import pytest
+
+# The app's modules import each other by name from backend/src
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
+
+
+@pytest.fixture(scope="session")
+def app_module():
+    """The Flask app, imported as gunicorn would (from src/, without an LLM key or SQLite store)"""
+    env = {"GROQ_API_KEY": "test", "RESPONSE_STORE_ENABLED": "false", "DATA_CACHE_ENABLED": "false",
+           "DATA_WATCH_INTERVAL": "0"}
+    saved_env = {name: os.environ.get(name) for name in env}
+    cwd = os.getcwd()
+    os.environ.update(env)
+    os.chdir(SRC_DIR)
+    try:
+        import app
+        yield app
+    finally:
+        os.chdir(cwd)
+        for name, value in saved_env.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
@@ -0,0 +1,94 @@
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from admission import AdmissionController, AdmissionError
+
+
+@pytest.fixture
+def admission(app_module, monkeypatch):
+    controller = AdmissionController(max_in_flight=1, max_queue=1, queue_timeout=0.05, max_per_client=2)
+    monkeypatch.setattr(app_module, "admission", controller)
+    return controller
+
+
+@pytest.fixture
+def client(app_module, monkeypatch):
+    pipeline = SimpleNamespace(
+        run=lambda query, mode=None: {"success": True, "query": query, "answer": "ok"},
+        stream=lambda query, mode=None: iter([("token", {"text": "ok"}), ("done", {"sources": []})])
+    )
+    monkeypatch.setattr(app_module, "pipeline", pipeline)
+    return app_module.app.test_client()
+
+
+def ask(client, path="/query", client_id="a", body=None):
+    return client.post(path, json=body or {"query": "Top districts by yield"}, headers={"X-Client-ID": client_id})
+
+
+def test_client_over_its_limit_gets_429(admission, client):
+    admission.max_in_flight = 3
+    with admission.acquire("a"), admission.acquire("a"):
+        response = ask(client, client_id="a")
+        assert ask(client, client_id="b").status_code == 200
+
+    assert response.status_code == 429
+    assert response.get_json()["reason"] == "client_limit"
+    assert int(response.headers["Retry-After"]) >= 1
+    assert admission.get_stats()["rejected"] == {"client_limit": 1}
+
+
+def test_full_queue_is_shed_with_503(admission, client):
+    admission.max_queue = 0
+    with admission.acquire("b"):
+        response = ask(client, "/query/batch", client_id="a", body={"queries": ["Top districts by yield"]})
+
+    assert response.status_code == 503
+    body = response.get_json()
+    assert (body["stage"], body["reason"]) == ("admission", "queue_full")
+    assert response.headers["Retry-After"] == str(body["retry_after"])
+
+
+def test_queue_timeout_is_shed_with_503(admission, client):
+    with admission.acquire("b"):
+        response = ask(client, client_id="a")
+
+    assert response.status_code == 503
+    assert response.get_json()["reason"] == "queue_timeout"
+    assert int(response.headers["Retry-After"]) >= 1
+    assert admission.get_stats()["queue_depth"] == 0
+
+
+def test_queued_request_runs_when_a_slot_frees(admission, client):
+    admission.queue_timeout = 5
+    ticket = admission.acquire("b")
+    threading.Timer(0.1, ticket.release).start()
+
+    assert ask(client, client_id="a").status_code == 200
+    assert admission.get_stats()["in_flight"] == 0
+
+
+def test_stream_holds_its_ticket_until_closed(admission, client):
+    response = client.post("/query/stream", json={"query": "Top districts by yield"}, buffered=False)
+    assert response.status_code == 200
+    assert admission.get_stats()["in_flight"] == 1
+
+    # A client that disconnects before the end releases the slot too
+    next(response.response)
+    response.close()
+    assert admission.get_stats()["in_flight"] == 0
+
+    response = client.post("/query/stream", json={"query": "Top districts by yield"})
+    assert b"event: done" in response.data
+    # As the WSGI server does once the body is sent
+    response.close()
+    assert admission.get_stats()["in_flight"] == 0
+
+
+def test_admission_error_maps_onto_the_response():
+    error = AdmissionError("Server is busy, try again later", "queue_full", 503, retry_after=1.2)
+
+    assert error.headers() == {"Retry-After": "2"}
+    assert error.to_response() == {"success": False, "error": "Server is busy, try again later",
+                                   "stage": "admission", "reason": "queue_full", "retry_after": 2}
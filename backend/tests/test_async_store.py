@@ -0,0 +1,104 @@
+import asyncio
+import json
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from answer_generator import AnswerGenerator
+from query_analyzer import QueryAnalyzer
+from response_store import ResponseStore
+
+ANALYSIS = {"query_type": "trend", "data_sources": ["crop"], "metrics": ["production"],
+            "entities": {"districts": ["Mysuru"], "states": [], "crops": [], "seasons": []}}
+RESULTS = {"query_type": "trend", "data": [{"district": "MYSURU", "metric": "total_production"}]}
+
+
+class RecordingStore(ResponseStore):
+    """A ResponseStore noting the thread of every call"""
+
+    def __init__(self, path: str):
+        super().__init__(path)
+        self.threads = []
+
+    def get(self, kind, key):
+        self.threads.append(threading.get_ident())
+        return super().get(kind, key)
+
+    def put(self, kind, key, value):
+        self.threads.append(threading.get_ident())
+        super().put(kind, key, value)
+
+
+def completion(text):
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=text))], usage=None)
+
+
+def chunk(text):
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text))], usage=None)
+
+
+class FakeLLM:
+    def __init__(self, text):
+        self.text = text
+        self.calls = 0
+
+    async def acomplete(self, component, **kwargs):
+        self.calls += 1
+        return completion(self.text)
+
+    async def astream(self, component, **kwargs):
+        self.calls += 1
+
+        async def chunks():
+            for word in self.text.split(" "):
+                yield chunk(word + " ")
+        return chunks()
+
+
+@pytest.fixture
+def store(tmp_path):
+    return RecordingStore(str(tmp_path / "responses.sqlite3"))
+
+
+def run_off_loop(coroutine_fn):
+    """Run coroutine_fn() on a new event loop; returns its result and the loop's thread"""
+    async def main():
+        return await coroutine_fn(), threading.get_ident()
+    return asyncio.run(main())
+
+
+def test_async_analysis_uses_the_store_from_a_thread(store):
+    llm = FakeLLM(json.dumps(ANALYSIS))
+    query = "Production trend of Mysuru"
+
+    analysis, loop_thread = run_off_loop(lambda: QueryAnalyzer(llm_client=llm, store=store)
+                                         .analyze_query_async(query, {}))
+    assert analysis["analysis_path"] == "llm"
+
+    stored, _ = run_off_loop(lambda: QueryAnalyzer(llm_client=llm, store=store).analyze_query_async(query, {}))
+    assert stored["analysis_path"] == "store"
+    assert stored["entities"] == ANALYSIS["entities"]
+    assert llm.calls == 1
+
+    assert len(store.threads) == 3  # miss, write, hit
+    assert loop_thread not in store.threads
+
+
+def test_async_answers_use_the_store_from_a_thread(store):
+    llm = FakeLLM("Mysuru production grew.")
+    generator = AnswerGenerator(llm_client=llm, store=store)
+
+    async def answer_then_stream():
+        answer = await generator.generate_answer_async("q", RESULTS, mode="llm", data_version="v1")
+        streamed = [text async for text in generator.stream_answer_async("q", RESULTS, mode="llm",
+                                                                          data_version="v1")]
+        return answer, streamed
+
+    (answer, streamed), loop_thread = run_off_loop(answer_then_stream)
+    assert answer["answer"] == "Mysuru production grew."
+    assert streamed == ["Mysuru production grew."]
+    assert llm.calls == 1
+
+    assert len(store.threads) == 3  # miss, write, hit
+    assert loop_thread not in store.threads
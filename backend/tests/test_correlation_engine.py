@@ -0,0 +1,42 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from correlation_engine import pairwise_corr, pairwise_spearman
+
+
+@pytest.fixture
+def samples():
+    rng = np.random.default_rng(7)
+    x = rng.normal(size=(40, 3))
+    y = np.column_stack([x[:, 0] ** 3 + rng.normal(scale=0.5, size=40), rng.normal(size=40)])
+    y[:, 1] = np.round(y[:, 1])  # ties
+    return x, y
+
+
+def with_missing(values, rate, seed):
+    values = values.copy()
+    values[np.random.default_rng(seed).random(values.shape) < rate] = np.nan
+    return values
+
+
+def expected(x, y, method):
+    frame = pd.DataFrame(np.column_stack([x, y]))
+    return frame.corr(method=method, min_periods=3).to_numpy()[:x.shape[1], x.shape[1]:]
+
+
+@pytest.mark.parametrize("rate", [0.0, 0.3])
+def test_coefficients_match_pandas_over_complete_pairs(samples, rate):
+    x, y = with_missing(samples[0], rate, 1), with_missing(samples[1], rate, 2)
+
+    pearson, n = pairwise_corr(x, y)
+    np.testing.assert_allclose(pearson, expected(x, y, "pearson"), atol=1e-9)
+    np.testing.assert_allclose(pairwise_spearman(x, y), expected(x, y, "spearman"), atol=1e-9)
+    assert n[0, 0] == np.sum(~np.isnan(x[:, 0]) & ~np.isnan(y[:, 0]))
+
+
+def test_spearman_needs_enough_complete_pairs():
+    x = np.array([[1.0], [2.0], [np.nan], [4.0]])
+    y = np.array([[1.0], [np.nan], [3.0], [2.0]])
+
+    assert np.isnan(pairwise_spearman(x, y)[0, 0])
@@ -0,0 +1,66 @@
+from district_index import DistrictIndex
+
+# Each district appears on several rows, as in multi-year or partitioned data
+NAMES = (["DAKSHINA KANNADA"] * 4 + ["MYSORE", "BANGALORE URBAN", "BANGALORE RURAL", "THE NILGIRIS"] * 3
+         + ["State Total"])
+
+
+def test_repeated_rows_are_one_district():
+    index = DistrictIndex(NAMES)
+
+    assert len(index) == 5
+    assert index.lookup("dakshina kannada")["positions"] == [0, 1, 2, 3]
+
+
+def test_prefix_match_is_not_ambiguous_for_repeated_rows():
+    resolved = DistrictIndex(NAMES).resolve(["dakshina"])
+
+    assert resolved["ambiguous"] == []
+    assert resolved["matches"][0]["match"] == "prefix"
+    assert resolved["matches"][0]["names"] == ["DAKSHINA KANNADA"]
+    assert resolved["positions"] == [0, 1, 2, 3]
+
+
+def test_prefix_match_lists_each_district_once():
+    resolved = DistrictIndex(NAMES).resolve(["bangalore"])
+
+    assert resolved["matches"][0]["names"] == ["BANGALORE URBAN", "BANGALORE RURAL"]
+    assert resolved["ambiguous"] == [{"query": "bangalore", "candidates": ["BANGALORE URBAN", "BANGALORE RURAL"]}]
+    assert sorted(resolved["positions"]) == [5, 6, 9, 10, 13, 14]
+
+
+def test_alias_match():
+    index = DistrictIndex(NAMES + ["MYSURU"])
+
+    result = index.lookup("Mysore")
+    assert result["match"] == "exact"
+    result = index.lookup("BELLARY")
+    assert result["match"] == "none"
+
+    index = DistrictIndex(["BALLARI", "BALLARI", "MYSURU"])
+    result = index.lookup("Bellary")
+    assert result["match"] == "alias"
+    assert result["names"] == ["BALLARI"]
+    assert result["positions"] == [0, 1]
+
+
+def test_the_prefix_is_optional():
+    result = DistrictIndex(NAMES).lookup("nilgiris")
+
+    assert result["names"] == ["THE NILGIRIS"]
+    assert result["positions"] == [7, 11, 15]
+
+
+def test_fuzzy_match_for_misspellings():
+    result = DistrictIndex(NAMES).lookup("Dakshna Kanada")
+
+    assert result["match"] == "fuzzy"
+    assert result["names"] == ["DAKSHINA KANNADA"]
+    assert result["positions"] == [0, 1, 2, 3]
+
+
+def test_aggregate_rows_and_unknown_names_do_not_match():
+    resolved = DistrictIndex(NAMES).resolve(["state total", "atlantis"])
+
+    assert resolved["positions"] == []
+    assert resolved["unmatched"] == ["state total", "atlantis"]
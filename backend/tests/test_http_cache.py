@@ -0,0 +1,29 @@
+import pytest
+
+
+@pytest.fixture
+def client(app_module):
+    return app_module.app.test_client()
+
+
+def test_data_responses_are_publicly_cacheable(client):
+    response = client.get("/api/rank?dataset=crop&metric=production&k=3")
+    assert response.status_code == 200
+    assert response.headers["Cache-Control"].startswith("public, max-age=")
+
+    revalidated = client.get("/api/rank?dataset=crop&metric=production&k=3",
+                             headers={"If-None-Match": response.headers["ETag"]})
+    assert revalidated.status_code == 304
+    assert revalidated.headers["Cache-Control"] == response.headers["Cache-Control"]
+
+
+@pytest.mark.parametrize("path", [
+    "/api/rank?dataset=crop&metric=production&order=sideways",
+    "/api/rank?dataset=crop&metric=colour",
+    "/api/compare?dataset=crop&metric=production",
+])
+def test_errors_of_cacheable_endpoints_are_not_stored(client, path):
+    response = client.get(path)
+
+    assert response.status_code == 400
+    assert response.headers["Cache-Control"] == "no-store"
@@ -0,0 +1,85 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from admission import LLMQuota
+from llm_client import LLMClient
+
+MAX_TOKENS = 1000
+USED_TOKENS = 100
+
+
+class APIError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+def completion():
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="ok"))],
+                           usage=SimpleNamespace(prompt_tokens=60, completion_tokens=40, total_tokens=USED_TOKENS))
+
+
+def backend(*outcomes):
+    """A backend answering each call with the next outcome (an exception is raised)"""
+    outcomes = list(outcomes)
+
+    def create(**kwargs):
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+    return SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+
+
+@pytest.fixture
+def quota():
+    # 100 tokens/s: a test runs in milliseconds, so refill hardly moves the level
+    return LLMQuota(tokens_per_minute=6000)
+
+
+def client(quota, sync_backend=None, async_backend=None):
+    return LLMClient(backend=sync_backend or backend(), async_backend=async_backend, quota=quota,
+                     backoff_base=0.001, backoff_max=0.001)
+
+
+def request():
+    return {"messages": [{"role": "user", "content": "question"}], "max_tokens": MAX_TOKENS}
+
+
+def test_failed_attempts_are_refunded(quota):
+    llm = client(quota, backend(APIError(429), APIError(503), completion()))
+
+    llm.complete("answer", **request())
+    # Only the successful attempt's actual usage is charged
+    assert quota.tokens.level == pytest.approx(6000 - USED_TOKENS, abs=20)
+
+
+def test_a_call_that_fails_for_good_is_refunded(quota):
+    llm = client(quota, backend(APIError(400)))
+
+    with pytest.raises(APIError):
+        llm.complete("answer", **request())
+    assert quota.tokens.level == pytest.approx(6000, abs=20)
+
+
+def test_a_cancelled_attempt_is_refunded(quota):
+    started = asyncio.Event()
+
+    async def create(**kwargs):
+        started.set()
+        await asyncio.sleep(60)
+
+    llm = client(quota, async_backend=SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create))))
+
+    async def cancel_in_flight():
+        task = asyncio.ensure_future(llm.acomplete("answer", **request()))
+        await started.wait()
+        assert quota.tokens.level < 6000 - MAX_TOKENS / 2
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(cancel_in_flight())
+    assert quota.tokens.level == pytest.approx(6000, abs=20)
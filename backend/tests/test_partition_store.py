@@ -0,0 +1,98 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from columnar_cache import ColumnarCache
+from data_loader import DataLoader
+from partition_store import PartitionStore
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+
+
+def write_partition(root, state, year, text):
+    path = root / "crop" / state / f"{year}.csv"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text)
+    return path
+
+
+@pytest.fixture
+def same_year_partitions(tmp_path):
+    """Karnataka and Goa partitions of 2016 with the same file name, size and mtime"""
+    with open(os.path.join(DATA_DIR, "crop_production.csv")) as f:
+        karnataka = f.read()
+    # Same length, so only the content tells the files apart
+    goa = karnataka.replace("RAICHUR", "SANGUEM")
+    paths = [write_partition(tmp_path / "partitions", "karnataka", 2016, karnataka),
+             write_partition(tmp_path / "partitions", "goa", 2016, goa)]
+    mtime_ns = os.stat(paths[0]).st_mtime_ns
+    for path in paths:
+        os.utime(path, ns=(mtime_ns, mtime_ns))
+    return tmp_path
+
+
+def districts(store, state):
+    return set(store.scan("crop", states=[state])["district"])
+
+
+def test_partitions_with_the_same_file_name_are_cached_apart(same_year_partitions):
+    cache = ColumnarCache(str(same_year_partitions / "cache"))
+
+    # A cold store writes both cache entries, a second store reads them back
+    for _ in range(2):
+        store = PartitionStore(str(same_year_partitions / "partitions"), cache=cache)
+        assert "RAICHUR" in districts(store, "Karnataka")
+        assert "SANGUEM" not in districts(store, "Karnataka")
+        assert "SANGUEM" in districts(store, "Goa")
+        assert "RAICHUR" not in districts(store, "Goa")
+
+    manifests = [name for name in os.listdir(cache.cache_dir) if name.endswith(".manifest.json")]
+    assert len(manifests) == 2
+    for path in same_year_partitions.glob("partitions/crop/*/2016.csv"):
+        assert cache.load(str(path)) is not None
+
+
+def test_rewriting_an_entry_only_removes_its_own_files(same_year_partitions):
+    cache = ColumnarCache(str(same_year_partitions / "cache"))
+    karnataka, goa = (str(same_year_partitions / "partitions" / "crop" / state / "2016.csv")
+                      for state in ("karnataka", "goa"))
+    cache.store(karnataka, pd.read_csv(karnataka))
+    cache.store(goa, pd.read_csv(goa))
+
+    with open(karnataka, "a") as f:
+        f.write("99,NEW DISTRICT" + ",0" * 16 + "\n")
+    cache.store(karnataka, pd.read_csv(karnataka))
+
+    assert "NEW DISTRICT" in set(cache.load(karnataka)["District Name"])
+    assert "SANGUEM" in set(cache.load(goa)["District Name"])
+
+
+def test_primary_csvs_are_served_from_the_snapshot(tmp_path, monkeypatch):
+    data_dir = tmp_path / "data"
+    data_dir.mkdir()
+    for name in os.listdir(DATA_DIR):
+        if name.endswith(".csv"):
+            (data_dir / name).write_bytes(open(os.path.join(DATA_DIR, name), "rb").read())
+    loader = DataLoader(data_dir=str(data_dir), cache_dir=str(tmp_path / "cache"))
+    store = loader.get_partition_store()
+
+    def no_reads(*args, **kwargs):
+        raise AssertionError("a primary CSV was read again")
+    monkeypatch.setattr(PartitionStore, "_read_partition", no_reads)
+
+    snapshot = loader.snapshot()
+    frame = store.scan("crop", states=["Karnataka"], year_range=(2017, 2017))
+    assert set(frame["year"]) == {2017}
+    pd.testing.assert_frame_equal(frame.drop(columns="year"), snapshot.crop_data)
+    assert np.shares_memory(store.get(("crop", "karnataka", 2017))["frame"]["total_production"].to_numpy(),
+                            snapshot.crop_data["total_production"].to_numpy())
+    assert len(store.scan("rainfall", states=["Tamil Nadu"])) == len(snapshot.rainfall_data)
+
+    # A reload swaps in new frames, and the partition follows them
+    crop_path = data_dir / "crop_production.csv"
+    crop_path.write_text(crop_path.read_text().replace("RAICHUR", "RAICHURU"))
+    loader.reload(background=False)
+    assert loader.snapshot().version != snapshot.version
+    assert "RAICHURU" in set(store.scan("crop", year_range=(2017, 2017))["district"])
@@ -0,0 +1,141 @@
+import os
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from answer_generator import AnswerGenerator
+from data_loader import DataLoader
+from query_plan import Aggregate, PlanCompiler, PlanExecutor, optimize
+from query_processor import QueryProcessor
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+
+
+@pytest.fixture(scope="module")
+def processor(tmp_path_factory):
+    """The bundled 2017 data, plus a 2016 crop partition at half the 2017 figures"""
+    tmp = tmp_path_factory.mktemp("data")
+    loader = DataLoader(data_dir=DATA_DIR, cache_dir=str(tmp / "cache"))
+
+    crop = pd.read_csv(os.path.join(DATA_DIR, "crop_production.csv"))
+    numeric = [c for c in crop.columns if c not in ("SlNo", "District Name")]
+    crop[numeric] = crop[numeric] / 2
+    crop.to_csv(tmp / "crop_2016.csv", index=False)
+    loader.get_partition_store().register("crop", "Karnataka", 2016, str(tmp / "crop_2016.csv"))
+    return QueryProcessor(loader)
+
+
+def analysis(query_type, data_sources, metrics=None, districts=None, **extra):
+    return dict({
+        "query_type": query_type,
+        "data_sources": data_sources,
+        "metrics": metrics or [],
+        "entities": {"districts": districts or [], "states": [], "crops": [], "seasons": []}
+    }, **extra)
+
+
+def test_comparison_of_named_districts(processor):
+    results = processor.process_query(analysis("comparison", ["crop", "rainfall"], ["production", "rainfall"],
+                                               ["Mysuru", "Chennai"]))
+
+    assert [entry["district"] for entry in results["data"]] == ["Chennai", "MYSURU"]
+    assert results["data"][0]["total_actual_rainfall"] > 0
+    assert results["data"][1]["total_production"] > 0
+    assert "unmatched_districts" not in results
+
+
+def test_comparison_without_districts_is_empty(processor):
+    results = processor.process_query(analysis("comparison", ["crop", "rainfall"], ["production"]))
+
+    assert results == {"query_type": "comparison", "data": [], "data_sources": []}
+
+
+def test_comparison_reports_unknown_districts(processor):
+    results = processor.process_query(analysis("comparison", ["crop"], ["production"], ["Mysuru", "Atlantis"]))
+
+    assert [entry["district"] for entry in results["data"]] == ["MYSURU"]
+    assert results["unmatched_districts"] == ["Atlantis"]
+
+
+def test_empty_pushed_down_district_filter_reads_no_rows(processor):
+    plan = PlanCompiler().compile(analysis("ranking", ["crop"], ["production"], ["Mysuru"]))
+    plan = optimize(plan)
+    plan.branches[0].scan.districts = []
+
+    results = processor._execute_plan(plan, processor.data_loader.snapshot())
+    assert results["data"] == []
+
+
+def test_ranking_restricted_to_districts(processor):
+    districts = ["Mysuru", "Mandya", "Hassan", "Raichur"]
+    results = processor.process_query(analysis("ranking", ["crop"], ["production"], districts,
+                                               order="asc", limit=3))
+
+    crop = processor.data_loader.snapshot().crop_data
+    expected = (crop[crop["district"].isin([d.upper() for d in districts])]
+                .sort_values("total_production")["district"].head(3).tolist())
+    assert [entry["district"] for entry in results["data"]] == expected
+    assert [entry["rank"] for entry in results["data"]] == [1, 2, 3]
+    assert results["crop_ranked_by"] == "total_production"
+
+
+def test_ranking_over_all_districts_excludes_totals(processor):
+    results = processor.process_query(analysis("ranking", ["crop"], ["yield"], limit=5))
+
+    values = [entry["total_yield"] for entry in results["data"]]
+    assert len(values) == 5 and values == sorted(values, reverse=True)
+    assert "State Total" not in [entry["district"] for entry in results["data"]]
+
+
+def test_trend_with_several_metrics(processor):
+    results = processor.process_query(analysis("trend", ["crop"], ["production", "area"], ["Mysuru"],
+                                               time_period="2016-2017"))
+
+    assert results["years_available"] == {"crop": [2016, 2017]}
+    by_metric = {entry["metric"]: entry for entry in results["data"]}
+    assert set(by_metric) == {"total_production", "total_area"}
+    for entry in by_metric.values():
+        assert entry["district"] == "MYSURU"
+        first, last = entry["series"]
+        assert (first["year"], last["year"]) == (2016, 2017)
+        # 2016 holds half of each 2017 figure
+        assert last["value"] == pytest.approx(2 * first["value"])
+        assert last["pct_change"] == pytest.approx(100.0)
+
+
+@pytest.mark.parametrize("query_type, data_sources, metrics, districts, cited", [
+    ("comparison", ["crop", "rainfall"], ["production"], ["Mysuru"], ["Crop Production Data"]),
+    ("comparison", ["crop", "rainfall"], ["rainfall"], ["Chennai", "Mysuru"], ["Crop Production Data", "Rainfall Data"]),
+    ("ranking", ["rainfall"], ["rainfall"], None, ["Rainfall Data"]),
+    ("comparison", ["crop"], ["production"], None, []),
+])
+def test_template_answers_cite_the_datasets_used(processor, query_type, data_sources, metrics, districts, cited):
+    results = processor.process_query(analysis(query_type, data_sources, metrics, districts))
+    answer = AnswerGenerator(llm_client=SimpleNamespace()).generate_answer("question", results)
+
+    assert answer["answer_renderer"] == "template"
+    assert [source["dataset"] for source in answer["sources"]] == cited
+
+
+def test_aggregates_skip_missing_values():
+    frame = pd.DataFrame({
+        "district": ["A", "B", "A", "B"],
+        "state": ["S"] * 4,
+        "year": [2016, 2016, 2017, 2017],
+        "total_production": [np.nan, 10, np.nan, np.nan],
+        "total_yield": [np.nan, 2.0, 4.0, np.nan],
+        "total_area": [100, 50, 10, 30],
+    })
+    aggregations = {"total_production": ("sum", None), "total_yield": ("weighted", "total_area")}
+
+    by_state = PlanExecutor._aggregate(frame, Aggregate(["state"], aggregations))["value"]
+    # District A's area has no yield in 2016 and does not weigh in
+    assert by_state.loc[("S", 2016)].tolist() == [10.0, 2.0]
+    # Nothing reported in 2017 is missing, not 0
+    assert np.isnan(by_state.loc[("S", 2017), "total_production"])
+    assert by_state.loc[("S", 2017), "total_yield"] == 4.0
+
+    by_district = PlanExecutor._aggregate(frame, Aggregate(["state", "district_key"], aggregations))["value"]
+    assert by_district["total_production"].isna().tolist() == [True, True, False, True]
@@ -0,0 +1,49 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from data_loader import DataLoader
+from shared_data import SharedData, SharedDataExport
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+
+
+@pytest.fixture(scope="module")
+def snapshot(tmp_path_factory):
+    return DataLoader(data_dir=DATA_DIR, cache_dir=str(tmp_path_factory.mktemp("cache"))).snapshot()
+
+
+@pytest.fixture
+def export(snapshot):
+    export = SharedDataExport(snapshot)
+    yield export
+    export.unlink()
+
+
+def test_attached_frames_match_and_share_the_block(snapshot, export):
+    shared = SharedData(export.block, export.manifest)
+    block = np.frombuffer(export.block.buf, dtype=np.uint8)
+
+    for dataset, original in (("crop", snapshot.crop_data), ("rainfall", snapshot.rainfall_data)):
+        frame = shared.frames[dataset]
+        pd.testing.assert_frame_equal(frame, original.reset_index(drop=True))
+        for name in frame.columns:
+            series = frame[name]
+            backing = series.array.codes if isinstance(series.dtype, pd.CategoricalDtype) else series.to_numpy()
+            assert np.shares_memory(backing, block), f"{dataset}.{name} was copied"
+
+    assert shared.get_stats()["copied_bytes"] == 0
+    assert shared.get_stats()["copied_columns"] == []
+
+
+def test_copied_columns_are_reported(export, monkeypatch):
+    from_codes = pd.Categorical.from_codes
+    monkeypatch.setattr(pd.Categorical, "from_codes",
+                        lambda codes, **kwargs: from_codes(np.array(codes), **kwargs))
+
+    stats = SharedData(export.block, export.manifest).get_stats()
+    assert "crop.district" in stats["copied_columns"]
+    assert "rainfall.district" in stats["copied_columns"]
+    assert stats["copied_bytes"] > 0
@@ -46,26 +46,11 @@ async function handleSubmit() {
     disableSubmit();
 
     try {
-        const response = await fetch(`${API_BASE_URL}/query`, {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json',
-            },
-            body: JSON.stringify({ query })
-        });
-
-        const data = await response.json();
-
-        if (!response.ok) {
-            throw new Error(data.error || 'Failed to process query');
-        }
-
-        if (data.success) {
-            displayResults(data);
+        if (window.ReadableStream && window.TextDecoder) {
+            await streamQuery(query);
         } else {
-            throw new Error(data.error || 'Unknown error occurred');
+            await fetchQuery(query);
         }
-
     } catch (error) {
         showError(`Error: ${error.message}`);
         console.error('Query error:', error);
@@ -75,6 +60,97 @@ async function handleSubmit() {
     }
 }
 
+// Non-streaming request to /query
+async function fetchQuery(query) {
+    const response = await fetch(`${API_BASE_URL}/query`, {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+        },
+        body: JSON.stringify({ query })
+    });
+
+    const data = await response.json();
+
+    if (!response.ok) {
+        throw new Error(data.error || 'Failed to process query');
+    }
+
+    if (data.success) {
+        displayResults(data);
+    } else {
+        throw new Error(data.error || 'Unknown error occurred');
+    }
+}
+
+// Streaming request to /query/stream (Server-Sent Events over fetch)
+async function streamQuery(query) {
+    const response = await fetch(`${API_BASE_URL}/query/stream`, {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+        },
+        body: JSON.stringify({ query })
+    });
+
+    if (!response.ok || !response.body) {
+        // Older backends without the streaming endpoint
+        if (response.status === 404 || response.status === 405) {
+            return fetchQuery(query);
+        }
+        const data = await response.json().catch(() => ({}));
+        throw new Error(data.error || 'Failed to process query');
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    const result = { answer: '', raw_data: null, sources: [] };
+    let buffer = '';
+
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+            const rawEvent = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+            handleStreamEvent(rawEvent, result);
+        }
+    }
+}
+
+function handleStreamEvent(rawEvent, result) {
+    let event = 'message';
+    let data = '';
+    rawEvent.split('\n').forEach(line => {
+        if (line.startsWith('event:')) event = line.slice(6).trim();
+        else if (line.startsWith('data:')) data += line.slice(5).trim();
+    });
+    const payload = data ? JSON.parse(data) : {};
+
+    switch (event) {
+        case 'data':
+            result.raw_data = payload;
+            break;
+        case 'token':
+            if (!result.answer) {
+                hideLoading();
+                displayResults(result);
+            }
+            result.answer += payload.text;
+            answerText.textContent = result.answer;
+            break;
+        case 'done':
+            result.sources = payload.sources || [];
+            displayResults(result);
+            break;
+        case 'error':
+            throw new Error(payload.error || 'Failed to process query');
+    }
+}
+
 // Display Results
 function displayResults(data) {
     // Display answer